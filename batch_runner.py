@@ -0,0 +1,149 @@
+# ANDRIX ® 2025 🤙
+#
+# Spread animation frame jobs (klodufy_*_frame, textufy_*_frame...) over a process pool
+# Frame jobs are built upfront so output names & indices stay deterministic, failures are collected instead of aborting the batch
+
+import os
+import sys
+import datetime
+import traceback
+import multiprocessing
+import concurrent.futures
+
+try:
+    import resource # Unix only, for the per-worker memory limit
+except ImportError:
+    resource = None
+
+error_start = "\033[91m"
+error_end = "\033[0m"
+
+# Started flags of the jobs of the current pool, shared with the parent (see run_pool_round)
+started_flags = None
+
+# Process pool initializer: cap worker address space and silence per-frame logs
+def init_frame_worker (max_memory_mb, quiet, flags=None):
+    global started_flags
+    started_flags = flags
+    
+    if ((max_memory_mb is not None) and (resource is not None)):
+        limit = int(max_memory_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    
+    if (quiet):
+        sys.stdout = open(os.devnull, "w")
+
+# Run one frame job, returning [result, None] when fine or [None, error traceback text]
+def run_frame_job (frame_function, frame_args):
+    try:
+        return frame_function(*frame_args), None
+    except Exception:
+        return None, traceback.format_exc()
+
+# Pool job: flag job j as started, so the parent knows which jobs a dying worker may have been running, then run it
+def run_pooled_frame_job (j, frame_function, frame_args):
+    if (started_flags is not None):
+        started_flags[j] = 1
+    
+    return run_frame_job(frame_function, frame_args)
+
+# Run jobs 'indices' of 'frame_jobs' on a fresh pool, calling 'on_done(j, result, error)' as they complete
+# A dying worker (OOM killer, segfault...) breaks the whole pool and fails every pending job, these jobs are left to the caller
+# Returns [started, unstarted] lists of the jobs lost to a broken pool, started ones being those a worker had picked up
+def run_pool_round (frame_function, frame_jobs, indices, nb_workers, max_memory_mb, quiet, on_done):
+    flags = multiprocessing.Array("b", len(frame_jobs), lock=False)
+    lost = []
+    
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(nb_workers, len(indices)), initializer=init_frame_worker, initargs=(max_memory_mb, quiet, flags)) as executor:
+        futures = {}
+        for j in indices:
+            futures[executor.submit(run_pooled_frame_job, j, frame_function, frame_jobs[j])] = j
+        
+        for future in concurrent.futures.as_completed(futures):
+            j = futures[future]
+            try:
+                result, error = future.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                lost.append(j)
+                continue
+            except Exception:
+                result, error = None, traceback.format_exc()
+            on_done(j, result, error)
+    
+    lost.sort()
+    
+    return [j for j in lost if (flags[j] == 1)], [j for j in lost if (flags[j] != 1)]
+
+# Print one combined progress line, overwritten as frames complete
+def log_batch_progress (done_count, failed_count, total_count, start_time):
+    elapsed = datetime.datetime.now().timestamp() - start_time.timestamp()
+    eta = (elapsed / done_count * (total_count - done_count)) if (done_count > 0) else float("nan")
+    eta_text = (str(round(eta)) + "s") if (done_count > 0) else "?"
+    
+    print("\rFrames done: " + str(done_count) + "/" + str(total_count) + " (" + str(failed_count) + " failed), elapsed: " + str(round(elapsed)) + "s, ETA: " + eta_text + "   ", end="", flush=True)
+
+# Run 'frame_function(*args)' for each args tuple of 'frame_jobs' (e.g. [(frame, index), ...]) on 'nb_workers' processes
+# 'max_memory_mb' caps each worker's memory (Unix only), 'quiet' hides the per-frame logs of workers
+# Returns the list of failures as [[args, error_text], ...], in frame_jobs order
+def run_frame_batch (frame_function, frame_jobs, nb_workers, max_memory_mb=None, quiet=True):
+    return map_frame_batch(frame_function, frame_jobs, nb_workers, max_memory_mb, quiet)[1]
+
+# Same as run_frame_batch, also collecting what 'frame_function' returns (results must be picklable)
+# Returns [results, failures], results being in frame_jobs order (None for failed jobs)
+def map_frame_batch (frame_function, frame_jobs, nb_workers, max_memory_mb=None, quiet=True):
+    total_count = len(frame_jobs)
+    results = [None] * total_count
+    errors = [None] * total_count
+    done_count = 0
+    failed_count = 0
+    start_time = datetime.datetime.now()
+    
+    print("Running " + str(total_count) + " frame jobs of " + frame_function.__name__ + " on " + str(nb_workers) + " worker(s)...")
+    
+    if (nb_workers <= 1):
+        # Same process, per-frame logs included
+        for j in range(0, total_count):
+            results[j], errors[j] = run_frame_job(frame_function, frame_jobs[j])
+            done_count += 1
+            failed_count += 0 if (errors[j] is None) else 1
+            log_batch_progress(done_count, failed_count, total_count, start_time)
+    
+    else:
+        def on_done (j, result, error):
+            nonlocal done_count, failed_count
+            results[j] = result
+            errors[j] = error
+            done_count += 1
+            failed_count += 0 if (error is None) else 1
+            log_batch_progress(done_count, failed_count, total_count, start_time)
+        
+        # Rounds on fresh pools until every job is done: jobs a dead worker may have been running get rerun alone,
+        # so only the one killing its worker fails, while jobs that never started go to the next round
+        pending = list(range(0, total_count))
+        while (len(pending) > 0):
+            started, unstarted = run_pool_round(frame_function, frame_jobs, pending, nb_workers, max_memory_mb, quiet, on_done)
+            for j in started:
+                lost = sum(run_pool_round(frame_function, frame_jobs, [j], 1, max_memory_mb, quiet, on_done), [])
+                if (len(lost) > 0):
+                    on_done(j, None, "Worker process died running this frame job (killed by the system, out of memory or crashed)\n")
+            
+            if ((len(started) == 0) and (len(unstarted) == len(pending))):
+                # The pool broke before running anything (worker initialization failing for instance)
+                for j in unstarted:
+                    on_done(j, None, "Worker pool broke before running this frame job\n")
+                unstarted = []
+            pending = unstarted
+    
+    print("")
+    
+    # Report failures
+    failures = []
+    for j in range(0, total_count):
+        if (errors[j] is not None):
+            failures.append([frame_jobs[j], errors[j]])
+            print(error_start + "[map_frame_batch] Frame job " + str(frame_jobs[j]) + " failed:\n" + errors[j] + error_end)
+    
+    delta = datetime.datetime.now().timestamp() - start_time.timestamp()
+    print("Ran " + str(total_count) + " frame jobs (" + str(len(failures)) + " failed) in: " + str(round(delta, 2)) + " seconds.")
+    
+    return results, failures
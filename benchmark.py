@@ -0,0 +1,260 @@
+# ANDRIX ® 2025 🤙
+#
+# Benchmark suite of klodufy, klodufy_txt & sph_textufy over synthetic inputs, so speedups & regressions get measured
+# instead of guessed out of logs
+#
+# Synthetic inputs are generated once under data/benchmarks/: NUMPY & Fortran DAT cubes (64³ to 512³, 1 to 3 channels)
+# and particle tables (1e5 to 1e7 rows, NUMPY for sph_textufy & TXT for klodufy_txt)
+# Each case runs 'repeats' times, its fastest run being kept, phases coming out of the exporter run report (see run_report)
+# Results go to output/benchmarks/results-<suite>-<date>.json and get compared to a stored baseline of the same suite
+
+import os
+import io
+import json
+import time
+import shutil
+import platform
+import datetime
+import contextlib
+import numpy as np
+from scipy.io import FortranFile
+from klodufy import klodufy, klodufy_txt
+from sph_textufy import sph_textufy
+
+# Cube sizes, cube channels & particle counts of each suite
+benchmark_suites = {
+    "quick": {"cube_sizes": [64], "cube_channels": [1, 3], "particle_counts": [100000]},
+    "standard": {"cube_sizes": [64, 128, 256], "cube_channels": [1, 3], "particle_counts": [100000, 1000000]},
+    "full": {"cube_sizes": [64, 128, 256, 512], "cube_channels": [1, 2, 3], "particle_counts": [100000, 1000000, 10000000]}
+}
+
+# Synthetic data cube of size³ voxels with 'channels' log-normal (so positive) channels, as a "NUMPY" .npy or "DAT" Fortran file
+# Values are written one slab at a time, so 512³ cubes don't need to fit in memory twice
+def get_synthetic_cube (size, channels, file_type_token):
+    source_file = "data/benchmarks/cube-" + str(size) + "-" + str(channels) + (".npy" if (file_type_token == "NUMPY") else ".dat")
+    if (os.path.exists(source_file)):
+        return source_file
+    
+    os.makedirs("data/benchmarks/", exist_ok=True)
+    print("Generating synthetic " + file_type_token + " cube " + source_file + "...")
+    rng = np.random.default_rng(size * 10 + channels)
+    slab_size = max(1, 16777216 // (size * size))
+    
+    # Temporary file first, so an interrupted generation is never picked up
+    if (file_type_token == "NUMPY"):
+        data = np.lib.format.open_memmap(source_file + ".tmp.npy", mode="w+", dtype=np.float32, shape=(size, size, size, channels))
+        for first in range(0, size, slab_size):
+            last = min(size, first + slab_size)
+            data[first:last] = rng.lognormal(0, 1, (last - first, size, size, channels))
+        data.flush()
+        data = None
+        os.replace(source_file + ".tmp.npy", source_file)
+    
+    else:
+        # Size record, then one record per channel (see prepare_data_cube)
+        f = FortranFile(source_file + ".tmp", "w")
+        f.write_record(np.array([size, size, size], dtype=np.int32))
+        for c in range(0, channels):
+            f.write_record(rng.lognormal(0, 1, size * size * size).astype(np.float32))
+        f.close()
+        os.replace(source_file + ".tmp", source_file)
+    
+    return source_file
+
+# Synthetic particle table of 'count' rows of x, y, z (gaussian blob), h (log-normal) & v (gaussian) columns
+# as a "NUMPY" .npy (see sph_textufy) or "TXT" file (see klodufy_txt, h being the 4th column weight)
+def get_synthetic_particles (count, file_type_token):
+    source_file = "data/benchmarks/particles-" + str(count) + (".npy" if (file_type_token == "NUMPY") else ".txt")
+    if (os.path.exists(source_file)):
+        return source_file
+    
+    os.makedirs("data/benchmarks/", exist_ok=True)
+    print("Generating synthetic " + file_type_token + " particle table " + source_file + "...")
+    rng = np.random.default_rng(count)
+    chunk_size = 1000000
+    
+    if (file_type_token == "NUMPY"):
+        data = np.lib.format.open_memmap(source_file + ".tmp.npy", mode="w+", dtype=np.float64, shape=(count, 5))
+        for first in range(0, count, chunk_size):
+            last = min(count, first + chunk_size)
+            data[first:last, 0:3] = rng.normal(0, 1, (last - first, 3))
+            data[first:last, 3] = rng.lognormal(0, 0.5, last - first)
+            data[first:last, 4] = rng.normal(0, 1, last - first)
+        data.flush()
+        data = None
+        os.replace(source_file + ".tmp.npy", source_file)
+    
+    else:
+        with open(source_file + ".tmp", "w") as f:
+            for first in range(0, count, chunk_size):
+                last = min(count, first + chunk_size)
+                rows = np.column_stack([rng.normal(0, 1, (last - first, 3)), rng.lognormal(0, 0.5, last - first), rng.normal(0, 1, last - first)])
+                np.savetxt(f, rows, fmt="%.6g")
+        os.replace(source_file + ".tmp", source_file)
+    
+    return source_file
+
+# Benchmark cases of a suite, as {"name": ..., "exporter": ..., ...} dicts (names are the keys results get compared with)
+# Cubes: every quality, dimension mode & output mode combination out of NUMPY sources, reference settings out of DAT sources
+# Particles: every quality, dimension mode & output mode combination for sph_textufy, every quality & deposit mode for klodufy_txt
+def get_benchmark_cases (suite):
+    settings = benchmark_suites[suite]
+    cases = []
+    
+    for size in settings["cube_sizes"]:
+        for channels in settings["cube_channels"]:
+            for quality in ["low", "high"]:
+                for mode in ["linear", "log"]:
+                    for output_mode in ["inline", "stream"]:
+                        cases.append({"exporter": "klodufy", "file_type_token": "NUMPY", "size": size, "channels": channels, "quality": quality, "mode": mode, "output_mode": output_mode})
+            cases.append({"exporter": "klodufy", "file_type_token": "DAT", "size": size, "channels": channels, "quality": "low", "mode": "linear", "output_mode": "inline"})
+    
+    for count in settings["particle_counts"]:
+        for quality in ["LQ", "HQ"]:
+            for mode in ["linear", "log"]:
+                for output_mode in ["text", "texture"]:
+                    cases.append({"exporter": "sph_textufy", "file_type_token": "NUMPY", "count": count, "quality": quality, "mode": mode, "output_mode": output_mode})
+        for quality in ["low", "high"]:
+            for deposit_mode, weight_mode in [["count", "linear"], ["mean", "linear"], ["mean", "log"]]:
+                cases.append({"exporter": "klodufy_txt", "file_type_token": "TXT", "count": count, "size": 128, "quality": quality, "deposit_mode": deposit_mode, "weight_mode": weight_mode})
+    
+    for case in cases:
+        case["name"] = "-".join([str(value) for value in case.values()])
+    
+    return cases
+
+# Run one case once, exporting to output/benchmarks/run/ (emptied before & after, outputs only get measured)
+# Returns {"wall_seconds", "cpu_seconds", "phases", "elements", "bytes_written", "peak_rss_mb", "report"}, phases being wall seconds
+# out of the run report, time outside of them (setup, headers...) being "other"
+def run_benchmark_case (case):
+    run_dir = "output/benchmarks/run/"
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    
+    if (case["exporter"] == "klodufy"):
+        source_file = get_synthetic_cube(case["size"], case["channels"], case["file_type_token"])
+        elements = case["size"] ** 3 * case["channels"]
+    else:
+        source_file = get_synthetic_particles(case["count"], case["file_type_token"])
+        elements = case["count"]
+    
+    # Exporter logs are silenced
+    logs = io.StringIO()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with contextlib.redirect_stdout(logs):
+        if (case["exporter"] == "klodufy"):
+            dimensions = [["c" + str(c), case["mode"]] for c in range(0, case["channels"])]
+            minmaxs = [([-2, 1] if (case["mode"] == "log") else [0, 10]) for c in range(0, case["channels"])]
+            klodufy(source_file, case["file_type_token"], case["size"], dimensions, minmaxs, case["quality"], "benchmarks/run/", "cube", 1, 2, False, output_mode=case["output_mode"], use_cache=False)
+        
+        elif (case["exporter"] == "sph_textufy"):
+            dimensions = [["x", "linear", "HQ"], ["y", "linear", "HQ"], ["z", "linear", "HQ"], ["h", case["mode"], case["quality"]], ["v", "linear", case["quality"]]]
+            minmaxs = [[-4, 4], [-4, 4], [-4, 4], ([-1, 1] if (case["mode"] == "log") else [0, 5]), [-4, 4]]
+            sph_textufy(source_file, case["file_type_token"], "benchmarks/run/", "particles", dimensions, [1, 1, 1, 1, 1], minmaxs, 1, 2, False, False, output_mode=case["output_mode"], use_cache=False)
+        
+        elif (case["exporter"] == "klodufy_txt"):
+            klodufy_txt(source_file, case["size"], -4, 4, case["quality"], "benchmarks/run/", "points", 1, 2, deposit_mode=case["deposit_mode"], weight_mode=case["weight_mode"])
+    
+    run = {"wall_seconds": time.perf_counter() - wall_start, "cpu_seconds": time.process_time() - cpu_start, "elements": elements}
+    
+    # Run report of the case, the only one in run/reports/
+    report_names = os.listdir(run_dir + "reports/") if os.path.isdir(run_dir + "reports/") else []
+    if (len(report_names) != 1):
+        shutil.rmtree(run_dir, ignore_errors=True)
+        raise RuntimeError("no run report, exporter logs end with: " + logs.getvalue()[-500:])
+    with open(run_dir + "reports/" + report_names[0], "r") as report_file:
+        report = json.load(report_file)
+    
+    run["phases"] = {name: phase["wall_seconds"] for name, phase in report["phases"].items()}
+    run["phases"]["other"] = max(0, run["wall_seconds"] - sum(run["phases"].values()))
+    run["bytes_written"] = report["bytes_written"]
+    run["peak_rss_mb"] = report["peak_rss_mb"]
+    run["report"] = report
+    shutil.rmtree(run_dir, ignore_errors=True)
+    
+    return run
+
+# Machine & library versions, results of different machines not being comparable
+def get_machine_info ():
+    return {"platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count(), "python": platform.python_version(), "numpy": np.__version__}
+
+# Regressions of 'results' against 'baseline' results: case times (total & phases) that grew by more than 'threshold'
+# (0.2 == 20 %) and by at least 'min_seconds' (shorter differences are mostly noise)
+# Returns [[case name, phase, baseline seconds, seconds], ...], phase being "total" for the wall time
+def compare_benchmarks (results, baseline, threshold=0.2, min_seconds=0.05):
+    if (results["machine"] != baseline["machine"]):
+        print("[compare_benchmarks(...)] Baseline comes from another machine or library versions, comparing anyway: " + str(baseline["machine"]))
+    
+    regressions = []
+    for name, case in results["cases"].items():
+        if ((name not in baseline["cases"]) or ("error" in case) or ("error" in baseline["cases"][name])):
+            continue
+        
+        baseline_case = baseline["cases"][name]
+        timings = [["total", baseline_case["wall_seconds"], case["wall_seconds"]]]
+        for phase, seconds in case["phases"].items():
+            if (phase in baseline_case["phases"]):
+                timings.append([phase, baseline_case["phases"][phase], seconds])
+        
+        for phase, baseline_seconds, seconds in timings:
+            if ((seconds > baseline_seconds * (1 + threshold)) and (seconds - baseline_seconds >= min_seconds)):
+                regressions.append([name, phase, baseline_seconds, seconds])
+    
+    return regressions
+
+# Run the 'suite' cases (see benchmark_suites), write results & compare them to the stored baseline of the suite
+# The baseline is output/benchmarks/baseline-<suite>.json, created out of these results when missing or when 'update_baseline' is set
+# Returns the regressions (see compare_benchmarks)
+def run_benchmarks (suite="quick", repeats=3, threshold=0.2, min_seconds=0.05, update_baseline=False):
+    cases = get_benchmark_cases(suite)
+    results = {"suite": suite, "date": datetime.datetime.now().isoformat(timespec="seconds"), "machine": get_machine_info(), "repeats": repeats, "cases": {}}
+    print("Running " + str(len(cases)) + " benchmark cases of the " + suite + " suite, best of " + str(repeats) + " runs...")
+    
+    for c in range(0, len(cases)):
+        case = cases[c]
+        parameters = {name: value for name, value in case.items() if (name != "name")}
+        try:
+            runs = [run_benchmark_case(case) for r in range(0, repeats)]
+        except Exception as exception:
+            results["cases"][case["name"]] = {"parameters": parameters, "error": repr(exception)}
+            print("[run_benchmarks(...)] Case " + case["name"] + " failed: " + repr(exception))
+            continue
+        
+        # Fastest run, along with all wall times
+        best = min(runs, key=lambda run: run["wall_seconds"])
+        best["parameters"] = parameters
+        best["elements_per_second"] = best["elements"] / best["wall_seconds"] if (best["wall_seconds"] > 0) else None
+        best["all_wall_seconds"] = [run["wall_seconds"] for run in runs]
+        results["cases"][case["name"]] = best
+        
+        phases = ", ".join([phase + ": " + str(round(seconds, 3)) + "s" for phase, seconds in best["phases"].items()])
+        print("[" + str(c + 1) + "/" + str(len(cases)) + "] " + case["name"] + ": " + str(round(best["wall_seconds"], 3)) + "s (" + phases + "), " + str(round(best["elements_per_second"] or 0)) + " elements/s")
+    
+    os.makedirs("output/benchmarks/", exist_ok=True)
+    results_path = "output/benchmarks/results-" + suite + "-" + results["date"].replace(":", "-") + ".json"
+    with open(results_path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print("Results written to " + results_path)
+    
+    # Compare to the baseline, or store it
+    baseline_path = "output/benchmarks/baseline-" + suite + ".json"
+    if (update_baseline or (not os.path.exists(baseline_path))):
+        shutil.copyfile(results_path, baseline_path)
+        print("Stored results as the " + suite + " baseline: " + baseline_path)
+        return []
+    
+    with open(baseline_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    
+    regressions = compare_benchmarks(results, baseline, threshold, min_seconds)
+    for name, phase, baseline_seconds, seconds in regressions:
+        growth = (" (+" + str(round(100 * (seconds / baseline_seconds - 1))) + "%)") if (baseline_seconds > 0) else ""
+        print("Regression: " + name + " " + phase + " went from " + str(round(baseline_seconds, 3)) + "s to " + str(round(seconds, 3)) + "s" + growth)
+    print(str(len(regressions)) + " regression(s) over " + str(int(100 * threshold)) + "% against " + baseline_path + " (" + baseline["date"] + ")")
+    
+    return regressions
+
+# run_benchmarks("quick")
+# run_benchmarks("standard", repeats=2)
+# run_benchmarks("full", repeats=1)
@@ -0,0 +1,64 @@
+# ANDRIX ® 2025 🤙
+#
+# Incremental rebuilds of exports (animation frames especially): each export records its source fingerprint (path, size &
+# modification time), a hash of its whole parameter set and the size of its output files, so a rerun skips exports whose
+# record still matches and whose outputs are all there with their recorded size
+# Records are one small JSON file per export in a build-manifest/ folder next to the outputs, so parallel frame jobs never
+# write the same file. Outputs are written to .part files renamed once complete, so a crash never leaves a truncated output
+
+import os
+import json
+import hashlib
+from tracers_cache import get_source_key
+
+# Record file of an export, 'output_path' being its main output (e.g. output/dustyturb/klo-dustyturb-256-rhov-anim-501-LQ.asset)
+def get_build_record_path (output_path):
+    return os.path.join(os.path.dirname(output_path), "build-manifest", os.path.basename(output_path) + ".json")
+
+# Hash of an export parameter set (JSON-friendly values, key order doesn't matter)
+def get_params_hash (params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Whether an export is up to date: same source & parameters as recorded, all outputs there with their recorded size
+# 'output_paths' are the export output files, the first one being the main output
+def is_build_up_to_date (output_paths, source_file, file_type_token, params):
+    record_path = get_build_record_path(output_paths[0])
+    if ((not os.path.exists(record_path)) or (not os.path.exists(source_file))):
+        return False
+    
+    with open(record_path, "r") as record_file:
+        record = json.load(record_file)
+    
+    if ((record.get("source") != get_source_key(source_file, file_type_token)) or (record.get("params_hash") != get_params_hash(params))):
+        return False
+    
+    for output_path in output_paths:
+        if ((output_path not in record["outputs"]) or (not os.path.exists(output_path)) or (os.path.getsize(output_path) != record["outputs"][output_path])):
+            return False
+    
+    return True
+
+# Record a finished export (through a temporary file, so a half-written record is never picked up)
+def record_build (output_paths, source_file, file_type_token, params):
+    record_path = get_build_record_path(output_paths[0])
+    os.makedirs(os.path.dirname(record_path), exist_ok=True)
+    
+    record = {
+        "source": get_source_key(source_file, file_type_token),
+        "params_hash": get_params_hash(params),
+        "params": params,
+        "outputs": {output_path: os.path.getsize(output_path) for output_path in output_paths}
+    }
+    
+    with open(record_path + ".tmp", "w") as record_file:
+        json.dump(record, record_file, indent=2, default=str)
+    os.replace(record_path + ".tmp", record_path)
+
+# Open an output file for writing through a .part file, see close_output
+def open_output (output_path, mode="w"):
+    return open(output_path + ".part", mode)
+
+# Close an output file opened with open_output, renaming it to its final name now that it's complete
+def close_output (output_file):
+    output_file.close()
+    os.replace(output_file.name, output_file.name[0:-len(".part")])
@@ -7,14 +7,26 @@
 
 import math
 import random
+import itertools
 import os # for Fortran .dat
 import numpy as np # for .npy & Fortran .dat
 from scipy.io import FortranFile # for Fortran .dat
+import scipy.ndimage # for smoothing
+import scipy.signal # for FFT smoothing
+import json
 import datetime
+from tracers_cache import get_cache_dir, get_source_key
+from scan_stats import scan_values, pick_minmaxs, log_scan_stats
+from batch_runner import run_frame_batch
+from sequence_scan import get_sequence_minmaxs
+from subsampling import get_cell_keys, get_stratified_rows, get_weighted_rows
+from scan_cache import get_scans
+from build_manifest import is_build_up_to_date, record_build, open_output, close_output
+from run_report import get_run_report_path, start_run_report, start_phase, end_phase, time_chunks, log_progress, finish_run_report, log_slowest_runs
 
 error_start = "\033[91m"
 error_end = "\033[0m"
-    
+
 def remap (input, source_min, source_max, target_min, target_max, clamp_mode):
     if (clamp_mode & (input < source_min)):
         return target_min
@@ -23,8 +35,20 @@ def remap (input, source_min, source_max, target_min, target_max, clamp_mode):
     else:
         return target_min + (target_max - target_min) * (input - source_min) / (source_max - source_min)
 
-def write_unity_header (destination_file, file_name, base_size, testing_density, dimensionality, quality):
+# Same as remap(...) but for whole numpy arrays (same operations order, so same float rounding)
+def remap_array (input, source_min, source_max, target_min, target_max, clamp_mode):
+    result = target_min + (target_max - target_min) * (input - source_min) / (source_max - source_min)
     
+    if (clamp_mode):
+        result = np.where(input < source_min, target_min, result)
+        result = np.where(input > source_max, target_max, result)
+    
+    return result
+
+# 'stream_data' leaves _typelessdata empty, texels then go to a .resS sidecar referenced by write_unity_footer's m_StreamData
+# 'mip_count' levels are expected after the full resolution one, each one half the size of the previous one (see get_mip_count)
+def write_unity_header (destination_file, file_name, base_size, testing_density, dimensionality, quality, stream_data=False, mip_count=1):
+
     actual_size = math.floor(base_size * testing_density)
     
     data_size_scale = 0
@@ -50,8 +74,10 @@ def write_unity_header (destination_file, file_name, base_size, testing_density,
     else:
         print(error_start + "[write_unity_header] Error - unknown quality: " + quality + error_end)
         return None
-        
-    data_size = data_size_scale * dimensionality * (actual_size ** 3)
+    
+    data_size = 0
+    for level in range(0, mip_count):
+        data_size += data_size_scale * dimensionality * (max(1, actual_size >> level) ** 3)
     
     # RGBAFloat -> "23" (values extracted from Texture3D files generated by Unity with various TextureFormat values, as of 2025 (Unity 6.0))
     data_format = ""
@@ -89,7 +115,7 @@ def write_unity_header (destination_file, file_name, base_size, testing_density,
     destination_file.write("  m_Width: " + str(actual_size) + "\n")
     destination_file.write("  m_Height: " + str(actual_size) + "\n")
     destination_file.write("  m_Depth: " + str(actual_size) + "\n")
-    destination_file.write("  m_MipCount: 1\n")
+    destination_file.write("  m_MipCount: " + str(mip_count) + "\n")
     destination_file.write("  m_DataSize: " + str(data_size) + "\n")
     destination_file.write("  m_TextureSettings:\n")
     destination_file.write("    serializedVersion: 2\n")
@@ -101,16 +127,76 @@ def write_unity_header (destination_file, file_name, base_size, testing_density,
     destination_file.write("    m_WrapW: 1\n")
     destination_file.write("  m_UsageMode: 0\n")
     destination_file.write("  m_IsReadable: 1\n")
+    destination_file.write("  image data: " + ("0" if stream_data else str(data_size)) + "\n")
+    destination_file.write("  _typelessdata: ")
+
+# Texture2D version of write_unity_header, for particle attributes packed 4 by 4 into RGBA texels
+# Low quality is TextureFormat.RGBA32 (4 x 8-bit), high quality is TextureFormat.RGBA64 (4 x 16-bit), point filtered so texels are never blended
+def write_unity_texture2d_header (destination_file, file_name, width, height, quality):
+
+    # TextureFormat enum values (Texture2D assets serialize TextureFormat, not GraphicsFormat like Texture3D)
+    if (quality == "low"):
+        texture_format = "4"
+        data_size = 4 * width * height
+    elif (quality == "high"):
+        texture_format = "74"
+        data_size = 8 * width * height
+    else:
+        print(error_start + "[write_unity_texture2d_header] Error - unknown quality: " + quality + error_end)
+        return None
+    
+    destination_file.write("%YAML 1.1\n")
+    destination_file.write("%TAG !u! tag:unity3d.com,2011:\n")
+    destination_file.write("--- !u!28 &2800000\n")
+    destination_file.write("Texture2D:\n")
+    destination_file.write("  m_ObjectHideFlags: 0\n")
+    destination_file.write("  m_CorrespondingSourceObject: {fileID: 0}\n")
+    destination_file.write("  m_PrefabInstance: {fileID: 0}\n")
+    destination_file.write("  m_PrefabAsset: {fileID: 0}\n")
+    destination_file.write("  m_Name: " + file_name + "\n")
+    destination_file.write("  m_ImageContentsHash:\n")
+    destination_file.write("    serializedVersion: 2\n")
+    destination_file.write("    Hash: 00000000000000000000000000000000\n")
+    destination_file.write("  m_IsAlphaChannelOptional: 0\n")
+    destination_file.write("  serializedVersion: 3\n")
+    destination_file.write("  m_Width: " + str(width) + "\n")
+    destination_file.write("  m_Height: " + str(height) + "\n")
+    destination_file.write("  m_CompleteImageSize: " + str(data_size) + "\n")
+    destination_file.write("  m_MipsStripped: 0\n")
+    destination_file.write("  m_TextureFormat: " + texture_format + "\n")
+    destination_file.write("  m_MipCount: 1\n")
+    destination_file.write("  m_IsReadable: 1\n")
+    destination_file.write("  m_IsPreProcessed: 0\n")
+    destination_file.write("  m_IgnoreMipmapLimit: 0\n")
+    destination_file.write("  m_MipmapLimitGroupName: \n")
+    destination_file.write("  m_StreamingMipmaps: 0\n")
+    destination_file.write("  m_StreamingMipmapsPriority: 0\n")
+    destination_file.write("  m_VTOnly: 0\n")
+    destination_file.write("  m_AlphaIsTransparency: 0\n")
+    destination_file.write("  m_ImageCount: 1\n")
+    destination_file.write("  m_TextureDimension: 2\n")
+    destination_file.write("  m_TextureSettings:\n")
+    destination_file.write("    serializedVersion: 2\n")
+    destination_file.write("    m_FilterMode: 0\n")
+    destination_file.write("    m_Aniso: 1\n")
+    destination_file.write("    m_MipBias: 0\n")
+    destination_file.write("    m_WrapU: 1\n")
+    destination_file.write("    m_WrapV: 1\n")
+    destination_file.write("    m_WrapW: 1\n")
+    destination_file.write("  m_LightmapFormat: 0\n")
+    destination_file.write("  m_ColorSpace: 0\n")
+    destination_file.write("  m_PlatformBlob: \n")
     destination_file.write("  image data: " + str(data_size) + "\n")
     destination_file.write("  _typelessdata: ")
 
-def write_unity_footer (destination_file):
+# 'stream_offset', 'stream_size' & 'stream_path' locate texels written to a .resS sidecar (see write_unity_header's 'stream_data')
+def write_unity_footer (destination_file, stream_offset=0, stream_size=0, stream_path=""):
     destination_file.write("\n")
     destination_file.write("  m_StreamData:\n")
     destination_file.write("    serializedVersion: 2\n")
-    destination_file.write("    offset: 0\n")
-    destination_file.write("    size: 0\n")
-    destination_file.write("    path: \n")
+    destination_file.write("    offset: " + str(stream_offset) + "\n")
+    destination_file.write("    size: " + str(stream_size) + "\n")
+    destination_file.write("    path: " + stream_path + "\n")
 
 def parse_int_to_formatted_hex (value, quality):
     # Expected format by Unity R16 tex is a bit effed-up
@@ -135,10 +221,10 @@ def parse_int_to_formatted_hex (value, quality):
             hex_value = hex_value
         else:
             print(error_start + "[parse_int_to_formatted_hex] Sir we have a serious problem here, one hex value is either to short or too long! (high quality encoding)" + error_end)
-            
+        
         # Now reverse the stacks of 2 for Unity R16 & RGB48 formats
         hex_value = hex_value[2] + hex_value[3] + hex_value[0] + hex_value[1]
-            
+    
     elif (quality == "low"):
         hexlen = len(str(hex_value)) # Make sure we always have 2 characters
         if (hexlen == 1):
@@ -150,6 +236,53 @@ def parse_int_to_formatted_hex (value, quality):
     
     return hex_value
 
+# Vectorized remap & quantize of a whole (sub-sampled) cube, one dimension at a time
+# 'values' has shape (x, y, z, dimensionality), the returned integer array has the same shape
+# The R16/RGB48 "stacks of 2" reversal of parse_int_to_formatted_hex is just little-endian 16-bit storage, hence '<u2'
+def encode_klodu_values (values, dimensions, minmaxs, quality):
+    max_resolution = (65536 - 1) if (quality == "high") else (256 - 1)
+    encoded = np.empty(values.shape, dtype=("<u2" if (quality == "high") else "u1"))
+    
+    for d in range(0, len(dimensions)):
+        dimension_mode = dimensions[d][1]
+        val = values[..., d]
+        
+        # Checking mode (math.log10 works with doubles, so do we)
+        if (dimension_mode == "log"):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                val = np.log10(val.astype(np.float64))
+        
+        # Remap (NaNs, from negative values in log mode for instance, end up as 0)
+        min_val = minmaxs[d][0]
+        max_val = minmaxs[d][1]
+        val = np.rint(remap_array(val, min_val, max_val, 0, max_resolution, True))
+        encoded[..., d] = np.nan_to_num(val, nan=0)
+    
+    return encoded
+
+# Bulk version of parse_int_to_formatted_hex for an encode_klodu_values(...) array
+def parse_klodu_to_hex (encoded):
+    return encoded.tobytes().hex()
+
+# Indices j at which the ((j / actual_count) >= (logs_count / nb_logs)) check of the voxel loops prints a log
+def get_log_indices (total_count, actual_count, nb_logs):
+    indices = []
+    j = 0
+    logs_count = 0
+    
+    while (j < total_count):
+        # Jump close to the next threshold, then walk to it with the exact same float comparison
+        j = max(j, math.floor(logs_count * actual_count / nb_logs) - 1)
+        while ((j / actual_count) < (logs_count / nb_logs)):
+            j += 1
+        
+        if (j < total_count):
+            indices.append(j)
+            logs_count += 1
+            j += 1
+    
+    return indices
+
 def round_to_n(x, n):
     return 0 if (x == 0) else round(x, -int(math.floor(round(math.log10(abs(x)) - n + 1))))
 
@@ -158,33 +291,316 @@ def prepend_zeros (value, target_length):
     size = len(str(value))
     for i in range(0, target_length - size):
         result = "0" + str(result)
-        
+    
     return result
+
+# Offsets and sizes (in bytes) of the records of a Fortran unformatted sequential file, as [[offset, size], ...]
+# Record markers are 4-byte integers written before and after each record (FortranFile default)
+# Records split in subrecords (> 2 GB records of gfortran, negative markers) aren't supported
+def get_fortran_records (source_file):
+    records = []
+    file_size = os.path.getsize(source_file)
+    markers = np.memmap(source_file, dtype=np.uint8, mode='r')
+    
+    offset = 0
+    while (offset < file_size):
+        head = int(markers[offset:(offset + 4)].view(np.int32)[0])
+        tail_offset = offset + 4 + head
+        
+        if ((head < 0) or (tail_offset + 4 > file_size) or (int(markers[tail_offset:(tail_offset + 4)].view(np.int32)[0]) != head)):
+            print(error_start + "[get_fortran_records] Error - unreadable Fortran record at byte " + str(offset) + " of " + source_file + error_end)
+            return None
+        
+        records.append([offset + 4, head])
+        offset = tail_offset + 4
     
-# file_type_token: "NUMPY" or "DAT"
-def prepare_data_cube (source_file, file_type_token, dimensionality):
+    return records
+
+# Memory-mapped version of the DAT branch of prepare_data_cube, only touching the pages that get read
+# Voxels are either in one record (F-ordered (sx, sy, sz, dimensionality) cube) or in one record per channel
+def map_fortran_data_cube (source_file, dimensionality):
+    records = get_fortran_records(source_file)
+    if (records is None):
+        return False
+    
+    sx, sy, sz = np.memmap(source_file, dtype=np.int32, mode='r', offset=records[0][0], shape=(3,)) # just the size values
+    sx, sy, sz = int(sx), int(sy), int(sz)
+    channel_size = 4 * sx * sy * sz
+    data_records = records[1:]
+    
+    if ((len(data_records) >= 1) and (data_records[0][1] == channel_size * dimensionality)):
+        return np.memmap(source_file, dtype=np.float32, mode='r', offset=data_records[0][0], shape=(sx, sy, sz, dimensionality), order='F')
     
+    elif ((len(data_records) >= dimensionality) and all(r[1] == channel_size for r in data_records[0:dimensionality])):
+        # Same F-ordered layout, with 8 bytes of record markers between channels
+        channel_stride = (data_records[1][0] - data_records[0][0]) if (dimensionality > 1) else channel_size
+        base = np.memmap(source_file, dtype=np.uint8, mode='r')
+        return np.ndarray((sx, sy, sz, dimensionality), dtype=np.float32, buffer=base, offset=data_records[0][0], strides=(4, 4 * sx, 4 * sx * sy, channel_stride))
+    
+    else:
+        print(error_start + "[map_fortran_data_cube] Error - records of " + source_file + " don't match a " + str(sx) + "x" + str(sy) + "x" + str(sz) + "x" + str(dimensionality) + " cube" + error_end)
+        return False
+
+# file_type_token: "NUMPY" or "DAT"
+# 'memory_mapped' maps the file instead of loading it, so strided previews & slab processing only read the pages they need
+def prepare_data_cube (source_file, file_type_token, dimensionality, memory_mapped=False):
+
     if (file_type_token == "NUMPY"):
-        data = np.load(source_file)
+        data = np.load(source_file, mmap_mode=('r' if memory_mapped else None))
         
         print("Data shape is " + str(data.shape) + " with a total of " + str(data.size) + " elements.")
         
         return data
-        
+    
     elif (file_type_token == "DAT"):
+        if (memory_mapped):
+            return map_fortran_data_cube(os.path.expanduser(source_file), dimensionality)
+        
         f = FortranFile(os.path.expanduser(source_file), 'r')
         
         sx, sy, sz = f.read_ints(np.int32) # just the size values
-        data = f.read_reals(np.float32).reshape((sx, sy, sz, dimensionality), order='F')
+        data = f.read_reals(np.float32)
+        
+        # One record per channel
+        if ((dimensionality > 1) and (data.size == sx * sy * sz)):
+            channels = [data]
+            for d in range(1, dimensionality):
+                channels.append(f.read_reals(np.float32))
+            data = np.concatenate(channels)
+        
+        data = data.reshape((sx, sy, sz, dimensionality), order='F')
         f.close()
         
         return data
-        
+    
     else:
         print("[prepare_data_cube(...)] Unknown file type token: " + file_type_token)
         
         return False
 
+# C-ordered copy of a memory-mapped cube, for slab processing (slabs of x planes, see write_klodu_slabs & resample_data_cube)
+# F-ordered cubes (DAT sources, Fortran-ordered .npy) have x as their fastest axis, so each slab of x planes would touch every page
+# of the file, reads growing to about one file size per slab once the file exceeds the page cache
+# The copy goes once to the cache folder (see tracers_cache), in slabs of y planes so that both its reads & writes stay contiguous,
+# and gets reused while the source file is unchanged. C-ordered cubes are returned as they are
+def get_c_ordered_cube (data, source_file, file_type_token, max_memory_mb):
+    if (data.flags.c_contiguous):
+        return data
+    
+    cache_dir = get_cache_dir(source_file, file_type_token)
+    cube_path = cache_dir + "cube-c-order.npy"
+    record_path = cache_dir + "cube-c-order.json"
+    record = get_source_key(source_file, file_type_token)
+    record["shape"] = list(data.shape)
+    
+    if (os.path.exists(record_path) and os.path.exists(cube_path)):
+        with open(record_path, "r") as record_file:
+            if (json.load(record_file) == record):
+                print("Using C-ordered copy of " + source_file + " (" + cube_path + ")")
+                return np.load(cube_path, mmap_mode="r")
+    
+    print("Copying " + source_file + " to a C-ordered cube (" + cube_path + ") for slab processing...")
+    os.makedirs(cache_dir, exist_ok=True)
+    copy = np.lib.format.open_memmap(cache_dir + "cube-c-order.tmp.npy", mode="w+", dtype=data.dtype, shape=data.shape)
+    plane_bytes = 2 * data.itemsize * data.shape[0] * math.prod(data.shape[2:])
+    planes = max(1, int((1024 if (max_memory_mb is None) else max_memory_mb) * 1024 * 1024 // plane_bytes))
+    
+    for start in range(0, data.shape[1], planes):
+        copy[:, start:(start + planes)] = np.array(data[:, start:(start + planes)], order="F")
+    copy.flush()
+    copy = None
+    os.replace(cache_dir + "cube-c-order.tmp.npy", cube_path)
+    
+    with open(record_path + ".tmp", "w") as record_file:
+        json.dump(record, record_file, indent=2)
+    os.replace(record_path + ".tmp", record_path)
+    
+    return np.load(cube_path, mmap_mode="r")
+
+# Strided view of the data cube matching the voxel loops indices (a * step, b * step, c * step), always with a channels axis
+# Like the voxel loops, the second axis uses x_range
+def sample_data_cube (data, x_range, z_range, step, dimensionality):
+    if (data.ndim == 3):
+        data = data[..., np.newaxis]
+    
+    return data[0:(x_range * step):step, 0:(x_range * step):step, 0:(z_range * step):step, 0:dimensionality]
+
+# Read one frame of a cube sequence for sequence_scan, memory-mapped & keeping 1 voxel every 'sample_step' along each axis
+# Returns one (lazy, strided) view per dimension
+def read_cube_frame (source_file, file_type_token, dimensionality, sample_step):
+    data = prepare_data_cube(source_file, file_type_token, dimensionality, True)
+    if (data.ndim == 3):
+        data = data[..., np.newaxis]
+    values = data[::sample_step, ::sample_step, ::sample_step]
+    
+    return [values[..., d] for d in range(0, dimensionality)]
+
+# Weights (target_count x source_count) resampling an axis of 'source_count' cells to 'target_count' cells
+# "block": mean of the source cells covered by each target cell, partially covered cells being weighted by their overlap
+# "trilinear": linear interpolation at target cell centers (separable, so trilinear over 3 axes)
+def get_resampling_weights (source_count, target_count, resampling):
+    weights = np.zeros((target_count, source_count))
+    ratio = source_count / target_count
+    
+    for t in range(0, target_count):
+        if (resampling == "block"):
+            low = t * ratio
+            high = (t + 1) * ratio
+            for s in range(math.floor(low), min(math.ceil(high), source_count)):
+                weights[t][s] = min(high, s + 1) - max(low, s)
+            weights[t] /= weights[t].sum()
+        
+        elif (resampling == "trilinear"):
+            center = min(max((t + 0.5) * ratio - 0.5, 0), source_count - 1)
+            s = math.floor(center)
+            fraction = center - s
+            weights[t][s] += 1 - fraction
+            weights[t][min(s + 1, source_count - 1)] += fraction
+        
+        else:
+            print(error_start + "[get_resampling_weights] Error - unknown resampling: " + resampling + error_end)
+            return None
+    
+    return weights
+
+# Resample a data cube to 'target_shape' (any size, not only integer divisors), reading the source in slabs of x planes
+# Separable weights (see get_resampling_weights) are applied along y & z on each slab, then along x into the (small) resulting cube
+def resample_data_cube (data, target_shape, resampling, dimensionality, max_memory_mb):
+    if (data.ndim == 3):
+        data = data[..., np.newaxis]
+    data = data[..., 0:dimensionality]
+    
+    weights = []
+    for axis in range(0, 3):
+        weights.append(get_resampling_weights(data.shape[axis], target_shape[axis], resampling))
+    
+    result = np.zeros((target_shape[0], target_shape[1], target_shape[2], dimensionality))
+    slab_size = get_slab_size(data, 1024 if (max_memory_mb is None) else max_memory_mb)
+    
+    for start, stop in get_slab_ranges(data.shape[0], slab_size, False):
+        x_weights = weights[0][:, start:stop]
+        rows = np.nonzero(x_weights.any(axis=1))[0]
+        if (rows.size == 0):
+            continue
+        
+        slab = np.asarray(data[start:stop], dtype=np.float64)
+        slab = np.tensordot(weights[1], slab, axes=(1, 1)) # (ty, x, z, d)
+        slab = np.tensordot(weights[2], slab, axes=(1, 2)) # (tz, ty, x, d)
+        slab = np.tensordot(x_weights[rows[0]:(rows[-1] + 1)], slab, axes=(1, 2)) # (tx, tz, ty, d)
+        result[rows[0]:(rows[-1] + 1)] += slab.transpose(0, 2, 1, 3)
+    
+    return result
+
+# Number of x planes per slab so that transform & encoding intermediates of a slab stay under 'max_memory_mb'
+# Each value costs ~48 bytes along the way (float64 copies & temporaries, texel, hex string), None means a single slab
+# 'next_mip' also counts the float32 buffer of the next mip level out of the ceiling (see write_klodu_slabs)
+def get_slab_size (values, max_memory_mb, next_mip=False):
+    if (max_memory_mb is None):
+        return values.shape[0]
+    
+    plane_bytes = 48 * math.prod(values.shape[1:])
+    budget = max_memory_mb * 1024 * 1024 - (4 * math.prod(get_next_mip_shape(values.shape)) if next_mip else 0)
+    
+    return max(1, min(values.shape[0], int(budget // plane_bytes)))
+
+# [start, stop] ranges of slabs of 'slab_size' planes over 'count' planes
+# With 'even_slabs', slabs start on even planes and a lone odd last plane joins the previous slab, so that halve_cube works slab by slab
+def get_slab_ranges (count, slab_size, even_slabs):
+    if (even_slabs):
+        slab_size = max(2, slab_size - slab_size % 2)
+    
+    ranges = []
+    start = 0
+    while (start < count):
+        stop = min(count, start + slab_size)
+        if (even_slabs and (count - stop == 1)):
+            stop = count
+        ranges.append([start, stop])
+        start = stop
+    
+    return ranges
+
+# Number of mip levels of a full Unity mip chain (down to 1x1x1)
+def get_mip_count (shape):
+    return math.floor(math.log2(max(shape))) + 1
+
+# Shape of the next mip level of a (x, y, z, dimensionality) cube, see halve_axis
+def get_next_mip_shape (shape):
+    return tuple([max(1, count // 2) for count in shape[0:3]]) + tuple(shape[3:])
+
+# Halve one axis with a box filter (mean of pairs), Unity style floor(size / 2) with the odd last plane averaged into the last pair
+def halve_axis (values, axis):
+    count = values.shape[axis]
+    if (count == 1):
+        return values
+    
+    values = np.moveaxis(values, axis, 0)
+    half = count // 2
+    result = (values[0:(2 * half):2] + values[1:(2 * half):2]) / 2
+    if (count % 2 == 1):
+        result[-1] = (values[-3] + values[-2] + values[-1]) / 3
+    
+    return np.moveaxis(result, 0, axis)
+
+# Next mip level of a (x, y, z, dimensionality) cube, averaged in linear space (before any "log" mode transform, like densities add up)
+def halve_cube (values):
+    result = np.asarray(values, dtype=np.float64)
+    for axis in range(0, 3):
+        result = halve_axis(result, axis)
+    
+    return result
+
+# Remap, quantize & write values slab by slab, each slab being freed before the next one gets loaded
+# 'log_indices' are voxel indices (over the whole cube) whose values get printed, see get_log_indices
+# 'binary' writes raw texel bytes (to a .resS sidecar opened in "wb" mode) instead of hex text
+# 'next_mip' builds & returns the next mip level out of the slabs (see halve_cube), halved slabs going straight into a float32
+# buffer counted in the slab size (see get_slab_size), otherwise None is returned
+# 'report' times transform, encode & write phases slab by slab (see run_report), memory-mapped slabs getting read within transform
+def write_klodu_slabs (destination_file, values, dimensions, minmaxs, quality, slab_size, log_indices, step, binary=False, next_mip=False, report=None):
+    dimensionality = len(dimensions)
+    plane_count = math.prod(values.shape[1:-1])
+    next_values = np.empty(get_next_mip_shape(values.shape), dtype=np.float32) if next_mip else None
+    
+    for start, stop in get_slab_ranges(values.shape[0], slab_size, next_mip):
+        slab = values[start:stop]
+        start_phase(report, "transform")
+        if (next_mip):
+            halved = halve_cube(slab)
+            next_values[(start // 2):(start // 2 + halved.shape[0])] = halved
+            halved = None
+        encoded = encode_klodu_values(slab, dimensions, minmaxs, quality)
+        end_phase(report, encoded.size)
+        
+        start_phase(report, "encode")
+        texels = encoded if binary else parse_klodu_to_hex(encoded)
+        end_phase(report, encoded.size)
+        
+        start_phase(report, "write")
+        destination_file.write(texels)
+        end_phase(report, bytes_written=(encoded.nbytes if binary else len(texels)))
+        log_progress(report, stop, values.shape[0], "planes")
+        
+        # Log the same rows the voxel loop used to
+        encoded_rows = encoded.reshape(-1, dimensionality)
+        first_index = start * plane_count
+        for j in log_indices:
+            if (first_index <= j < first_index + encoded_rows.shape[0]):
+                log_row = ""
+                for d in range(0, dimensionality):
+                    log_row = log_row + parse_klodu_to_hex(encoded_rows[j - first_index][d]) + " "
+                print(str(1 + j * step ** 3) + "th row values are: " + log_row)
+        
+        slab = None
+        encoded = None
+        texels = None
+        encoded_rows = None
+    
+    return next_values
+
+# Which values of a cube klodufy scans, as keyed in the scan cache (see scan_cache.get_cached_minmaxs)
+def get_scan_sampling (testing_value, target_size, resampling):
+    return ["cube", testing_value] if (target_size is None) else ["cube", "to", target_size, resampling]
+
 # Create Unity 3D texture out of data cube
 # input dataset should include xyz
 # 'dimensionality' of 1 generates a 3D texture with "R" signel channel
@@ -193,10 +609,20 @@ def prepare_data_cube (source_file, file_type_token, dimensionality):
 # 1-dimension high quality intensities are exported to 16-bit single-channel 3D-texture, TextureFormat.R16 in Unity
 # 3-dimension low quality intensities are exported to 3 x 8-bit RGB 3D-textures, TextureFormat.RGB24 in Unity
 # 3-dimension high quality intensities are exported to 3 x 16-bit RGB 3D-textures, TextureFormat.RGB48 in Unity
-def klodufy (source_file, file_type_token, size, dimensions, minmaxs, quality, dest_path, dest_file_name, testing_density, nb_logs, skip_scanning):
-    
-    # Testing mode inits
-    testing_density = min(1, testing_density) # Make sure it don't go krazy (> 1)
+# 'minmaxs_percentiles' (e.g. [0.5, 99.5]) forces a scan and replaces 'minmaxs' with these percentiles of each dimension
+# 'memory_mapped' maps the source file instead of loading it (see prepare_data_cube), F-ordered sources (DAT) processed in slabs
+# (with 'max_memory_mb' or 'target_size') being copied once to a C-ordered cube so each slab only pages in its own planes (see get_c_ordered_cube)
+# 'max_memory_mb' streams the cube in slabs of x planes so that transform & encoding intermediates stay under this ceiling
+# 'output_mode' is "inline" (hex text in _typelessdata) or "stream" (raw bytes in a .resS sidecar, half the size, faster Unity import)
+# 'mipmaps' adds a full box-filtered mip chain after the full resolution texture
+# 'target_size' resamples the cube to target_size³ instead of picking 1 voxel every N, with "block" (mean) or "trilinear" 'resampling'
+# 'use_cache' reuses scan results of earlier runs on the unchanged source with the same sampling (see scan_cache),
+# 'minmaxs' being None then uses the scanned min & max of each dimension (or their 'minmaxs_percentiles')
+# 'incremental' skips the export if its outputs are there and were built out of the same source & parameters (see build_manifest)
+def klodufy (source_file, file_type_token, size, dimensions, minmaxs, quality, dest_path, dest_file_name, testing_density, nb_logs, skip_scanning, minmaxs_percentiles=None, memory_mapped=False, max_memory_mb=None, output_mode="inline", mipmaps=False, target_size=None, resampling="block", use_cache=True, incremental=False):
+
+    # Testing mode inits (resampling replaces testing density)
+    testing_density = min(1, testing_density) if (target_size is None) else 1 # Make sure it don't go krazy (> 1)
     testing_value = round(1/testing_density)
     
     # Various inits
@@ -206,25 +632,40 @@ def klodufy (source_file, file_type_token, size, dimensions, minmaxs, quality, d
     # Prepare output file name
     dest_file_name = dest_file_name + ("-HQ" if quality == "high" else "-LQ")
     dest_file_name = dest_file_name + ("" if testing_value == 1 else ("-1-in-" + str(testing_value)))
+    dest_file_name = dest_file_name + ("" if (target_size is None) else ("-to-" + str(target_size)))
+    
+    # Skip up to date outputs
+    stream_data = (output_mode == "stream")
+    output_paths = ["output/" + dest_path + dest_file_name + ".asset"] + (["output/" + dest_path + dest_file_name + ".resS"] if stream_data else [])
+    build_params = {"exporter": "klodufy", "size": size, "dimensions": dimensions, "minmaxs": minmaxs, "quality": quality, "testing_density": testing_density, "minmaxs_percentiles": minmaxs_percentiles, "output_mode": output_mode, "mipmaps": mipmaps, "target_size": target_size, "resampling": resampling}
+    if (incremental and is_build_up_to_date(output_paths, source_file, file_type_token, build_params)):
+        print("File " + dest_file_name + ".asset is up to date, skipping it")
+        return
     
     # Hello
     print("Starting work on data cube " + dest_file_name + "...")
     print("type: " + file_type_token + ", size: " + str(size) + ", dimensions: " + str(dimensions) + ", minmaxs: " + str(minmaxs) + ", quality: " + quality + ", testing density: 1 in " + str(testing_value) + "³ == 1 in " + str(testing_value ** 3) + ", number of logs: " + str(nb_logs))
     
-    # Load data cube
-    data = prepare_data_cube(source_file, file_type_token, dimensionality)
+    # Track phases (see run_report)
+    report = start_run_report("klodufy", dest_file_name, dict(build_params, source_file=source_file, memory_mapped=memory_mapped, max_memory_mb=max_memory_mb))
     
-    # Prepare export file
-    destination_file = open("output/" + dest_path + dest_file_name + ".asset", "w")
+    # Load data cube (memory-mapped cubes only get read when sampled)
+    start_phase(report, "load")
+    data = prepare_data_cube(source_file, file_type_token, dimensionality, memory_mapped)
+    if (memory_mapped and ((max_memory_mb is not None) or (target_size is not None))):
+        data = get_c_ordered_cube(data, source_file, file_type_token, max_memory_mb)
+    end_phase(report, data.size, (0 if memory_mapped else data.nbytes))
+    
+    # Prepare export files (renamed once complete, see build_manifest)
+    destination_file = open_output(output_paths[0], "w")
+    if (stream_data):
+        stream_path = dest_file_name + ".resS"
+        stream_file = open_output(output_paths[1], "wb")
     
     # Generate Unity header
-    base_size = data.shape[0]
+    base_size = data.shape[0] if (target_size is None) else target_size
     base_count = base_size * base_size * base_size
     actual_count = math.floor(base_count * (testing_density ** 3))
-    write_unity_header(destination_file, dest_file_name, base_size, testing_density, dimensionality, quality)
-    
-    # Track time taken
-    start_time = datetime.datetime.now()
     
     # Compute ranges (related to testing_density)
     x_range = math.floor(data.shape[0] * testing_density)
@@ -232,227 +673,348 @@ def klodufy (source_file, file_type_token, size, dimensions, minmaxs, quality, d
     z_range = math.floor(data.shape[2] * testing_density)
     step = math.floor(data.shape[1] / x_range)
     
-    # LOOP 1: scan & detect extreme values
-    if (not skip_scanning):
-        print("Scanning " + log_ratio +  str(base_count) + " (== " + str(actual_count) + ") rows to determine min and max values...")
+    mip_count = 1
+    if (mipmaps):
+        mip_count = get_mip_count([x_range, y_range, z_range] if (target_size is None) else [target_size, target_size, target_size])
+    write_unity_header(destination_file, dest_file_name, base_size, testing_density, dimensionality, quality, stream_data, mip_count)
+    
+    # Strided view of the data to process, or resampled cube
+    if (target_size is None):
+        values = sample_data_cube(data, x_range, z_range, step, dimensionality)
+    else:
+        print("Resampling " + str(data.shape[0:3]) + " data cube to " + str(target_size) + "³ (" + resampling + ")...")
+        start_phase(report, "transform")
+        values = resample_data_cube(data, [target_size, target_size, target_size], resampling, dimensionality, max_memory_mb)
+        end_phase(report, data.size)
+        step = 1
+    
+    # Scanned extrema replace missing minmaxs
+    if ((minmaxs is None) and (minmaxs_percentiles is None)):
+        minmaxs_percentiles = [0, 100]
+    
+    # LOOP 1: scan & detect extreme values (also needed to pick minmaxs out of percentiles)
+    scanning = (not skip_scanning) or (minmaxs_percentiles is not None)
+    if (scanning):
+        print("Scanning " + log_ratio +  str(base_count) + " (== " + str(actual_count) + ") rows to determine min, max, mean and histogram values...")
+        start_phase(report, "scan")
         
-        # Init minmax array (extremal values of positions, velocities... whatever)
-        real_minmaxs = []
-        for d in range(0, dimensionality):
-            real_minmaxs.append([float("inf"), float("-inf")])
+        # Log a few rows (5 digits just for the scan)
+        for i in get_log_indices(values[..., 0].size, actual_count, nb_logs):
+            log_row = ""
+            for d in range(0, dimensionality):
+                val = values[np.unravel_index(i, values.shape[0:3]) + (d,)]
+                if (dimensions[d][1] == "log"):
+                    val = math.log10(val) if (val > 0) else float("nan")
+                log_row = log_row + (str(round_to_n(val, 5)) if math.isfinite(val) else str(val)) + " "
+            print(str(1 + i * step ** 3) + "th row values are: " + log_row)
         
-        i = 0
-        logs_count = 0
+        # Vectorized statistics, one dimension at a time (or cached ones, see scan_cache)
+        def scan_cube ():
+            scans = []
+            for d in range(0, dimensionality):
+                scans.append(scan_values(values[..., d], dimensions[d][1]))
+                log_scan_stats(dimensions[d][0], scans[d])
+            return scans
         
-        for a in range(0, x_range):
-            for b in range(0, x_range):
-                for c in range(0, z_range):
-                    aa = a * step
-                    bb = b * step
-                    cc = c * step
-                    
-                    log_row = ""
-                    
-                    for d in range(0, dimensionality):
-                        dimension_name = dimensions[d][0]
-                        dimension_mode = dimensions[d][1]
-                        
-                        # Grab data
-                        if (dimensionality == 1):
-                            val = data[aa][bb][cc]
-                        else:
-                            val = data[aa][bb][cc][d]
-                        
-                        if (dimension_mode == "log"):
-                            val = math.log10(val)
-                            
-                        # Rounding (5 digits just for the scan)
-                        val = round_to_n(val, 5)
-                        
-                        # Update max value
-                        if (val > real_minmaxs[d][1]):
-                            real_minmaxs[d][1] = val
-                            
-                        # Update min value
-                        if (val < real_minmaxs[d][0]):
-                            real_minmaxs[d][0] = val
-                            
-                        # Feed row to potentially log
-                        log_row = log_row + str(val) + " "
-                        
-                    # Maybe log
-                    if ((i / actual_count) >= (logs_count / nb_logs)):
-                        logs_count += 1
-                        print(str(1 + i * step ** 3) + "th row values are: " + log_row)
-                        
-                    i += 1
-
-        # Log detected extrema
-        for d in range(0, dimensionality):
-            dimension_name = dimensions[d][0]
-            print("Min value for " + dimension_name + " is: " + str(real_minmaxs[d][0]))
-            print("Max value for " + dimension_name + " is: " + str(real_minmaxs[d][1]))
+        scans = get_scans(source_file, file_type_token, dimensions, get_scan_sampling(testing_value, target_size, resampling), scan_cube) if use_cache else scan_cube()
+        
+        # Automatic ranges
+        if (minmaxs_percentiles is not None):
+            minmaxs = pick_minmaxs(scans, minmaxs_percentiles)
+            print("Picked minmaxs out of percentiles " + str(minmaxs_percentiles) + ": " + str(minmaxs))
         
-        # Log scanning time
-        mid_time = datetime.datetime.now()
-        delta = mid_time.timestamp() - start_time.timestamp()
-        print("Scanned data in: " + str(round(delta, 2)) + " seconds.")
+        end_phase(report, values.size)
     
     # LOOP 2: normalize so it fits max resolution
     print("Normalizing " + log_ratio + str(data.size) + " (== " + str(actual_count) + ") values, parsing to hex and writing to Texture3D Unity file...")
     print("Using following minmaxs array: " + str(minmaxs))
     
-    max_resolution = (65536 - 1) if (quality == "high") else (256 - 1)
-    
-    j = 0
-    logs_count = 0
-    for a in range(0, x_range):
-        for b in range(0, x_range):
-            for c in range(0, z_range):
-                aa = a * step
-                bb = b * step
-                cc = c * step
-                
-                log_row = ""
-                
-                for d in range(0, dimensionality):
-                    dimension_name = dimensions[d][0]
-                    dimension_mode = dimensions[d][1]
-                    
-                    # Grab data
-                    if (dimensionality == 1):
-                        val = data[aa][bb][cc]
-                    else:
-                        val = data[aa][bb][cc][d]
-                    
-                    # Checking mode
-                    if (dimension_mode == "log"):
-                        val = math.log10(val)
-                        
-                    # Remap
-                    min_val = minmaxs[d][0]
-                    max_val = minmaxs[d][1]
-                    val = round(remap(val, min_val, max_val, 0, max_resolution, True))
-                    hex_value = parse_int_to_formatted_hex(val, quality)
-                    
-                    # Write to file
-                    destination_file.write(str(hex_value))
-                    
-                    # Feed row to potentially log
-                    log_row = log_row + str(hex_value) + " "
-                    
-                # Maybe log
-                if ((j / actual_count) >= (logs_count / nb_logs)):
-                    logs_count += 1
-                    print(str(1 + j * step ** 3) + "th row values are: " + log_row)
-                    
-                j += 1
-    
-    # Log normalizing time
-    end_time = datetime.datetime.now()
-    delta = end_time.timestamp() - (start_time.timestamp() if skip_scanning else mid_time.timestamp())
-    print("Parsed and wrote data to file in: " + str(round(delta, 2)) + " seconds.")
+    # Remap, quantize & write the (sub-sampled) cube one slab of x planes at a time
+    # Mip levels follow level 0 in Unity's layout, each one built out of the previous one
+    slab_size = get_slab_size(values, max_memory_mb, (mip_count > 1))
+    if (slab_size < values.shape[0]):
+        print("Streaming " + str(math.ceil(values.shape[0] / slab_size)) + " slabs of " + str(slab_size) + " planes to stay under " + str(max_memory_mb) + " MB...")
+    log_indices = get_log_indices(values[..., 0].size, actual_count, nb_logs)
+    
+    level_values = values
+    for level in range(0, mip_count):
+        if (level > 0):
+            print("Writing mip level " + str(level) + " of size " + str(level_values.shape[0:3]) + "...")
+            slab_size = get_slab_size(level_values, max_memory_mb, (level < mip_count - 1))
+            log_indices = []
+        
+        level_values = write_klodu_slabs((stream_file if stream_data else destination_file), level_values, dimensions, minmaxs, quality, slab_size, log_indices, step, stream_data, (level < mip_count - 1), report)
     
     # Generate Unity footer
-    write_unity_footer(destination_file)
+    if (stream_data):
+        stream_size = stream_file.tell()
+        close_output(stream_file)
+        write_unity_footer(destination_file, 0, stream_size, stream_path)
+    else:
+        write_unity_footer(destination_file)
+    close_output(destination_file)
+    if (incremental):
+        record_build(output_paths, source_file, file_type_token, build_params)
     
     # Conclude
-    print("File " + dest_file_name + ".asset was created")
+    print("File " + dest_file_name + ".asset was created" + ((" along with " + stream_path) if stream_data else ""))
+    finish_run_report(report, get_run_report_path(dest_path, dest_file_name), values.size, output_paths)
+
+# Yield [first_row_index, rows] chunks of a text point cloud, parsing 'chunk_size' lines at a time
+def iterate_text_chunks (source_file, chunk_size):
+    with open(source_file, "r") as f:
+        first_row_index = 0
+        while (True):
+            lines = list(itertools.islice(f, chunk_size))
+            if (len(lines) == 0):
+                break
+            
+            rows = np.loadtxt(lines, ndmin=2)
+            if (rows.size > 0):
+                yield first_row_index, rows
+                first_row_index += rows.shape[0]
+
+# Deposit points into flat size³ 'counts' & 'sums' arrays (x fastest, k = x + y * size + z * size²) with np.bincount
+# 'bounds_min' & 'bounds_max' are numbers or [x, y, z] lists, 'bounds_mode' is "drop" or "clamp" for out-of-bounds points
+# 'weights' are summed into 'sums' (left alone when None), 'count_weights' makes points count for that many points (subsampled points)
+def deposit_points (counts, sums, positions, weights, size, bounds_min, bounds_max, bounds_mode, count_weights=None):
+    voxel_size = (1 - 0) * 1 / size
+    positions = np.asarray(positions, dtype=np.float64)
+    bounds_min = np.asarray(bounds_min, dtype=np.float64)
+    bounds_max = np.asarray(bounds_max, dtype=np.float64)
+    
+    # Get voxel indices from remapped source positions
+    kept = np.all(np.isfinite(positions), axis=1)
+    indices = np.floor(remap_array(np.where(kept[:, np.newaxis], positions, 0), bounds_min, bounds_max, 0, 1, False) / voxel_size)
+    
+    if (bounds_mode == "drop"):
+        kept &= np.all((indices >= 0) & (indices < size), axis=1)
+    elif (bounds_mode == "clamp"):
+        indices = np.clip(indices, 0, size - 1)
+    else:
+        print(error_start + "[deposit_points] Error - unknown bounds mode: " + bounds_mode + error_end)
+        return
+    
+    indices = indices[kept].astype(np.int64)
+    k = indices[:, 0] + indices[:, 1] * size + indices[:, 2] * size * size
+    
+    counts += np.bincount(k, weights=(None if (count_weights is None) else np.asarray(count_weights, dtype=np.float64)[kept]), minlength=counts.size)
+    if (weights is not None):
+        sums += np.bincount(k, weights=np.asarray(weights, dtype=np.float64)[kept], minlength=sums.size)
+
+# Normalized 1D smoothing kernel: "gaussian" of sigma 'width' voxels (truncated at 3 sigmas) or "tophat" of 2 * width + 1 voxels
+def get_smoothing_kernel (kernel, width):
+    radius = math.ceil(3 * width) if (kernel == "gaussian") else round(width)
+    offsets = np.arange(-radius, radius + 1)
+    
+    if (kernel == "gaussian"):
+        weights = np.exp(-0.5 * (offsets / max(width, 1E-9)) ** 2)
+    elif (kernel == "tophat"):
+        weights = np.ones(offsets.size)
+    else:
+        print(error_start + "[get_smoothing_kernel] Error - unknown kernel: " + kernel + error_end)
+        return None
+    
+    return weights / weights.sum()
+
+# Separable smoothing of a cube (zeros beyond the walls), along each axis with the same 1D kernel
+# Small kernels are convolved directly, kernels longer than 'fft_threshold' voxels go through FFT
+def smooth_cube (cube, kernel, width, fft_threshold=31):
+    weights = get_smoothing_kernel(kernel, width)
+    cube = np.asarray(cube, dtype=np.float64)
+    
+    for axis in range(0, cube.ndim):
+        if (weights.size <= fft_threshold):
+            cube = scipy.ndimage.convolve1d(cube, weights, axis=axis, mode="constant")
+        else:
+            shape = [1] * cube.ndim
+            shape[axis] = weights.size
+            cube = scipy.signal.fftconvolve(cube, weights.reshape(shape), mode="same", axes=axis)
+    
+    return cube
+
+# Smooth deposited 'counts' & 'sums' (flat size³ arrays, sums may be None) with a separable kernel of 'width' voxels
+# With 'adaptive_min_points', each voxel uses the narrowest of width, 2 * width, 4 * width & 8 * width whose box holds that many points
+def smooth_deposits (counts, sums, size, kernel, width, adaptive_min_points):
+    fields = [counts, sums]
+    shape = (size, size, size)
+    
+    if (adaptive_min_points is None):
+        for f in range(0, len(fields)):
+            if (fields[f] is not None):
+                fields[f] = smooth_cube(fields[f].reshape(shape), kernel, width).ravel()
+        return fields[0], fields[1]
+    
+    # Pick a width level per voxel out of local point counts
+    widths = [width, 2 * width, 4 * width, 8 * width]
+    levels = np.full(shape, len(widths) - 1)
+    for l in range(len(widths) - 1, -1, -1):
+        box_size = 2 * round(widths[l]) + 1
+        local_counts = smooth_cube(counts.reshape(shape), "tophat", widths[l]) * (box_size ** 3)
+        levels[local_counts >= adaptive_min_points - 0.5] = l
+    
+    for f in range(0, len(fields)):
+        if (fields[f] is not None):
+            result = np.zeros(shape)
+            for l in range(0, len(widths)):
+                if (np.any(levels == l)):
+                    smoothed = smooth_cube(fields[f].reshape(shape), kernel, widths[l])
+                    result[levels == l] = smoothed[levels == l]
+            fields[f] = result.ravel()
+    
+    return fields[0], fields[1]
+
+# Importance subsample of 'target_count' rows of a text point cloud (see subsampling), picked in one pass over the file
+# "stratified" mode caps points per cell of a 2^sampling_depth grid over source bounds, "weighted" mode picks rows proportionally to their 4th column weight
+# Returns [rows, factors] (see subsampling), or [None, None] for an unknown mode
+def sample_text_rows (source_file, source_xyz_min, source_xyz_max, weight_mode, chunk_size, target_count, sampling_mode, sampling_depth, sampling_seed):
+    if (sampling_mode == "stratified"):
+        bounds_min = np.broadcast_to(np.asarray(source_xyz_min, dtype=np.float64), 3)
+        bounds_max = np.broadcast_to(np.asarray(source_xyz_max, dtype=np.float64), 3)
+        position_chunks = ((first_row_index, first_row_index + rows.shape[0], [rows[:, 0], rows[:, 1], rows[:, 2]]) for first_row_index, rows in iterate_text_chunks(source_file, chunk_size))
+        keys = get_cell_keys(position_chunks, [[bounds_min[a], bounds_max[a]] for a in range(0, 3)], sampling_depth)
+        sampled, factors = get_stratified_rows(keys, target_count, sampling_seed)
+    elif (sampling_mode == "weighted"):
+        weight_chunks = ((first_row_index, first_row_index + rows.shape[0], (10 ** rows[:, 3]) if (weight_mode == "log") else rows[:, 3]) for first_row_index, rows in iterate_text_chunks(source_file, chunk_size))
+        sampled, factors = get_weighted_rows(weight_chunks, target_count, sampling_seed)
+    else:
+        print(error_start + "[sample_text_rows] Error - unknown sampling mode: " + str(sampling_mode) + error_end)
+        return None, None
+    
+    print("Sampled " + str(sampled.shape[0]) + " rows (" + sampling_mode + " mode, seed " + str(sampling_seed) + ")")
+    
+    return sampled, factors
 
 # Count points in pointcloud to create 3D texture (voxel cloud), or add their density
-def klodufy_txt (source_file, size, source_xyz_min, source_xyz_max, quality, dest_path, dest_file_name, testing_density, nb_logs):
+# 'deposit_mode': "count" points per voxel, "sum" or "mean" of their 4th column weights (10^weight when 'weight_mode' is "log")
+# 'source_xyz_min' & 'source_xyz_max' are numbers or [x, y, z] lists, out-of-bounds points are dropped or clamped to the walls ('bounds_mode')
+# Text rows are parsed and deposited 'chunk_size' rows at a time, keeping 1 row every 1/testing_density rows
+# 'smoothing_kernel' ("gaussian" or "tophat") smooths deposits over 'smoothing_width' voxels, adaptively if 'adaptive_min_points' is set (see smooth_deposits)
+# 'target_count' deposits that many rows through importance subsampling instead of testing_density (see sample_text_rows),
+# each one counting (and weighing) for the number of source rows it stands for
+def klodufy_txt (source_file, size, source_xyz_min, source_xyz_max, quality, dest_path, dest_file_name, testing_density, nb_logs, deposit_mode="count", weight_mode="linear", bounds_mode="drop", chunk_size=1000000, smoothing_kernel=None, smoothing_width=1, adaptive_min_points=None, target_count=None, sampling_mode="stratified", sampling_depth=5, sampling_seed=0):
+
+    # Check modes before opening the export file or reading any row
+    modes = [["deposit", deposit_mode, ["count", "sum", "mean"]], ["weight", weight_mode, ["linear", "log"]], ["bounds", bounds_mode, ["drop", "clamp"]]]
+    if (target_count is not None):
+        modes.append(["sampling", sampling_mode, ["stratified", "weighted"]])
+    for name, mode, known_modes in modes:
+        if (mode not in known_modes):
+            print(error_start + "[klodufy_txt] Error - unknown " + name + " mode: " + str(mode) + error_end)
+            return
     
     # Testing mode inits (the generated cube always has a dimension of size³ regardless of testing density
-    testing_density = min(1, testing_density) # Make sure it don't go krazy (> 1)
+    testing_density = min(1, testing_density) if (target_count is None) else 1 # Make sure it don't go krazy (> 1)
     testing_value = round(1/testing_density)
-    
-    arr = np.loadtxt(source_file)
-    leng = arr.shape[0]
-    actual_count = math.floor(leng * testing_density)
     total_size = size * size * size
     
-    #print("Source data shape is " + str(arr.shape))
-    log_ratio = "all of " if testing_value == 1 else ("1 in " + str(testing_value) + " of all ")
-    print("Source row count: " + str(leng))
-    print("Browsing " + log_ratio + str(leng) + " (== " + str(actual_count) + ") points to generate Unity Texture3D file " + dest_file_name + ".txt of cube size " + str(size) + "³ = " + str(total_size) + "...")
+    log_ratio = "all" if testing_value == 1 else ("1 in " + str(testing_value))
+    print("Browsing " + log_ratio + " of the points to generate Unity Texture3D file " + dest_file_name + ".asset of cube size " + str(size) + "³ = " + str(total_size) + " (" + deposit_mode + " mode)...")
     
     # Init empty 3D texture
-    klodu = []
-    voxel_size = (1 - 0) * 1 / size
-    for c in range(0, total_size):
-        klodu.append(0)
+    counts = np.zeros(total_size)
+    sums = np.zeros(total_size) if (deposit_mode != "count") else None
     
     # Prepare export file
     dest_file_name = dest_file_name + ("-HQ" if quality == "high" else "-LQ")
     destination_file = open("output/" + dest_path + dest_file_name + ".asset", "w")
     
-    # Generate Unity header
+    # Track phases (see run_report)
+    report = start_run_report("klodufy_txt", dest_file_name, {"source_file": source_file, "size": size, "source_xyz_min": source_xyz_min, "source_xyz_max": source_xyz_max, "quality": quality, "testing_density": testing_density, "deposit_mode": deposit_mode, "weight_mode": weight_mode, "bounds_mode": bounds_mode, "chunk_size": chunk_size, "smoothing_kernel": smoothing_kernel, "smoothing_width": smoothing_width, "adaptive_min_points": adaptive_min_points, "target_count": target_count, "sampling_mode": sampling_mode, "sampling_depth": sampling_depth, "sampling_seed": sampling_seed})
+    
+    # Generate Unity header (size³ regardless of testing density)
     base_size = size
     dimensionality = 1
-    write_unity_header(destination_file, dest_file_name, base_size, testing_density, dimensionality, quality)
+    write_unity_header(destination_file, dest_file_name, base_size, 1, dimensionality, quality)
     
     # Set max resolution for hex values
     max_resolution = (65536 - 1) if (quality == "high") else (256 - 1)
     
-    # Loop into source data, find nearest voxel and increment its intensity
-    # Also detect max value
-    max_value = 0
+    # Importance subsample (sorted row indices)
+    sampled_rows = None
+    if (target_count is not None):
+        start_phase(report, "load")
+        sampled_rows, sampled_factors = sample_text_rows(source_file, source_xyz_min, source_xyz_max, weight_mode, chunk_size, target_count, sampling_mode, sampling_depth, sampling_seed)
+        end_phase(report)
+        if (sampled_rows is None):
+            destination_file.close()
+            return
+    
+    # Loop into source data chunks (parsing is "load", depositing "transform"), find nearest voxels and increment their intensity
     step = math.floor(testing_value)
-    ii = 0
-    for i in range(0, actual_count):
-        ii = i * step
-        line = arr[ii]
-        x = line[0]
-        y = line[1]
-        z = line[2]
-        v = line[3]
-        xx = remap(x, source_xyz_min, source_xyz_max, 0, 1, False)
-        yy = remap(y, source_xyz_min, source_xyz_max, 0, 1, False)
-        zz = remap(z, source_xyz_min, source_xyz_max, 0, 1, False)
-        vv = v
-        
-        # Get voxel index from remapped source position
-        fix = int(xx / voxel_size) # floor
-        fiy = int(yy  / voxel_size)
-        fiz = int(zz / voxel_size)
-        
-        #print("klodu target indexes are (" + str(fix) + ", " + str(fiy) + ", " + str(fiz) + ")")
-        
-        # Fill target klodu with some value
-        kx = fix
-        ky = fiy * size
-        kz = fiz * size * size
-        k = kx + ky + kz
-        klodu[k] += 1 # 10**(vv + 15)
+    leng = 0
+    actual_count = 0
+    for first_row_index, rows in time_chunks(report, "load", iterate_text_chunks(source_file, chunk_size), lambda chunk: [chunk[1].shape[0], chunk[1].nbytes]):
+        start_phase(report, "transform")
+        leng += rows.shape[0]
+        factors = None
+        if (sampled_rows is None):
+            rows = rows[((-first_row_index) % step)::step]
+        else:
+            first = np.searchsorted(sampled_rows, first_row_index)
+            last = np.searchsorted(sampled_rows, first_row_index + rows.shape[0])
+            rows = rows[sampled_rows[first:last] - first_row_index]
+            factors = sampled_factors[first:last]
+        actual_count += rows.shape[0]
         
-        if (klodu[k] > max_value):
-            max_value = klodu[k]
+        weights = None
+        if (deposit_mode != "count"):
+            weights = rows[:, 3]
+            if (weight_mode == "log"):
+                weights = 10 ** weights
+            if (factors is not None):
+                weights = weights * factors
         
+        deposit_points(counts, sums, rows[:, 0:3], weights, size, source_xyz_min, source_xyz_max, bounds_mode, factors)
+        end_phase(report, rows.shape[0])
+        log_progress(report, leng, None, "source rows")
+    
+    print("Source row count: " + str(leng) + ", deposited " + str(actual_count) + " rows (" + str(int(counts.sum())) + " in bounds)")
+    
+    # Smooth values by looking at neighbours
+    if (smoothing_kernel is not None):
+        start_phase(report, "transform")
+        counts, sums = smooth_deposits(counts, sums, size, smoothing_kernel, smoothing_width, adaptive_min_points)
+        end_phase(report, total_size)
+        print("Smoothed deposits (" + smoothing_kernel + " kernel, width " + str(smoothing_width) + ("" if (adaptive_min_points is None) else (", adaptive for " + str(adaptive_min_points) + " points")) + ")")
+    
+    if (deposit_mode == "count"):
+        klodu = counts
+    elif (deposit_mode == "sum"):
+        klodu = sums
+    else:
+        klodu = np.divide(sums, counts, out=np.zeros(total_size), where=(counts > 0))
+    
+    # Detect max value
+    max_value = klodu.max()
     print("Max value is " + str(max_value))
+    if (max_value <= 0):
+        print(error_start + "[klodufy_txt] Error - no positive value to normalize, check bounds" + error_end)
+        max_value = 1
     
     # Normalize so it fits max resolution, parsing to hex and writing to file
-    print("Normalizing (over " + str(len(klodu)) + " values), parsing to hex and writing to file...")
-    for j in range (0, len(klodu)):
-        klodu[j] = round(klodu[j] / max_value * max_resolution)
-        
-        # Write final klodu values to text file
-        hex_value = parse_int_to_formatted_hex(klodu[j], quality)
-        
-        destination_file.write(str(hex_value))
-        
-        # Print out some values while waiting...
-        if (j % int(len(klodu)/nb_logs) == 0):
-            #print(str(klodu[j]) + " " + str(max_value) + " " + str(max_resolution))
-            print(str(j + 1) + "th value is: " + str(hex_value) + " (" + str(100 * klodu[j] / max_resolution) + "% of max intensity)")
-    
-    # Now... time to smooth values by looking at neighbours...
-    # Coming soon...
-    
+    print("Normalizing (over " + str(total_size) + " values), parsing to hex and writing to file...")
+    start_phase(report, "transform")
+    klodu = np.clip(np.rint(klodu / max_value * max_resolution), 0, max_resolution).astype("<u2" if (quality == "high") else "u1")
+    end_phase(report, total_size)
+    start_phase(report, "encode")
+    texels = parse_klodu_to_hex(klodu)
+    end_phase(report, total_size)
+    start_phase(report, "write")
+    destination_file.write(texels)
+    end_phase(report, bytes_written=len(texels))
+    texels = None
+    
+    # Print out some values
+    for j in range(0, total_size, max(1, int(total_size/nb_logs))):
+        print(str(j + 1) + "th value is: " + parse_klodu_to_hex(klodu[j]) + " (" + str(100 * int(klodu[j]) / max_resolution) + "% of max intensity)")
     
     # Generate Unity footer
     write_unity_footer(destination_file)
+    destination_file.close()
     
     print("Done!")
+    finish_run_report(report, get_run_report_path(dest_path, dest_file_name), leng, ["output/" + dest_path + dest_file_name + ".asset"])
 
 # OBSOLETE
 # Klodufy (voxelize) already cleaned Commerc bifluid file
@@ -555,18 +1117,23 @@ def klodufy_dustyturb_rhov_anim_frame (frame, index):
     dest_path = "dustyturb/524-frames-rhov/"
     dest_file_name = "klo-dustyturb-256-rhov-anim-" + prepend_zeros(str(index), 3)
     skip_scanning = True
+    incremental = True # Reruns only regenerate missing, truncated or outdated frames
     
-    klodufy(source_file, file_type_token, size, dimensions, minmaxs, quality, dest_path, dest_file_name, testing_density, nb_logs, skip_scanning)
+    klodufy(source_file, file_type_token, size, dimensions, minmaxs, quality, dest_path, dest_file_name, testing_density, nb_logs, skip_scanning, incremental=incremental)
 def klodufy_dustyturb_rhov_full_anim ():
     start = 501
     end = 524
+    nb_workers = os.cpu_count()
     diff = end - start
-    print("Generating " + str(diff) + " animation frames with density & velocities...")
+    print("Generating " + str(diff) + " animation frames with density & velocities (up to date ones are skipped)...")
     
+    frame_jobs = []
     for f in range(start, end + 1):
-        klodufy_dustyturb_rhov_anim_frame(f, f)
-        
-    print("Generated " + str(diff + 1) + " Dustyturb RhoV animation frames.")
+        frame_jobs.append((f, f))
+    failures = run_frame_batch(klodufy_dustyturb_rhov_anim_frame, frame_jobs, nb_workers)
+    
+    print("Generated " + str(diff + 1 - len(failures)) + " Dustyturb RhoV animation frames.")
+    log_slowest_runs("output/dustyturb/524-frames-rhov/reports/")
 # klodufy_dustyturb_rhov_full_anim()
 
 # OBSOLETE
@@ -643,7 +1210,7 @@ def klodufy_outflow (source_file, file_type_token, quality, variables_index, siz
     # variables_index == 2 -> vx, vy, vz
     # variables_index == 3 -> Bx, By, Bz
     # variables_index == 4 -> rho, cr, ⌀
-
+    
     dimensionality = 3
     
     # Testing mode inits
@@ -704,17 +1271,17 @@ def klodufy_outflow (source_file, file_type_token, quality, variables_index, siz
             v2 = data[v2_index][ii]
         if (v3_index < 11):
             v3 = data[v3_index][ii]
-            
+        
         if (logarithmic_mode):
             v1 = math.log10(max(1E-30, v1))
             v2 = math.log10(max(1E-30, v2))
             v3 = math.log10(max(1E-30, v3))
-            
+        
         if (rounding_mode):
             v1 = round_to_n(v1, 3)
             v2 = round_to_n(v2, 3)
             v3 = round_to_n(v3, 3)
-            
+        
         if (v1 > real_max_v1):
             real_max_v1 = v1
         if (v1 < real_min_v1):
@@ -727,12 +1294,12 @@ def klodufy_outflow (source_file, file_type_token, quality, variables_index, siz
             real_max_v3 = v3
         if (v3 < real_min_v3):
             real_min_v3 = v3
-            
+        
         if ((i / actual_count) > (logs_count / nb_logs)):
             logs_count += 1
             log_msg = str(v1) + " " + str(v2) + " " + str(v3)
             print(str(i) + "th row values are: " + log_msg)
-                        
+    
     # Log computed metrics
     print("Data min values are: " + str(real_min_v1) + " " + str(real_min_v2) + " " + str(real_min_v3))
     print("Data max values are: " + str(real_max_v1) + " " + str(real_max_v2) + " " + str(real_max_v3))
@@ -761,17 +1328,17 @@ def klodufy_outflow (source_file, file_type_token, quality, variables_index, siz
             v2 = data[v2_index][jj]
         if (v3_index < 11):
             v3 = data[v3_index][jj]
-            
+        
         if (logarithmic_mode):
             v1 = math.log10(max(1E-30, v1))
             v2 = math.log10(max(1E-30, v2))
             v3 = math.log10(max(1E-30, v3))
-            
+        
         if (rounding_mode):
             v1 = round_to_n(v1, 6)
             v2 = round_to_n(v2, 6)
             v3 = round_to_n(v3, 6)
-            
+        
         new_v1 = round(remap(v1, min_v1, max_v1, 0, max_resolution, True))
         new_v2 = round(remap(v2, min_v2, max_v2, 0, max_resolution, True))
         new_v3 = round(remap(v3, min_v3, max_v3, 0, max_resolution, True))
@@ -996,7 +1563,7 @@ def klodufy_tidalstrip_anim_frame (frame, index, type):
         min_val = 1
         max_val = 10
         file_prefix = "density"
-        
+    
     elif (type == "vx" or type == "vy" or type == "vz"):
         logarithmic_mode = False
         min_val = -5
@@ -1008,10 +1575,10 @@ def klodufy_tidalstrip_anim_frame (frame, index, type):
             file_prefix = "velocity_y"
         else:
             file_prefix = "velocity_z"
-            
+    
     else:
         print(error_start + "[klodufy_tidalstrip_anim_frame] Error - unknown type: " + type + error_end)
-        
+    
     source_file = "./data/tidalstrip/46-frames/" + file_prefix + "_output00" + str(frame) + "_GID0009_res128.dat"
     dest_file_name = "klo-tidal-" + type + "-128-anim-" + prepend_zeros(str(index), 3)
     dest_path = "tidalstrip/46-frames/" + type + "/"
@@ -1028,7 +1595,7 @@ def klodufy_tidalstrip_full_46_anim ():
         klodufy_tidalstrip_anim_frame(time, t + 1, "vx")
         klodufy_tidalstrip_anim_frame(time, t + 1, "vy")
         klodufy_tidalstrip_anim_frame(time, t + 1, "vz")
-        
+    
     print("Generated " + str(size) + " animation frames.")
 # klodufy_tidalstrip_full_46_anim()
 
@@ -1060,7 +1627,7 @@ def klodufy_giantclouds_full_37_anim ():
         klodufy_giantclouds_anim_frame(f, 1 + f - 172, "rhovx")
         klodufy_giantclouds_anim_frame(f, 1 + f - 172, "rhovy")
         klodufy_giantclouds_anim_frame(f, 1 + f - 172, "rhovz")
-        
+    
     print("Generated 37 animation frames.")
 # klodufy_giantclouds_full_37_anim()
 
@@ -1092,7 +1659,7 @@ def klodufy_dustyturb_full_XX_anim ():
         klodufy_dustyturb_anim_frame(f, 1 + f - 190, "vx")
         klodufy_dustyturb_anim_frame(f, 1 + f - 190, "vy")
         klodufy_dustyturb_anim_frame(f, 1 + f - 190, "vz")
-        
+    
     print("Generated X animation frames.")
 # klodufy_dustyturb_full_XX_anim()
 
@@ -1111,14 +1678,14 @@ def klodufy_txt_dwarfgal ():
     klodufy_txt(source_file, size, source_xyz_min, source_xyz_max, quality, dest_path, dest_file_name, testing_density, nb_logs)
 # klodufy_txt_dwarfgal()
 
-def klodufy_youngdisk_frame (frame, index):
+def klodufy_youngdisk_frame (frame, index, minmaxs=None):
     frame = prepend_zeros(str(frame), 5)
     index = prepend_zeros(str(index), 4)
     source_file = "./data/youngdisk/1864-frames/ang_mom_stack_" + str(frame) + ".npy"
     file_type_token = "NUMPY"
     size = 137
     dimensions = [ ["rho", "log"] ]
-    minmaxs = [ [-18, -10] ]
+    minmaxs = [ [-18, -10] ] if (minmaxs is None) else minmaxs # Global minmaxs of the sequence when given
     quality = "low"
     dest_path = "youngdisk/1864-frames/"
     dest_file_name = "klo-youngdisk-137-rho-" + str(index)
@@ -1130,13 +1697,26 @@ def klodufy_youngdisk_frame (frame, index):
 def klodufy_youngdisk_full_anim():
     start_index = 460
     end_index = 460
+    nb_workers = os.cpu_count()
     diff = end_index - start_index
     print("Generating " + str(diff) + " animation frames with density data...")
     
+    # Same minmaxs for all frames, out of a parallel pre-pass over the whole sequence (1 voxel in 2³)
+    frames_args = []
+    for f in range(start_index, end_index + 1):
+        frames_args.append(("./data/youngdisk/1864-frames/ang_mom_stack_" + prepend_zeros(str(f), 5) + ".npy", "NUMPY", 1, 2))
+    minmaxs = get_sequence_minmaxs(read_cube_frame, frames_args, [ ["rho", "log"] ], nb_workers, [0.1, 99.9])
+    
+    frame_jobs = []
     i = start_index - 58
     for f in range(start_index, end_index + 1):
         i = i + 1
-        klodufy_youngdisk_frame(f, i)
-        
-    print("Generated " + str(diff + 1) + " animation frames.")
-klodufy_youngdisk_full_anim()
+        frame_jobs.append((f, i, minmaxs))
+    failures = run_frame_batch(klodufy_youngdisk_frame, frame_jobs, nb_workers)
+    
+    print("Generated " + str(diff + 1 - len(failures)) + " animation frames.")
+    log_slowest_runs("output/youngdisk/1864-frames/reports/")
+
+# Guarded so that process pool workers can import this file without running anything
+if (__name__ == "__main__"):
+    klodufy_youngdisk_full_anim()
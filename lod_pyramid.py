@@ -0,0 +1,91 @@
+# ANDRIX ® 2025 🤙
+#
+# Octree LOD pyramid of particles, built in one pass over Morton-ordered rows (see morton_order)
+# Level L holds one point per occupied octree cell of depth base_depth + L, at the particles mean (count-weighted attributes)
+# One occupied child of each coarser point's cell gets skipped, so loading levels 0..k gives as many points as there are
+# occupied cells of depth base_depth + k. It isn't one point per occupied cell though: a mean can lie in an empty child cell,
+# the most populated child then standing for it (see get_covered_cells), so some points sit in cells holding no particles
+
+import numpy as np
+from morton_order import bits_per_axis, get_morton_keys, get_octree_nodes
+
+# Per-level cell sums of Morton-ordered chunks ([first_row, last_row, columns], see sph_textufy.iterate_tracers_chunks)
+# Cells spanning two chunks simply get both partial sums, cells of a chunk being consecutive cells of the whole level
+# Returns [[first_rows, sums], ...] for each depth of 'depths', sums being (nb_cells, nb_columns) float64 arrays
+def accumulate_lod_sums (chunks, sorted_keys, depths):
+    all_first_rows = [get_octree_nodes(sorted_keys, depth)[1] for depth in depths]
+    all_sums = [None] * len(depths)
+    
+    for first_row, last_row, columns in chunks:
+        values = np.empty((last_row - first_row, len(columns)))
+        for c in range(0, len(columns)):
+            values[:, c] = columns[c]
+        
+        for l in range(0, len(depths)):
+            first_rows = all_first_rows[l]
+            if (all_sums[l] is None):
+                all_sums[l] = np.zeros((first_rows.shape[0], len(columns)))
+            
+            # Cells of this chunk: the one holding first_row, then those starting within the chunk
+            first_cell = np.searchsorted(first_rows, first_row, side="right") - 1
+            last_cell = np.searchsorted(first_rows, last_row, side="left")
+            starts = np.maximum(first_rows[first_cell:last_cell], first_row) - first_row
+            all_sums[l][first_cell:last_cell] += np.add.reduceat(values, starts, axis=0)
+    
+    levels = [[all_first_rows[l], all_sums[l]] for l in range(0, len(depths))]
+    
+    return levels
+
+# Occupied cells of the current level already holding a point of a coarser level, one per cell of the previous level
+# That is the cell holding the previous level covering point ('parent_covers' full Morton keys) if occupied, or else the most populated child
+def get_covered_cells (cell_keys, counts, parent_indices, parent_covers, shift):
+    covered = (parent_covers[parent_indices] >> shift) == cell_keys
+    has_covered_child = np.zeros(parent_covers.shape[0], dtype=bool)
+    has_covered_child[parent_indices[covered]] = True
+    
+    # Most populated child of each parent (first in Morton order on ties)
+    by_parent = np.lexsort((-counts, parent_indices))
+    firsts = by_parent[np.concatenate([[True], parent_indices[by_parent][1:] != parent_indices[by_parent][:-1]])]
+    covered[firsts[~has_covered_child[parent_indices[firsts]]]] = True
+    
+    return covered
+
+# Build LOD levels out of Morton-ordered chunks of columns, 'position_columns' being the x, y & z column indices of the chunks
+# 'sorted_keys' are the sorted Morton keys of the rows (see morton_order.get_morton_order), 'position_minmaxs' their x, y & z ranges
+# Returns [[means, counts], ...] for levels 0 to nb_levels - 1, means being (nb_points, nb_columns) float64 arrays
+def build_lod_levels (chunks, sorted_keys, position_columns, position_minmaxs, base_depth, nb_levels):
+    depths = [min(bits_per_axis, base_depth + level) for level in range(0, nb_levels)]
+    sums = accumulate_lod_sums(chunks, sorted_keys, depths)
+    
+    levels = []
+    parent_keys = None
+    parent_covers = None
+    for l in range(0, nb_levels):
+        first_rows, cell_sums = sums[l]
+        counts = np.diff(np.append(first_rows, sorted_keys.shape[0]))
+        shift = np.uint64(3 * (bits_per_axis - depths[l]))
+        cell_keys = sorted_keys[first_rows] >> shift
+        
+        # Each cell of the previous level already holds one point, the finer cell holding it gets skipped
+        if (l == 0):
+            new_cells = np.ones(cell_keys.shape[0], dtype=bool)
+            parent_indices = None
+        else:
+            parent_indices = np.searchsorted(parent_keys, cell_keys >> np.uint64(3 * (depths[l] - depths[l - 1])))
+            new_cells = ~get_covered_cells(cell_keys, counts, parent_indices, parent_covers, shift)
+        
+        means = cell_sums[new_cells] / counts[new_cells][:, np.newaxis]
+        x, y, z = [means[:, c] for c in position_columns]
+        
+        # Covering point of each cell, for the next level
+        covers = np.empty(cell_keys.shape[0], dtype=np.uint64)
+        covers[new_cells] = get_morton_keys(x, y, z, position_minmaxs)
+        if (parent_indices is not None):
+            covers[~new_cells] = parent_covers[parent_indices[~new_cells]]
+        parent_keys = cell_keys
+        parent_covers = covers
+        
+        levels.append([means, counts[new_cells]])
+        print("LOD level " + str(l) + " (depth " + str(depths[l]) + "): " + str(means.shape[0]) + " new points out of " + str(cell_keys.shape[0]) + " occupied cells")
+    
+    return levels
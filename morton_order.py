@@ -0,0 +1,101 @@
+# ANDRIX ® 2025 🤙
+#
+# Morton (Z-order) keys for particles, so that particles close in space end up close in textures & files
+# Positions are remapped to 21-bit integers per axis and interleaved into 63-bit keys (x bits first, then y, then z)
+# Sorted keys give contiguous row ranges for each octree node, written to a JSON index next to the export
+
+import json
+import numpy as np
+
+bits_per_axis = 21
+
+# Spread the 21 low bits of 'values' (uint64, modified in place) 3 bits apart, "magic bits" style
+def spread_bits (values):
+    shifted = np.empty_like(values)
+    values &= np.uint64(0x1fffff)
+    for shift, mask in [[32, 0x1f00000000ffff], [16, 0x1f0000ff0000ff], [8, 0x100f00f00f00f00f], [4, 0x10c30c30c30c30c3], [2, 0x1249249249249249]]:
+        np.left_shift(values, np.uint64(shift), out=shifted)
+        values |= shifted
+        values &= np.uint64(mask)
+    
+    return values
+
+# Gather every 3rd bit of 'values' (uint64, modified in place) back into their 21 low bits, reversing spread_bits
+def compact_bits (values):
+    shifted = np.empty_like(values)
+    values &= np.uint64(0x1249249249249249)
+    for shift, mask in [[2, 0x10c30c30c30c30c3], [4, 0x100f00f00f00f00f], [8, 0x1f0000ff0000ff], [16, 0x1f00000000ffff], [32, 0x1fffff]]:
+        np.right_shift(values, np.uint64(shift), out=shifted)
+        values ^= shifted
+        values &= np.uint64(mask)
+    
+    return values
+
+# Remap a position column to [0, 2^21 - 1] integers (clamped, NaNs to 0)
+def quantize_positions (column, min_val, max_val):
+    cells = np.asarray(column, dtype=np.float64) - min_val
+    cells *= (2 ** bits_per_axis - 1) / (max_val - min_val)
+    np.nan_to_num(cells, copy=False, nan=0)
+    np.clip(cells, 0, 2 ** bits_per_axis - 1, out=cells)
+    np.rint(cells, out=cells)
+    
+    return cells.astype(np.uint64)
+
+# 63-bit Morton keys of x, y & z position columns, 'minmaxs' being their [min, max] ranges
+def get_morton_keys (x, y, z, minmaxs):
+    keys = spread_bits(quantize_positions(x, minmaxs[0][0], minmaxs[0][1]))
+    for axis, column in [[1, y], [2, z]]:
+        bits = spread_bits(quantize_positions(column, minmaxs[axis][0], minmaxs[axis][1]))
+        bits <<= np.uint64(axis)
+        keys |= bits
+    
+    return keys
+
+# Row order sorting 'keys', with equal keys kept in row order
+# Unstable argsort is ~3x faster, the stable one only runs when some keys are equal
+def get_morton_order (keys):
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    
+    if (np.any(sorted_keys[1:] == sorted_keys[:-1])):
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+    
+    return order, sorted_keys
+
+# Octree nodes of level 'level' ('sorted_keys' being sorted Morton keys), identified by the 3 * level top bits of the keys
+# Returns [node_keys, first_rows], the particles of node k lying in rows [first_rows[k], first_rows[k + 1])
+def get_octree_nodes (sorted_keys, level):
+    nodes = sorted_keys >> np.uint64(3 * (bits_per_axis - level))
+    first_rows = np.flatnonzero(np.concatenate([[True], nodes[1:] != nodes[:-1]])) if (nodes.size > 0) else np.zeros(0, dtype=np.int64)
+    
+    return nodes[first_rows], first_rows
+
+# Contiguous row ranges of octree nodes, for levels 0 (root) to 'nb_levels' ('sorted_keys' being sorted Morton keys)
+# A node of level L is identified by the 3 * L top bits of the keys, its particles lie in rows [first_row, first_row + count)
+def get_octree_ranges (sorted_keys, nb_levels):
+    levels = []
+    for level in range(0, nb_levels + 1):
+        node_keys, first_rows = get_octree_nodes(sorted_keys, level)
+        counts = np.diff(np.append(first_rows, sorted_keys.size))
+        levels.append({
+            "level": level,
+            "nodes": node_keys.tolist(),
+            "first_rows": first_rows.tolist(),
+            "counts": counts.tolist()
+        })
+    
+    return levels
+
+# Write the octree index (JSON) of a Morton-ordered export
+def write_octree_index (index_path, sorted_keys, nb_levels, position_names, minmaxs):
+    index = {
+        "count": int(sorted_keys.shape[0]),
+        "bits_per_axis": bits_per_axis,
+        "positions": position_names,
+        "minmaxs": minmaxs,
+        "levels": get_octree_ranges(sorted_keys, nb_levels)
+    }
+    
+    with open(index_path, "w") as index_file:
+        json.dump(index, index_file)
@@ -0,0 +1,171 @@
+# ANDRIX ® 2025 🤙
+#
+# Region of interest extraction (box, sphere or frustum) through a grid hash of particle positions
+# The grid hash sorts particle rows by cell of a 2^depth grid over the position bounds (Morton order, see morton_order),
+# so each occupied cell is a contiguous range of rows. It's built once per dump & depth, cached next to the columnar cache
+# (see tracers_cache), and regions then only read particles of the cells they intersect
+#
+# Regions:
+# ["box", [[xmin, xmax], [ymin, ymax], [zmin, zmax]]]
+# ["sphere", [cx, cy, cz], radius]
+# ["frustum", [[a, b, c, d], ...]] keeping points with a * x + b * y + c * z + d >= 0 for every plane (see get_frustum_planes)
+
+import os
+import json
+import numpy as np
+from tracers_cache import get_cache_dir, get_source_key
+from morton_order import bits_per_axis, compact_bits, get_morton_keys, get_morton_order
+
+# Cache folder of the grid hash of 'source_file' at 'depth'
+def get_region_index_dir (source_file, file_type_token, depth):
+    return get_cache_dir(source_file, file_type_token) + "region-index-" + str(depth) + "/"
+
+# Grid hash of 'source_file' at 'depth' (memory-mapped), or None without a valid cache
+def load_region_index (source_file, file_type_token, depth):
+    index_dir = get_region_index_dir(source_file, file_type_token, depth)
+    if (not os.path.exists(index_dir + "manifest.json")):
+        return None
+    
+    with open(index_dir + "manifest.json", "r") as manifest_file:
+        manifest = json.load(manifest_file)
+    
+    for name, value in get_source_key(source_file, file_type_token).items():
+        if (manifest.get(name) != value):
+            return None
+    
+    index = {
+        "depth": manifest["depth"],
+        "bounds": manifest["bounds"],
+        "rows": np.load(index_dir + "rows.npy", mmap_mode="r"),
+        "cells": np.load(index_dir + "cells.npy", mmap_mode="r"),
+        "first_rows": np.load(index_dir + "first_rows.npy", mmap_mode="r")
+    }
+    
+    return index
+
+# Build & cache the grid hash of 'source_file' at 'depth', then load it
+# 'read_positions()' yields [first_row, last_row, [x, y, z]] chunks of all 'count' rows, it's called twice (bounds, then cells)
+def write_region_index (source_file, file_type_token, depth, read_positions, count):
+    index_dir = get_region_index_dir(source_file, file_type_token, depth)
+    os.makedirs(index_dir, exist_ok=True)
+    
+    # Finite position bounds
+    bounds = [[float("inf"), float("-inf")] for axis in range(0, 3)]
+    for first_row, last_row, columns in read_positions():
+        for axis in range(0, 3):
+            finite = columns[axis][np.isfinite(columns[axis])]
+            if (finite.size > 0):
+                bounds[axis] = [min(bounds[axis][0], float(finite.min())), max(bounds[axis][1], float(finite.max()))]
+    for axis in range(0, 3):
+        if (bounds[axis][0] > bounds[axis][1]):
+            bounds[axis] = [0.0, 1.0]
+        if (bounds[axis][0] == bounds[axis][1]):
+            bounds[axis][1] = bounds[axis][0] + 1.0
+    
+    # Rows sorted by cell
+    keys = np.empty(count, dtype=np.uint64)
+    for first_row, last_row, columns in read_positions():
+        keys[first_row:last_row] = get_morton_keys(columns[0], columns[1], columns[2], bounds)
+    keys >>= np.uint64(3 * (bits_per_axis - depth))
+    rows, sorted_keys = get_morton_order(keys)
+    keys = None
+    
+    first_rows = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])) if (count > 0) else np.zeros(0, dtype=np.int64)
+    cell_keys = sorted_keys[first_rows]
+    cells = np.empty((cell_keys.shape[0], 3), dtype=np.int32)
+    for axis in range(0, 3):
+        cells[:, axis] = compact_bits(cell_keys >> np.uint64(axis))
+    
+    for name, array in [["rows", rows], ["cells", cells], ["first_rows", np.append(first_rows, count)]]:
+        np.save(index_dir + name + ".tmp.npy", array)
+        os.replace(index_dir + name + ".tmp.npy", index_dir + name + ".npy")
+    
+    # Manifest goes last, so a half-written index is never picked up
+    manifest = get_source_key(source_file, file_type_token)
+    manifest["count"] = int(count)
+    manifest["depth"] = depth
+    manifest["bounds"] = bounds
+    with open(index_dir + "manifest.tmp.json", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(index_dir + "manifest.tmp.json", index_dir + "manifest.json")
+    
+    print("Grid hash of " + source_file + " (" + str(cells.shape[0]) + " occupied cells of depth " + str(depth) + ") cached to " + index_dir)
+    
+    return load_region_index(source_file, file_type_token, depth)
+
+# Which of the 'lo' to 'hi' axis-aligned boxes ((n, 3) arrays) intersect 'region', points being boxes with lo == hi
+def intersects_region (lo, hi, region):
+    if (region[0] == "box"):
+        region_lo = np.array([minmax[0] for minmax in region[1]])
+        region_hi = np.array([minmax[1] for minmax in region[1]])
+        return np.all((hi >= region_lo) & (lo <= region_hi), axis=1)
+    
+    if (region[0] == "sphere"):
+        center = np.array(region[1], dtype=np.float64)
+        gaps = np.maximum(np.maximum(lo - center, center - hi), 0)
+        return np.sum(gaps * gaps, axis=1) <= region[2] * region[2]
+    
+    if (region[0] == "frustum"):
+        inside = np.ones(lo.shape[0], dtype=bool)
+        for a, b, c, d in region[1]:
+            # Box corner furthest along the plane normal
+            normal = np.array([a, b, c], dtype=np.float64)
+            corners = np.where(normal > 0, hi, lo)
+            inside &= (corners @ normal + d) >= 0
+        return inside
+    
+    print("[intersects_region(...)] Unknown region type " + str(region[0]) + ", use box, sphere or frustum")
+    return np.zeros(lo.shape[0], dtype=bool)
+
+# Rows of the cells intersecting 'region', sorted, cells being widened by a Morton quantization step (positions get rounded, see morton_order.quantize_positions)
+def get_region_candidates (index, region):
+    depth = index["depth"]
+    bounds = np.array(index["bounds"], dtype=np.float64)
+    scales = (bounds[:, 1] - bounds[:, 0]) / (2 ** bits_per_axis - 1)
+    cell_size = 2 ** (bits_per_axis - depth)
+    
+    cells = np.asarray(index["cells"], dtype=np.float64)
+    lo = bounds[:, 0] + (cells * cell_size - 1) * scales
+    hi = bounds[:, 0] + ((cells + 1) * cell_size) * scales
+    hit_cells = np.flatnonzero(intersects_region(lo, hi, region))
+    
+    # Concatenate the row ranges of hit cells
+    first_rows = index["first_rows"]
+    starts = np.asarray(first_rows[hit_cells])
+    counts = np.asarray(first_rows[hit_cells + 1]) - starts
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    candidates = np.asarray(index["rows"])[np.arange(offsets.shape[0]) + offsets]
+    
+    return np.sort(candidates)
+
+# Candidate rows whose position lies in 'region'
+# 'read_positions(rows)' yields [first_row, last_row, [x, y, z]] chunks of the positions of 'rows'
+def select_region_rows (candidates, read_positions, region):
+    keep = np.zeros(candidates.shape[0], dtype=bool)
+    for first_row, last_row, columns in read_positions(candidates):
+        positions = np.empty((last_row - first_row, 3))
+        for axis in range(0, 3):
+            positions[:, axis] = columns[axis]
+        keep[first_row:last_row] = intersects_region(positions, positions, region)
+    
+    return candidates[keep]
+
+# Frustum region of a perspective camera at 'position' looking at 'target' ('vertical_fov' in degrees, 'aspect' being width / height)
+def get_frustum_planes (position, target, up, vertical_fov, aspect, near, far):
+    position = np.array(position, dtype=np.float64)
+    forward = np.array(target, dtype=np.float64) - position
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, np.array(up, dtype=np.float64))
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+    
+    tan_vertical = np.tan(np.radians(vertical_fov) / 2)
+    tan_horizontal = tan_vertical * aspect
+    
+    # Inward normals: near, far, then left, right, bottom & top planes through the camera
+    planes = [[forward, -forward @ (position + forward * near)], [-forward, forward @ (position + forward * far)]]
+    for normal in [right + forward * tan_horizontal, -right + forward * tan_horizontal, up + forward * tan_vertical, -up + forward * tan_vertical]:
+        normal = normal / np.linalg.norm(normal)
+        planes.append([normal, -normal @ position])
+    
+    return [[float(normal[0]), float(normal[1]), float(normal[2]), float(d)] for normal, d in planes]
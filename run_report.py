@@ -0,0 +1,188 @@
+# ANDRIX ® 2025 🤙
+#
+# Structured run reports of exporters, one JSON file per run (output/<dest_path>reports/<dest_file_name>.json)
+# so slow frames of a batch stand out (see log_slowest_runs)
+# Phases: "load" (reading sources), "scan" (statistics), "transform" (resampling, mips, remap & quantize), "encode" (hex & text
+# formatting) and "write" (file writes), each with wall & CPU time, elements & bytes read or written, elements/s and peak RSS
+# Phases nest: starting one pauses the running one, so phase times are exclusive, generator pipelines included (see time_chunks)
+# Phases get timed per chunk or slab, never per element, and progress logs are rate-limited (see log_progress)
+
+import os
+import sys
+import json
+import time
+import datetime
+
+try:
+    import resource # Unix only, for peak RSS
+except ImportError:
+    resource = None
+
+# Seconds between two progress logs of a run
+progress_log_interval = 10
+
+# Peak resident memory of the process so far in MB, or None where unknown
+def get_peak_rss_mb ():
+    if (resource is None):
+        return None
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    return peak / (1024 * 1024) if (sys.platform == "darwin") else peak / 1024 # bytes on macOS, KB on Linux
+
+# Report file of a run exporting 'dest_file_name' to output/'dest_path'
+def get_run_report_path (dest_path, dest_file_name):
+    return "output/" + dest_path + "reports/" + dest_file_name + ".json"
+
+# New run report of 'exporter' producing 'name', 'parameters' being anything JSON-friendly
+def start_run_report (exporter, name, parameters):
+    now = time.perf_counter()
+    
+    return {
+        "exporter": exporter,
+        "name": name,
+        "parameters": parameters,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "phases": {},
+        "clock": [now, time.process_time()],
+        "running": [],
+        "last_log": now
+    }
+
+# Phase record of 'report', created on first use
+def get_phase (report, name):
+    if (name not in report["phases"]):
+        report["phases"][name] = {"wall_seconds": 0.0, "cpu_seconds": 0.0, "elements": 0, "bytes_read": 0, "bytes_written": 0, "peak_rss_mb": None}
+    
+    return report["phases"][name]
+
+# Add the time spent since its last (re)start to the running phase
+def add_running_time (report, wall, cpu):
+    if (len(report["running"]) > 0):
+        running = report["running"][-1]
+        phase = get_phase(report, running[0])
+        phase["wall_seconds"] += wall - running[1]
+        phase["cpu_seconds"] += cpu - running[2]
+        running[1] = wall
+        running[2] = cpu
+
+# Start phase 'name', pausing the running one until end_phase ('report' being None does nothing, so helpers work without reports)
+def start_phase (report, name):
+    if (report is None):
+        return
+    
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    add_running_time(report, wall, cpu)
+    report["running"].append([name, wall, cpu])
+
+# End the last started phase, adding 'elements' processed & bytes read or written to it, then resume the paused one
+def end_phase (report, elements=0, bytes_read=0, bytes_written=0):
+    if (report is None):
+        return
+    
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    add_running_time(report, wall, cpu)
+    name = report["running"].pop()[0]
+    
+    # The paused phase resumes now
+    if (len(report["running"]) > 0):
+        report["running"][-1][1] = wall
+        report["running"][-1][2] = cpu
+    
+    phase = get_phase(report, name)
+    phase["elements"] += int(elements)
+    phase["bytes_read"] += int(bytes_read)
+    phase["bytes_written"] += int(bytes_written)
+    phase["peak_rss_mb"] = get_peak_rss_mb()
+
+# Elements (rows) & bytes of a [first_row, last_row, columns] chunk
+def count_chunk_rows (chunk):
+    return chunk[1] - chunk[0], 0
+
+# Same as count_chunk_rows, also counting column bytes (as read)
+def count_chunk_columns (chunk):
+    return chunk[1] - chunk[0], sum([column.nbytes for column in chunk[2]])
+
+# Pipeline stage: time pulling each chunk out of 'chunks' as phase 'name', 'count_chunk(chunk)' giving its [elements, bytes read]
+# Upstream stages timing themselves pause this phase, so it only gets the work of the stage right before it
+def time_chunks (report, name, chunks, count_chunk=count_chunk_rows):
+    iterator = iter(chunks)
+    while True:
+        start_phase(report, name)
+        chunk = next(iterator, None)
+        if (chunk is None):
+            end_phase(report)
+            return
+        
+        elements, bytes_read = count_chunk(chunk)
+        end_phase(report, elements, bytes_read)
+        yield chunk
+
+# Log progress of the run ('done' out of 'total' 'unit', total being None if unknown), at most once every progress_log_interval seconds
+def log_progress (report, done, total, unit):
+    now = time.perf_counter()
+    if ((report is None) or (now - report["last_log"] < progress_log_interval)):
+        return
+    
+    report["last_log"] = now
+    elapsed = now - report["clock"][0]
+    ratio = "" if (not total) else (" (" + str(round(100 * done / total, 1)) + "%)")
+    print("Progress: " + str(done) + ("" if (total is None) else ("/" + str(total))) + " " + unit + ratio + " in " + str(round(elapsed, 1)) + " seconds")
+
+# Complete 'report' with totals (run wall & CPU time, 'elements' of the source, sizes of 'output_paths', peak RSS),
+# write it to 'report_path' (through a temporary file, so a half-written report is never picked up) & log it
+def finish_run_report (report, report_path, elements, output_paths):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    while (len(report["running"]) > 0):
+        end_phase(report)
+    
+    report["wall_seconds"] = wall - report["clock"][0]
+    report["cpu_seconds"] = cpu - report["clock"][1]
+    report["elements"] = int(elements)
+    report["elements_per_second"] = (elements / report["wall_seconds"]) if (report["wall_seconds"] > 0) else None
+    report["bytes_written"] = sum([os.path.getsize(output_path) for output_path in output_paths if os.path.exists(output_path)])
+    report["peak_rss_mb"] = get_peak_rss_mb()
+    for phase in report["phases"].values():
+        phase["elements_per_second"] = (phase["elements"] / phase["wall_seconds"]) if ((phase["elements"] > 0) and (phase["wall_seconds"] > 0)) else None
+    
+    saved = {name: value for name, value in report.items() if (name not in ["clock", "running", "last_log"])}
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path + ".tmp", "w") as report_file:
+        json.dump(saved, report_file, indent=2, default=str)
+    os.replace(report_path + ".tmp", report_path)
+    
+    log_run_report(saved)
+    print("Run report written to " + report_path)
+    
+    return saved
+
+# Print a run report (see finish_run_report), one line per phase
+def log_run_report (report):
+    peak = "" if (report["peak_rss_mb"] is None) else (", peak RSS " + str(round(report["peak_rss_mb"])) + " MB")
+    print(report["name"] + " took " + str(round(report["wall_seconds"], 2)) + " seconds (" + str(round(report["cpu_seconds"], 2)) + " CPU)" + peak + ", " + str(report["bytes_written"]) + " bytes written")
+    
+    for name, phase in report["phases"].items():
+        rate = "" if (phase["elements_per_second"] is None) else (", " + str(round(phase["elements_per_second"])) + " elements/s")
+        transfers = ("" if (phase["bytes_read"] == 0) else (", " + str(phase["bytes_read"]) + " bytes read")) + ("" if (phase["bytes_written"] == 0) else (", " + str(phase["bytes_written"]) + " bytes written"))
+        print("- " + name + ": " + str(round(phase["wall_seconds"], 2)) + " seconds (" + str(round(phase["cpu_seconds"], 2)) + " CPU)" + rate + transfers)
+
+# Print the 'count' slowest runs of the reports in 'report_dir' (e.g. the frames of a batch), with their slowest phase
+def log_slowest_runs (report_dir, count=5):
+    reports = []
+    for file_name in sorted(os.listdir(report_dir)) if os.path.isdir(report_dir) else []:
+        if (file_name.endswith(".json")):
+            with open(os.path.join(report_dir, file_name), "r") as report_file:
+                reports.append(json.load(report_file))
+    
+    if (len(reports) == 0):
+        print("[log_slowest_runs(...)] No run report in " + report_dir)
+        return
+    
+    walls = sorted([report["wall_seconds"] for report in reports])
+    print("Slowest of " + str(len(reports)) + " runs (median " + str(round(walls[len(walls) // 2], 2)) + " seconds):")
+    for report in sorted(reports, key=lambda report: -report["wall_seconds"])[0:count]:
+        slowest = max(report["phases"].items(), key=lambda item: item[1]["wall_seconds"], default=["none", {"wall_seconds": 0}])
+        print("- " + report["name"] + ": " + str(round(report["wall_seconds"], 2)) + " seconds, mostly " + slowest[0] + " (" + str(round(slowest[1]["wall_seconds"], 2)) + " seconds)")
@@ -0,0 +1,88 @@
+# ANDRIX ® 2025 🤙
+#
+# Persistent cache of scan results (see scan_stats), so reruns on an unchanged source don't scan it again
+# Scans are stored per dimension in a scans.json sidecar of the source cache folder (see tracers_cache), keyed by dimension index,
+# name & mode and by the sampling of the scanned values (testing density, resampling, region...), the whole file being
+# dropped as soon as the source path, size or modification time changes
+
+import os
+import json
+import numpy as np
+from tracers_cache import get_cache_dir, get_source_key
+from scan_stats import pick_minmaxs, log_scan_stats
+
+# Key of the scan of dimension d, 'sampling' being anything JSON-friendly telling which values got scanned
+def get_scan_key (d, dimension, sampling):
+    return json.dumps([d, dimension[0], dimension[1], sampling])
+
+# Cached scans of 'source_file' as {scan_key: stats}, empty if none or outdated
+def read_scan_cache (source_file, file_type_token):
+    cache_path = get_cache_dir(source_file, file_type_token) + "scans.json"
+    if (not os.path.exists(cache_path)):
+        return {}
+    
+    with open(cache_path, "r") as cache_file:
+        cache = json.load(cache_file)
+    
+    for name, value in get_source_key(source_file, file_type_token).items():
+        if (cache.get(name) != value):
+            return {}
+    
+    return cache["scans"]
+
+# Scans of 'dimensions' out of the cache, or None if any of them is missing
+def load_scans (source_file, file_type_token, dimensions, sampling):
+    cached = read_scan_cache(source_file, file_type_token)
+    
+    scans = []
+    for d in range(0, len(dimensions)):
+        stats = cached.get(get_scan_key(d, dimensions[d], sampling))
+        if (stats is None):
+            return None
+        
+        stats = dict(stats)
+        stats["histogram"] = np.array(stats["histogram"], dtype=np.int64)
+        stats["bin_edges"] = None if (stats["bin_edges"] is None) else np.array(stats["bin_edges"])
+        scans.append(stats)
+    
+    return scans
+
+# Add scans of 'dimensions' to the cache (through a temporary file, so a half-written cache is never picked up)
+def save_scans (source_file, file_type_token, dimensions, sampling, scans):
+    cache_dir = get_cache_dir(source_file, file_type_token)
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    cache = get_source_key(source_file, file_type_token)
+    cache["scans"] = read_scan_cache(source_file, file_type_token)
+    for d in range(0, len(dimensions)):
+        stats = dict(scans[d])
+        stats["histogram"] = stats["histogram"].tolist()
+        stats["bin_edges"] = None if (stats["bin_edges"] is None) else stats["bin_edges"].tolist()
+        cache["scans"][get_scan_key(d, dimensions[d], sampling)] = stats
+    
+    with open(cache_dir + "scans.tmp.json", "w") as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(cache_dir + "scans.tmp.json", cache_dir + "scans.json")
+
+# Cached scans of 'dimensions', or 'scan_function()' ones (then cached), logging cached ones the way scans do
+def get_scans (source_file, file_type_token, dimensions, sampling, scan_function):
+    scans = load_scans(source_file, file_type_token, dimensions, sampling)
+    if (scans is not None):
+        print("Reusing cached scan of " + source_file + " (" + get_cache_dir(source_file, file_type_token) + "scans.json)")
+        for d in range(0, len(dimensions)):
+            log_scan_stats(dimensions[d][0], scans[d])
+        return scans
+    
+    scans = scan_function()
+    save_scans(source_file, file_type_token, dimensions, sampling, scans)
+    
+    return scans
+
+# Minmaxs of 'dimensions' out of cached scans (min & max, or 'percentiles' of them, see scan_stats.pick_minmaxs), or None if not scanned yet
+# Lets exporters get ranges directly out of earlier runs on the same source & sampling
+def get_cached_minmaxs (source_file, file_type_token, dimensions, sampling, percentiles=None):
+    scans = load_scans(source_file, file_type_token, dimensions, sampling)
+    if (scans is None):
+        return None
+    
+    return pick_minmaxs(scans, [0, 100] if (percentiles is None) else percentiles)
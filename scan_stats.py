@@ -0,0 +1,138 @@
+# ANDRIX ® 2025 🤙
+#
+# Vectorized scan statistics for klodufy and sph_textufy dimensions
+# Min, max, mean, bad values counts (NaN, Inf, non-positive for log mode) and fixed-bin histogram, in two chunked passes
+# Histograms give percentiles, so minmaxs can be picked automatically instead of hand-tuned
+
+import math
+import numpy as np
+
+# Yield chunks of 'values' along its first axis, with roughly 'chunk_size' elements each
+def iterate_chunks (values, chunk_size):
+    row_size = max(1, math.prod(values.shape[1:]))
+    rows = max(1, chunk_size // row_size)
+    
+    for start in range(0, values.shape[0], rows):
+        yield values[start:(start + rows)]
+
+# Transform a chunk the way the exporters do ("log" mode) and sort out bad values
+# Returns valid transformed values plus NaN, Inf and non-positive counts of the raw chunk
+def prepare_scan_chunk (chunk, dimension_mode):
+    chunk = np.asarray(chunk, dtype=np.float64).ravel()
+    
+    nan_count = int(np.count_nonzero(np.isnan(chunk)))
+    inf_count = int(np.count_nonzero(np.isinf(chunk)))
+    non_positive_count = int(np.count_nonzero(chunk <= 0))
+    
+    if (dimension_mode == "log"):
+        valid = chunk[np.isfinite(chunk) & (chunk > 0)]
+        valid = np.log10(valid)
+    else:
+        valid = chunk[np.isfinite(chunk)]
+    
+    return valid, nan_count, inf_count, non_positive_count
+
+# Scan one dimension ('values' can be a cube, a strided view of a cube or a column)
+# Min, max and mean are computed on transformed ("log" mode) values, histogram has 'nb_bins' bins between min and max
+def scan_values (values, dimension_mode, nb_bins=256, chunk_size=4194304):
+    get_chunks = lambda pass_index: ([chunk] for chunk in iterate_chunks(values, chunk_size))
+    
+    return scan_chunk_stream(get_chunks, [dimension_mode], nb_bins)[0]
+
+# Scan several dimensions at once out of a stream of chunks (lists holding one column per dimension), see scan_values
+# Two passes are needed, 'get_chunks(pass_index)' returns a new iterator of chunks for each one (0: extrema & bad values, 1: histograms)
+def scan_chunk_stream (get_chunks, dimension_modes, nb_bins=256):
+    scans = []
+    totals = []
+    for d in range(0, len(dimension_modes)):
+        scans.append({
+            "min": float("inf"),
+            "max": float("-inf"),
+            "mean": float("nan"),
+            "count": 0,
+            "nan_count": 0,
+            "inf_count": 0,
+            "non_positive_count": 0,
+            "histogram": np.zeros(nb_bins, dtype=np.int64),
+            "bin_edges": None
+        })
+        totals.append(0.0)
+    
+    # Pass 1: extrema, sum and bad values
+    for chunk in get_chunks(0):
+        for d in range(0, len(dimension_modes)):
+            stats = scans[d]
+            valid, nan_count, inf_count, non_positive_count = prepare_scan_chunk(chunk[d], dimension_modes[d])
+            
+            stats["nan_count"] += nan_count
+            stats["inf_count"] += inf_count
+            stats["non_positive_count"] += non_positive_count
+            
+            if (valid.size > 0):
+                stats["min"] = min(stats["min"], float(valid.min()))
+                stats["max"] = max(stats["max"], float(valid.max()))
+                stats["count"] += valid.size
+                totals[d] += float(valid.sum())
+    
+    histogram_ranges = []
+    for d in range(0, len(dimension_modes)):
+        stats = scans[d]
+        if (stats["count"] == 0):
+            histogram_ranges.append(None)
+            continue
+        
+        stats["mean"] = totals[d] / stats["count"]
+        histogram_ranges.append(get_histogram_range(stats["min"], stats["max"]))
+        stats["bin_edges"] = np.linspace(histogram_ranges[d][0], histogram_ranges[d][1], nb_bins + 1)
+    
+    # Pass 2: fixed-bin histograms over the detected ranges
+    if (any(histogram_range is not None for histogram_range in histogram_ranges)):
+        for chunk in get_chunks(1):
+            for d in range(0, len(dimension_modes)):
+                if (histogram_ranges[d] is not None):
+                    valid = prepare_scan_chunk(chunk[d], dimension_modes[d])[0]
+                    scans[d]["histogram"] += np.histogram(valid, bins=nb_bins, range=histogram_ranges[d])[0]
+    
+    return scans
+
+# Histogram range for given extrema (flat data still needs a non-empty range)
+def get_histogram_range (min_value, max_value):
+    if (min_value == max_value):
+        return (min_value - 0.5, max_value + 0.5)
+    
+    return (min_value, max_value)
+
+# Approximate percentile (0 to 100) out of a scan histogram, interpolated within bins
+def get_percentile (stats, percentile):
+    if (stats["count"] == 0):
+        return float("nan")
+    elif (percentile <= 0):
+        return stats["min"]
+    elif (percentile >= 100):
+        return stats["max"]
+    
+    histogram = stats["histogram"]
+    edges = stats["bin_edges"]
+    cumulated = np.cumsum(histogram)
+    target = percentile / 100 * cumulated[-1]
+    
+    b = int(np.searchsorted(cumulated, target))
+    before = cumulated[b - 1] if (b > 0) else 0
+    ratio = (target - before) / histogram[b] if (histogram[b] > 0) else 0
+    value = edges[b] + ratio * (edges[b + 1] - edges[b])
+    
+    return float(min(max(value, stats["min"]), stats["max"]))
+
+# Pick minmaxs out of scans, e.g. percentiles = [0.5, 99.5] to ignore the 0.5% most extreme values on each side
+def pick_minmaxs (scans, percentiles):
+    minmaxs = []
+    for stats in scans:
+        minmaxs.append([get_percentile(stats, percentiles[0]), get_percentile(stats, percentiles[1])])
+    
+    return minmaxs
+
+# Print scan results (extrema rounded to 5 digits, like the old scanning loops)
+def log_scan_stats (dimension_name, stats):
+    print("Min value for " + dimension_name + " is: " + str(float("%.5g" % stats["min"])))
+    print("Max value for " + dimension_name + " is: " + str(float("%.5g" % stats["max"])))
+    print("Mean value for " + dimension_name + " is: " + str(float("%.5g" % stats["mean"])) + " (" + str(stats["count"]) + " valid values, " + str(stats["nan_count"]) + " NaN, " + str(stats["inf_count"]) + " Inf, " + str(stats["non_positive_count"]) + " non-positive)")
@@ -0,0 +1,116 @@
+# ANDRIX ® 2025 🤙
+#
+# Global ranges of whole animation sequences, so every frame gets the same minmaxs and colours don't flicker
+# Frames are scanned in parallel (see batch_runner) in two passes: extrema first, then histograms over the global ranges,
+# merged into the same statistics as a single scan (see scan_stats), percentiles included
+# Frames are read through 'read_frame(*frame_args)' functions returning one array per dimension (memory-mapped or sampled ideally)
+
+import numpy as np
+from batch_runner import map_frame_batch
+from scan_stats import iterate_chunks, prepare_scan_chunk, get_histogram_range, pick_minmaxs, log_scan_stats
+
+# Pass 1 frame job: extrema, sum & bad values of each dimension of one frame
+def scan_frame_extrema (read_frame, frame_args, dimension_modes, chunk_size):
+    columns = read_frame(*frame_args)
+    
+    frame_stats = []
+    for d in range(0, len(dimension_modes)):
+        stats = {"min": float("inf"), "max": float("-inf"), "total": 0.0, "count": 0, "nan_count": 0, "inf_count": 0, "non_positive_count": 0}
+        for chunk in iterate_chunks(columns[d], chunk_size):
+            valid, nan_count, inf_count, non_positive_count = prepare_scan_chunk(chunk, dimension_modes[d])
+            stats["nan_count"] += nan_count
+            stats["inf_count"] += inf_count
+            stats["non_positive_count"] += non_positive_count
+            if (valid.size > 0):
+                stats["min"] = min(stats["min"], float(valid.min()))
+                stats["max"] = max(stats["max"], float(valid.max()))
+                stats["total"] += float(valid.sum())
+                stats["count"] += valid.size
+        frame_stats.append(stats)
+    
+    return frame_stats
+
+# Pass 2 frame job: histograms of each dimension of one frame over global 'histogram_ranges' (None for dimensions without valid values)
+def scan_frame_histograms (read_frame, frame_args, dimension_modes, histogram_ranges, nb_bins, chunk_size):
+    columns = read_frame(*frame_args)
+    
+    histograms = []
+    for d in range(0, len(dimension_modes)):
+        histogram = np.zeros(nb_bins, dtype=np.int64)
+        if (histogram_ranges[d] is not None):
+            for chunk in iterate_chunks(columns[d], chunk_size):
+                histogram += np.histogram(prepare_scan_chunk(chunk, dimension_modes[d])[0], bins=nb_bins, range=histogram_ranges[d])[0]
+        histograms.append(histogram)
+    
+    return histograms
+
+# Merge pass 1 extrema of dimension d over 'all_frame_stats' (see scan_frame_extrema), histogram left empty
+def merge_frame_extrema (all_frame_stats, d, nb_bins):
+    stats = {
+        "min": min([frame_stats[d]["min"] for frame_stats in all_frame_stats], default=float("inf")),
+        "max": max([frame_stats[d]["max"] for frame_stats in all_frame_stats], default=float("-inf")),
+        "mean": float("nan"),
+        "histogram": np.zeros(nb_bins, dtype=np.int64),
+        "bin_edges": None
+    }
+    for name in ["count", "nan_count", "inf_count", "non_positive_count"]:
+        stats[name] = sum([frame_stats[d][name] for frame_stats in all_frame_stats])
+    
+    if (stats["count"] > 0):
+        stats["mean"] = sum([frame_stats[d]["total"] for frame_stats in all_frame_stats]) / stats["count"]
+    
+    return stats
+
+# Scan 'dimensions' over all frames of a sequence, 'frames_args' holding the 'read_frame' arguments of each frame
+# Returns merged scans (see scan_stats.scan_chunk_stream), failed frames being left out (and reported by map_frame_batch)
+# Only frames scanned in pass 1 go through pass 2, and frames failing pass 2 get dropped from pass 1 statistics too,
+# so counts & histograms always cover the same frames
+def scan_sequence (read_frame, frames_args, dimensions, nb_workers, nb_bins=256, chunk_size=4194304, max_memory_mb=None):
+    dimension_modes = [dimension[1] for dimension in dimensions]
+    print("Scanning " + str(len(frames_args)) + " frames for global ranges of " + str([dimension[0] for dimension in dimensions]) + "...")
+    
+    # Pass 1: per-frame extrema, merged
+    frame_jobs = [(read_frame, frame_args, dimension_modes, chunk_size) for frame_args in frames_args]
+    results = map_frame_batch(scan_frame_extrema, frame_jobs, nb_workers, max_memory_mb)[0]
+    scanned_args = [frames_args[j] for j in range(0, len(frames_args)) if (results[j] is not None)]
+    all_frame_stats = [frame_stats for frame_stats in results if (frame_stats is not None)]
+    
+    scans = []
+    histogram_ranges = []
+    for d in range(0, len(dimensions)):
+        scans.append(merge_frame_extrema(all_frame_stats, d, nb_bins))
+        histogram_ranges.append(None)
+        if (scans[d]["count"] > 0):
+            histogram_ranges[d] = get_histogram_range(scans[d]["min"], scans[d]["max"])
+            scans[d]["bin_edges"] = np.linspace(histogram_ranges[d][0], histogram_ranges[d][1], nb_bins + 1)
+    
+    # Pass 2: per-frame histograms over global ranges, summed (ranges of all pass 1 frames still hold values of fewer frames)
+    if (any(histogram_range is not None for histogram_range in histogram_ranges)):
+        frame_jobs = [(read_frame, frame_args, dimension_modes, histogram_ranges, nb_bins, chunk_size) for frame_args in scanned_args]
+        all_histograms = map_frame_batch(scan_frame_histograms, frame_jobs, nb_workers, max_memory_mb)[0]
+        
+        if (any(histograms is None for histograms in all_histograms)):
+            all_frame_stats = [all_frame_stats[j] for j in range(0, len(all_histograms)) if (all_histograms[j] is not None)]
+            print("Dropping " + str(len(all_histograms) - len(all_frame_stats)) + " frame(s) failing the histogram pass from the scan")
+            for d in range(0, len(dimensions)):
+                merged = merge_frame_extrema(all_frame_stats, d, nb_bins)
+                merged["bin_edges"] = scans[d]["bin_edges"]
+                scans[d] = merged
+        
+        for histograms in all_histograms:
+            if (histograms is not None):
+                for d in range(0, len(dimensions)):
+                    scans[d]["histogram"] += histograms[d]
+    
+    for d in range(0, len(dimensions)):
+        log_scan_stats(dimensions[d][0], scans[d])
+    
+    return scans
+
+# Global minmaxs of a sequence (see scan_sequence), out of 'percentiles' of all frames values (None for plain extrema)
+def get_sequence_minmaxs (read_frame, frames_args, dimensions, nb_workers, percentiles=None, max_memory_mb=None):
+    percentiles = [0, 100] if (percentiles is None) else percentiles
+    minmaxs = pick_minmaxs(scan_sequence(read_frame, frames_args, dimensions, nb_workers, max_memory_mb=max_memory_mb), percentiles)
+    print("Global minmaxs out of percentiles " + str(percentiles) + ": " + str(minmaxs))
+    
+    return minmaxs
@@ -0,0 +1,363 @@
+# ANDRIX x CRAL ® 2025 🤙
+#
+# Generate 3D textures for Unity straight out of SPH dumps (PHANTOM & SHAMROCK), without going through text files
+#
+# Each particle is splatted into the grid with its smoothing kernel (cubic spline over 2h) and its mass,
+# or with cheaper CIC (cloud-in-cell, 8 voxels) and TSC (triangular-shaped cloud, 27 voxels) assignments
+# Particles are split in spatial chunks (slabs of z planes) deposited by a process pool, then the cube goes through the klodufy encoder
+
+import math
+import datetime
+import concurrent.futures
+import numpy as np
+from sph_textufy import prepare_tracers_data, prepend_zeros
+from klodufy import write_unity_header, write_unity_footer, write_klodu_slabs, get_slab_size, get_log_indices, error_start, error_end
+from scan_stats import scan_values, pick_minmaxs, log_scan_stats
+
+# M4 cubic spline kernel shape (without normalization, deposits get normalized per particle), support of 2h
+# Written as ((2 - q)+³ - 4 (1 - q)+³) / 4, computed in place over 'q'
+def cubic_spline (q):
+    inner = np.maximum(1 - q, 0)
+    inner **= 3
+    np.subtract(2, q, out=q)
+    np.maximum(q, 0, out=q)
+    q **= 3
+    q *= 0.25
+    q -= inner
+    
+    return q
+
+# Per-axis voxel offsets & weights of CIC or TSC assignments, 'u' being positions in voxel units (voxel i spans [i, i + 1])
+def get_assignment_weights (u, kernel):
+    if (kernel == "cic"):
+        first = np.floor(u - 0.5).astype(np.int64)
+        fraction = (u - 0.5) - first
+        return [first, first + 1], [1 - fraction, fraction]
+    
+    elif (kernel == "tsc"):
+        nearest = np.floor(u).astype(np.int64)
+        d = u - (nearest + 0.5)
+        return [nearest - 1, nearest, nearest + 1], [0.5 * (0.5 - d) ** 2, 0.75 - d ** 2, 0.5 * (0.5 + d) ** 2]
+    
+    else:
+        print(error_start + "[get_assignment_weights] Error - unknown kernel: " + kernel + error_end)
+        return None, None
+
+# Accumulate 'kernel_weights' at flat voxel indices 'k' into flat 'grids' (one per deposited field), skipping voxels flagged out of 'kept'
+def accumulate_deposits (grids, k, kept, kernel_weights, fields):
+    k = k[kept]
+    
+    for f in range(0, len(fields)):
+        grids[f] += np.bincount(k, weights=(kernel_weights * fields[f][:, np.newaxis])[kept], minlength=grids[f].size)
+
+# Flat voxel indices & in-grid flags of (n, a) z, (n, b) y and (n, c) x voxel indices, broadcast to (n, a, b, c)
+def get_box_indices (iz, iy, ix, grid_shape):
+    inside_z = (iz >= 0) & (iz < grid_shape[0])
+    inside_y = (iy >= 0) & (iy < grid_shape[1])
+    inside_x = (ix >= 0) & (ix < grid_shape[2])
+    
+    k = (iz * (grid_shape[1] * grid_shape[2]))[:, :, np.newaxis, np.newaxis] + (iy * grid_shape[2])[:, np.newaxis, :, np.newaxis] + ix[:, np.newaxis, np.newaxis, :]
+    inside = inside_z[:, :, np.newaxis, np.newaxis] & inside_y[:, np.newaxis, :, np.newaxis] & inside_x[:, np.newaxis, np.newaxis, :]
+    
+    return k.reshape(iz.shape[0], -1), inside.reshape(iz.shape[0], -1)
+
+# Deposit cubic spline kernels too wide to be vectorized as whole boxes (outer disk particles, kernels larger than the grid)
+# Boxes get clipped to the grid and swept a few planes at a time, so memory stays within 'chunk_elements' whatever h is
+# Weights are normalized by the kernel integral (π h³, over the voxel volume) since their unbounded boxes are never built
+def deposit_wide_particles (grids, u, h, fields, grid_shape, voxel_sizes, chunk_elements):
+    planes_per_batch = max(1, chunk_elements // (grid_shape[1] * grid_shape[2]))
+    grid_views = [grid.reshape(grid_shape) for grid in grids]
+    
+    for i in range(0, u.shape[0]):
+        reach = np.ceil(2 * h[i] / voxel_sizes).astype(np.int64)
+        base = np.floor(u[i]).astype(np.int64)
+        low = np.maximum(base - reach, 0)
+        high = np.minimum(base + reach + 1, grid_shape)
+        if (np.any(low >= high)):
+            continue
+        
+        total = math.pi * h[i] ** 3 / math.prod(voxel_sizes)
+        dy2 = ((np.arange(low[1], high[1]) + 0.5 - u[i, 1]) * voxel_sizes[1]) ** 2
+        dx2 = ((np.arange(low[2], high[2]) + 0.5 - u[i, 2]) * voxel_sizes[2]) ** 2
+        dyx2 = dy2[:, np.newaxis] + dx2[np.newaxis, :]
+        
+        for first in range(low[0], high[0], planes_per_batch):
+            last = min(first + planes_per_batch, high[0])
+            dz2 = ((np.arange(first, last) + 0.5 - u[i, 0]) * voxel_sizes[0]) ** 2
+            kernel_weights = cubic_spline(np.sqrt(dz2[:, np.newaxis, np.newaxis] + dyx2) / h[i])
+            kernel_weights /= total
+            
+            for f in range(0, len(fields)):
+                grid_views[f][first:last, low[1]:high[1], low[2]:high[2]] += kernel_weights * fields[f][i]
+
+# Deposit particles into a grid of 'grid_shape' (z, y, x) voxels of 'voxel_sizes' (z, y, x) physical sizes
+# 'u' are (n, 3) positions in voxel units (z, y, x), 'h' smoothing lengths, 'fields' are (n,) arrays deposited as field * kernel weight
+# Kernel weights of each particle sum up to 1 over the whole (unbounded) grid, so masses are conserved
+# Cubic spline boxes over 'chunk_elements' voxels or wider than the grid go through deposit_wide_particles
+def deposit_particles (u, h, fields, grid_shape, voxel_sizes, kernel, chunk_elements=4194304):
+    grids = []
+    for f in range(0, len(fields)):
+        grids.append(np.zeros(math.prod(grid_shape)))
+    
+    if (kernel == "cic" or kernel == "tsc"):
+        offsets, weights = get_assignment_weights(u, kernel)
+        for a in range(0, len(offsets)):
+            for b in range(0, len(offsets)):
+                for c in range(0, len(offsets)):
+                    kernel_weights = (weights[a][:, 0] * weights[b][:, 1] * weights[c][:, 2])[:, np.newaxis]
+                    k, inside = get_box_indices(offsets[a][:, 0:1], offsets[b][:, 1:2], offsets[c][:, 2:3], grid_shape)
+                    accumulate_deposits(grids, k, inside, kernel_weights, fields)
+        return grids
+    
+    elif (kernel != "cubic"):
+        print(error_start + "[deposit_particles] Error - unknown kernel: " + kernel + error_end)
+        return grids
+    
+    # Cubic spline: group particles by support radius (in voxels) to vectorize over (2r + 1)³ voxel boxes
+    radii = np.ceil(2 * h[:, np.newaxis] / voxel_sizes[np.newaxis, :]).max(axis=1).astype(np.int64)
+    base = np.floor(u).astype(np.int64)
+    
+    wide = ((2 * radii + 1) ** 3 > chunk_elements) | (2 * radii + 1 > max(grid_shape))
+    if (np.any(wide)):
+        deposit_wide_particles(grids, u[wide], h[wide], [f[wide] for f in fields], grid_shape, voxel_sizes, chunk_elements)
+    
+    for r in np.unique(radii[~wide]):
+        group = np.nonzero((radii == r) & ~wide)[0]
+        offsets = np.arange(-r, r + 1)
+        box_size = offsets.size
+        chunk_size = max(1, chunk_elements // (box_size ** 3))
+        
+        for start in range(0, group.size, chunk_size):
+            p = group[start:(start + chunk_size)]
+            
+            # Physical distances between particles and voxel centers, per axis
+            iz = base[p, 0:1] + offsets
+            iy = base[p, 1:2] + offsets
+            ix = base[p, 2:3] + offsets
+            dz = (iz + 0.5 - u[p, 0:1]) * voxel_sizes[0]
+            dy = (iy + 0.5 - u[p, 1:2]) * voxel_sizes[1]
+            dx = (ix + 0.5 - u[p, 2:3]) * voxel_sizes[2]
+            
+            d2 = dz[:, :, np.newaxis, np.newaxis] ** 2 + dy[:, np.newaxis, :, np.newaxis] ** 2 + dx[:, np.newaxis, np.newaxis, :] ** 2
+            kernel_weights = cubic_spline(np.sqrt(d2) / h[p, np.newaxis, np.newaxis, np.newaxis]).reshape(p.size, -1)
+            
+            # Particles smaller than a voxel go to their own voxel
+            totals = kernel_weights.sum(axis=1)
+            small = (totals <= 0)
+            kernel_weights[small, (box_size ** 3) // 2] = 1
+            totals[small] = 1
+            kernel_weights /= totals[:, np.newaxis]
+            
+            # Only voxels inside the grid & within the kernel support get deposited
+            k, inside = get_box_indices(iz, iy, ix, grid_shape)
+            inside &= (kernel_weights > 0)
+            
+            chunk_fields = []
+            for f in range(0, len(fields)):
+                chunk_fields.append(fields[f][p])
+            accumulate_deposits(grids, k, inside, kernel_weights, chunk_fields)
+    
+    return grids
+
+# Process pool job: deposit one spatial chunk into its own slab of planes [first_plane, first_plane + plane_count)
+def deposit_spatial_chunk (u, h, fields, first_plane, plane_count, grid_shape, voxel_sizes, kernel):
+    local_u = u.copy()
+    local_u[:, 0] -= first_plane
+    local_shape = (plane_count, grid_shape[1], grid_shape[2])
+    
+    return first_plane, deposit_particles(local_u, h, fields, local_shape, voxel_sizes, kernel)
+
+# Grab particle masses: "m" or "mass" column, or sarracen's params["mass"] for equal-mass dumps
+def get_particle_masses (data):
+    for name in ["m", "mass"]:
+        if (name in data.columns):
+            return data[name].to_numpy(dtype=np.float64)
+    
+    params = getattr(data, "params", None) or data.attrs.get("params") # Cached DataFrames keep params in attrs
+    if ((params is not None) and ("mass" in params)):
+        return np.full(data.shape[0], float(params["mass"]))
+    
+    print(error_start + "[get_particle_masses] No particle mass found, using 1 for every particle" + error_end)
+    return np.ones(data.shape[0])
+
+# Deposit SPH particles into a size³ cube, channels being listed in 'dimensions' like klodufy ([name, mode] pairs)
+# "rho" is the deposited density (mass per voxel volume), any other column name is deposited mass-weighted (sum(m q W) / sum(m W))
+# 'bounds' is [[xmin, xmax], [ymin, ymax], [zmin, zmax]], the cube is (z, y, x) ordered so that x is the fastest axis in Unity
+def deposit_sph_cube (data, file_type_token, size, bounds, dimensions, kernel, nb_workers):
+    h_name = "hpart" if (file_type_token == "SHAMROCK") else "h"
+    bounds = np.asarray(bounds, dtype=np.float64)
+    voxel_sizes = (bounds[::-1, 1] - bounds[::-1, 0]) / size # (z, y, x)
+    grid_shape = (size, size, size)
+    
+    # Positions in voxel units (z, y, x)
+    u = np.column_stack([(data[name].to_numpy(dtype=np.float64) - bounds[a][0]) / (bounds[a][1] - bounds[a][0]) * size for a, name in [[2, "z"], [1, "y"], [0, "x"]]])
+    h = data[h_name].to_numpy(dtype=np.float64)
+    masses = get_particle_masses(data)
+    
+    # Deposited fields: mass, then mass * attribute for each mass-weighted dimension
+    fields = [masses]
+    for dimension in dimensions:
+        if (dimension[0] != "rho"):
+            fields.append(masses * data[dimension[0]].to_numpy(dtype=np.float64))
+    
+    # Drop particles whose kernel can't reach the box (CIC & TSC assignments don't use h and touch 1 or 2 voxels around particles)
+    if (kernel == "cubic"):
+        reach = np.ceil(2 * h[:, np.newaxis] / voxel_sizes[np.newaxis, :]).max(axis=1) + 2
+    else:
+        reach = np.full(h.shape[0], 1 if (kernel == "cic") else 2)
+    kept = np.all((u > -reach[:, np.newaxis]) & (u < size + reach[:, np.newaxis]), axis=1)
+    if (kernel == "cubic"):
+        kept &= (h > 0)
+    u = u[kept]
+    h = h[kept]
+    fields = [f[kept] for f in fields]
+    reach = reach[kept]
+    print("Depositing " + str(u.shape[0]) + " particles (" + kernel + " kernel) into a " + str(size) + "³ cube, with " + str(nb_workers) + " worker(s)...")
+    
+    # Spatial chunks: slabs of z planes (plus halos for kernels crossing slab walls)
+    grids = [np.zeros(math.prod(grid_shape)) for f in fields]
+    plane_size = size * size
+    nb_chunks = max(1, min(nb_workers, size))
+    chunk_planes = math.ceil(size / nb_chunks)
+    owner_planes = np.clip(np.floor(u[:, 0]), 0, size - 1).astype(np.int64)
+    
+    # Particles reaching further than a slab go to chunks of their own, spanning the planes they reach,
+    # so that a few large kernels don't widen the halos of every slab up to the whole grid
+    wide = (reach > chunk_planes)
+    halo = int(reach[~wide].max()) if np.any(~wide) else 0
+    
+    jobs = []
+    for first in range(0, size, chunk_planes):
+        p = np.nonzero((owner_planes >= first) & (owner_planes < first + chunk_planes) & ~wide)[0]
+        if (p.size > 0):
+            first_plane = max(0, first - halo)
+            last_plane = min(size, first + chunk_planes + halo)
+            jobs.append((u[p], h[p], [f[p] for f in fields], first_plane, last_plane - first_plane, grid_shape, voxel_sizes, kernel))
+    
+    # Wide particles are split by count over as many chunks as slabs, in z order to keep their plane spans tight
+    wide_indices = np.nonzero(wide)[0]
+    wide_indices = wide_indices[np.argsort(u[wide_indices, 0], kind="stable")]
+    for p in np.array_split(wide_indices, nb_chunks):
+        if (p.size > 0):
+            first_plane = max(0, int(np.floor((u[p, 0] - reach[p]).min())))
+            last_plane = min(size, int(np.ceil((u[p, 0] + reach[p]).max())) + 1)
+            jobs.append((u[p], h[p], [f[p] for f in fields], first_plane, last_plane - first_plane, grid_shape, voxel_sizes, kernel))
+    
+    def add_chunk (result):
+        first_plane, chunk_grids = result
+        for f in range(0, len(grids)):
+            grids[f][(first_plane * plane_size):(first_plane * plane_size + chunk_grids[f].size)] += chunk_grids[f]
+    
+    if (nb_workers <= 1):
+        for job in jobs:
+            add_chunk(deposit_spatial_chunk(*job))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nb_workers) as executor:
+            for result in executor.map(deposit_spatial_chunk, *zip(*jobs)):
+                add_chunk(result)
+    
+    # Build channels
+    values = np.zeros((size, size, size, len(dimensions)))
+    f = 1
+    for d in range(0, len(dimensions)):
+        if (dimensions[d][0] == "rho"):
+            values[..., d] = (grids[0] / math.prod(voxel_sizes)).reshape(grid_shape)
+        else:
+            values[..., d] = np.divide(grids[f], grids[0], out=np.zeros(grids[f].size), where=(grids[0] > 0)).reshape(grid_shape)
+            f += 1
+    
+    return values
+
+# Create Unity 3D texture out of SPH dump particles, see deposit_sph_cube for 'dimensions' & 'bounds'
+# 'kernel' is "cubic" (cubic spline over 2h), "cic" or "tsc", 'output_mode' & 'minmaxs_percentiles' work like in klodufy
+def sph_klodufy (source_file, file_type_token, size, bounds, dimensions, minmaxs, quality, dest_path, dest_file_name, kernel, nb_workers, nb_logs, output_mode="inline", minmaxs_percentiles=None):
+    dimensionality = len(dimensions)
+    dest_file_name = dest_file_name + ("-HQ" if quality == "high" else "-LQ")
+    
+    # Hello
+    print("Starting work on SPH cube " + dest_file_name + "...")
+    print("type: " + file_type_token + ", size: " + str(size) + ", bounds: " + str(bounds) + ", dimensions: " + str(dimensions) + ", minmaxs: " + str(minmaxs) + ", quality: " + quality + ", kernel: " + kernel)
+    
+    if ((file_type_token != "PHANTOM") and (file_type_token != "SHAMROCK")):
+        print(error_start + "[sph_klodufy] Error - only PHANTOM & SHAMROCK dumps have smoothing lengths, not " + file_type_token + error_end)
+        return
+    
+    # Load & deposit
+    start_time = datetime.datetime.now()
+    columns = ["x", "y", "z", "hpart" if (file_type_token == "SHAMROCK") else "h", "m", "mass"] + [dimension[0] for dimension in dimensions if dimension[0] != "rho"]
+    data = prepare_tracers_data(source_file, file_type_token, columns)
+    values = deposit_sph_cube(data, file_type_token, size, bounds, dimensions, kernel, nb_workers)
+    data = None
+    
+    mid_time = datetime.datetime.now()
+    print("Loaded and deposited particles in: " + str(round(mid_time.timestamp() - start_time.timestamp(), 2)) + " seconds.")
+    
+    # Scan
+    if (minmaxs_percentiles is not None):
+        scans = []
+        for d in range(0, dimensionality):
+            scans.append(scan_values(values[..., d], dimensions[d][1]))
+            log_scan_stats(dimensions[d][0], scans[d])
+        minmaxs = pick_minmaxs(scans, minmaxs_percentiles)
+        print("Picked minmaxs out of percentiles " + str(minmaxs_percentiles) + ": " + str(minmaxs))
+    
+    # Prepare export file & write through the klodufy encoder
+    destination_file = open("output/" + dest_path + dest_file_name + ".asset", "w")
+    stream_data = (output_mode == "stream")
+    target_file = destination_file
+    if (stream_data):
+        stream_path = dest_file_name + ".resS"
+        target_file = open("output/" + dest_path + stream_path, "wb")
+    
+    write_unity_header(destination_file, dest_file_name, size, 1, dimensionality, quality, stream_data)
+    log_indices = get_log_indices(size ** 3, size ** 3, nb_logs)
+    write_klodu_slabs(target_file, values, dimensions, minmaxs, quality, get_slab_size(values, None), log_indices, 1, stream_data)
+    
+    if (stream_data):
+        stream_size = target_file.tell()
+        target_file.close()
+        write_unity_footer(destination_file, 0, stream_size, stream_path)
+    else:
+        write_unity_footer(destination_file)
+    destination_file.close()
+    
+    # Conclude
+    end_time = datetime.datetime.now()
+    print("Encoded and wrote data to file in: " + str(round(end_time.timestamp() - mid_time.timestamp(), 2)) + " seconds.")
+    print("File " + dest_file_name + ".asset was created")
+
+def sph_klodufy_fracturings_rho ():
+    source_file = "./data/fracturings/1-frame/dump_0918.sham"
+    file_type_token = "SHAMROCK"
+    size = 256
+    bounds = [ [-1.2, 1.2], [-1.2, 1.2], [-1.2, 1.2] ]
+    dimensions = [ ["rho", "log"] ]
+    minmaxs = [ [-4, 2] ]
+    quality = "high"
+    dest_path = "fracturings/1-frame/"
+    dest_file_name = "klo-sph-fracturings-256-rho-0918"
+    kernel = "cubic"
+    nb_workers = 8
+    nb_logs = 4
+    
+    sph_klodufy(source_file, file_type_token, size, bounds, dimensions, minmaxs, quality, dest_path, dest_file_name, kernel, nb_workers, nb_logs)
+# sph_klodufy_fracturings_rho()
+
+def sph_klodufy_binarydisk_frame (frame, index):
+    frame = prepend_zeros(str(frame), 5)
+    index = prepend_zeros(str(index), 3)
+    source_file = "./data/binarydisk/102-frames/orb0m02gprev_" + str(frame)
+    file_type_token = "PHANTOM"
+    size = 128
+    bounds = [ [-200, 200], [-200, 200], [-200, 200] ]
+    dimensions = [ ["rho", "log"], ["vx", "linear"], ["vy", "linear"] ]
+    minmaxs = [ [-12, -6], [-0.5, 0.5], [-0.5, 0.5] ]
+    quality = "low"
+    dest_path = "binarydisk/102-frames/"
+    dest_file_name = "klo-sph-binarydisk-128-rhovxvy-" + str(index)
+    kernel = "tsc"
+    nb_workers = 1
+    nb_logs = 2
+    
+    sph_klodufy(source_file, file_type_token, size, bounds, dimensions, minmaxs, quality, dest_path, dest_file_name, kernel, nb_workers, nb_logs)
+# sph_klodufy_binarydisk_frame(0, 1)
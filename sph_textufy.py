@@ -10,27 +10,47 @@
 # sarracen.read_shamrock doesn't exist in stable build
 # install sarracen dev build with "pip install git+https://github.com/ttricco/sarracen.git"
 
+import os
+import json
 import math
 import sarracen
-import datetime
 import numpy as np
+from scan_stats import scan_chunk_stream, pick_minmaxs, log_scan_stats
+from klodufy import write_unity_texture2d_header, write_unity_footer, encode_klodu_values, parse_klodu_to_hex, iterate_text_chunks
+from batch_runner import run_frame_batch
+from sequence_scan import get_sequence_minmaxs
+from tracers_cache import load_tracers_cache, write_tracers_cache, write_tracers_cache_chunks
+from morton_order import bits_per_axis, get_morton_keys, get_morton_order, write_octree_index
+from lod_pyramid import build_lod_levels
+from region_index import load_region_index, write_region_index, get_region_candidates, select_region_rows
+from subsampling import mass_dimension_names, get_cell_keys, get_stratified_rows, get_weighted_rows
+from scan_cache import get_scans
+from build_manifest import is_build_up_to_date, record_build, open_output, close_output
+from run_report import get_run_report_path, start_run_report, start_phase, end_phase, time_chunks, count_chunk_columns, log_progress, finish_run_report, log_slowest_runs
 
-# file_type_token: "PHANTOM", "SHAMROCK" or "NUMPY"
-def prepare_tracers_data (source_file, file_type_token):
+# file_type_token: "PHANTOM", "SHAMROCK", "NUMPY" or "TXT"
+# 'use_cache' converts PHANTOM, SHAMROCK & TXT sources once into a columnar cache (see tracers_cache), later calls then
+# only memory-map the 'columns' they need (names, or indices for TXT; None for all of them)
+def prepare_tracers_data (source_file, file_type_token, columns=None, use_cache=True):
+
+    if (use_cache and (file_type_token == "PHANTOM" or file_type_token == "SHAMROCK" or file_type_token == "TXT")):
+        data = load_tracers_cache(source_file, file_type_token, columns)
+        if (data is not None):
+            return data
     
     if (file_type_token == "PHANTOM"):
         sdf, sdf_sinks = sarracen.read_phantom(source_file)
         
         # print(sdf.describe())
         
-        return sdf
+        data = sdf
         
     elif (file_type_token == "SHAMROCK"):
         sdf = sarracen.read_shamrock(source_file)
         
         # print(sdf.describe())
         
-        return sdf
+        data = sdf
         
     elif (file_type_token == "NUMPY"):
         data = np.load(source_file)
@@ -40,16 +60,43 @@ def prepare_tracers_data (source_file, file_type_token):
         return data
         
     elif (file_type_token == "TXT"):
+        if (use_cache):
+            # Parse & cache chunk by chunk, never holding the whole file
+            write_tracers_cache_chunks((rows for first_row_index, rows in iterate_text_chunks(source_file, 1000000)), source_file, file_type_token)
+            
+            return load_tracers_cache(source_file, file_type_token, columns)
+        
         data = arr = np.loadtxt(source_file)
         
         print("Data shape is " + str(data.shape) + " with a total of " + str(data.size) + " elements.")
         
-        return data
-        
     else:
         print("[prepare_tracers_data(...)] Unknown file type token: " + file_type_token)
         
         return False
+    
+    if (use_cache):
+        write_tracers_cache(data, source_file, file_type_token)
+    
+    return data
+
+# Dtype of DataFrame rows (data.iloc[...]), kept in attrs by cached DataFrames which only hold some of the source columns
+def get_row_dtype (data):
+    if ("row_dtype" in data.attrs):
+        return np.dtype(data.attrs["row_dtype"])
+    
+    return data.iloc[0:0].to_numpy().dtype
+
+# Columns a sph_textufy job needs out of prepare_tracers_data (SHAMROCK rho is derived from hpart)
+def get_needed_columns (file_type_token, dimensions):
+    if (file_type_token == "TXT" or file_type_token == "NUMPY"):
+        return list(range(0, len(dimensions)))
+    
+    columns = []
+    for dimension in dimensions:
+        columns.append("hpart" if (file_type_token == "SHAMROCK" and dimension[0] == "rho") else dimension[0])
+    
+    return columns
 
 def round_to_n(x, n):
     return 0 if (x == 0) else round(x, -int(math.floor(round(math.log10(abs(x)) - n + 1))))
@@ -70,174 +117,724 @@ def remap (input, source_min, source_max, target_min, target_max, clamp_mode):
     else:
         return target_min + (target_max - target_min) * (input - source_min) / (source_max - source_min)
 
+# Same as remap(...) but for whole numpy arrays (same operations order, so same float rounding)
+def remap_array (input, source_min, source_max, target_min, target_max, clamp_mode):
+    result = target_min + (target_max - target_min) * (input - source_min) / (source_max - source_min)
+    
+    if (clamp_mode):
+        result = np.where(input < source_min, target_min, result)
+        result = np.where(input > source_max, target_max, result)
+    
+    return result
+
+# Remap & quantize one value to an integer in [0, 10^digits] (the per-row loop way)
+def quantize_value (val, dimension_mode, min_val, max_val, digits):
+    if (dimension_mode == "log"):
+        val = math.log10(val)
+    
+    return int(round_to_n(remap(val, min_val, max_val, 0, 10 ** digits, True), digits + 1))
+
+# Remap & quantize a whole column to integers in [0, 10^digits], giving the same integers as quantize_value
+# Values keep the column dtype like numpy scalars did, so np.round matches round(...) on them
+# Python floats ("log" mode) round exactly instead, so values close to a rounding tie are redone with quantize_value
+# Non-finite values (log of non-positive values for instance) are quantized to 0
+def quantize_column (column, dimension_mode, min_val, max_val, digits):
+    values = column
+    if (dimension_mode == "log"):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.log10(np.asarray(column, dtype=np.float64))
+    
+    remapped = remap_array(values, min_val, max_val, 0, 10 ** digits, True)
+    remapped_64 = np.asarray(remapped, dtype=np.float64)
+    result = np.zeros(remapped.shape[0], dtype=np.int64)
+    
+    # round_to_n(x, digits + 1) keeps -round(log10(|x|) - digits) decimals
+    valid = np.isfinite(remapped_64) & (remapped_64 != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitudes = np.log10(np.abs(remapped_64)) - digits
+    decimals = -np.rint(magnitudes)
+    
+    for decimal in np.unique(decimals[valid]):
+        m = valid & (decimals == decimal)
+        result[m] = np.round(remapped[m], int(decimal)).astype(np.int64)
+    
+    # Ties of log10 rounding (and of decimal rounding for Python floats)
+    with np.errstate(invalid="ignore"):
+        ties = np.abs(magnitudes - np.floor(magnitudes) - 0.5) < 1e-9
+        if (dimension_mode == "log"):
+            scaled = remapped_64 * 10.0 ** np.where(valid, decimals, 0)
+            ties |= np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    
+    for i in np.nonzero(valid & ties)[0]:
+        result[i] = quantize_value(column[i], dimension_mode, min_val, max_val, digits)
+    
+    return result
+
+# Format non-negative integer columns into text rows in one go, each row being separators[k] + str(columns[k][i]) for each k
+# Rows are joined with "\n", 'trailing_newline' adds one after the last row too
+# Returns the text and row start offsets (one more for the end), handy to log a few rows
+def format_rows (columns, separators, row_count, trailing_newline):
+    separator_widths = [len(separator) for separator in separators]
+    
+    # Digits count of each value
+    widths = []
+    for column in columns:
+        width = np.ones(row_count, dtype=np.int64)
+        for p in range(1, len(str(int(column.max()))) if (row_count > 0) else 1):
+            width += (column >= 10 ** p)
+        widths.append(width)
+    
+    row_lengths = np.ones(row_count, dtype=np.int64)
+    for k in range(0, len(columns)):
+        row_lengths += separator_widths[k] + widths[k]
+    row_offsets = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(row_lengths, out=row_offsets[1:])
+    
+    # Fill bytes column after column, digits from the last one (rows narrower than the current digit get skipped)
+    text = np.empty(row_offsets[-1], dtype=np.uint8)
+    ends = row_offsets[:-1].copy()
+    for k in range(0, len(columns)):
+        if (separator_widths[k] > 0):
+            text[ends] = ord(" ")
+        ends += separator_widths[k] + widths[k]
+        
+        min_width = int(widths[k].min()) if (row_count > 0) else 0
+        max_width = int(widths[k].max()) if (row_count > 0) else 0
+        remainder = columns[k]
+        positions = ends - 1
+        for p in range(0, max_width):
+            quotient = remainder // 10
+            digit = (remainder - 10 * quotient).astype(np.uint8) + ord("0")
+            if (p < min_width):
+                text[positions] = digit
+            else:
+                m = (widths[k] > p)
+                text[positions[m]] = digit[m]
+            remainder = quotient
+            positions -= 1
+    text[row_offsets[1:] - 1] = ord("\n")
+    
+    if (not trailing_newline):
+        text = text[:-1]
+    
+    return text.tobytes().decode("ascii"), row_offsets
+
+# Grab a whole dimension as a numpy column, keeping 1 row every 'step' rows (from 'first_row' to 'actual_count' kept rows)
+# 'rows' (kept row indices, e.g. a Morton order) picks rows in that order instead
+# DataFrame columns get the dtype of DataFrame rows (e.g. float64 for mixed float32 & int columns), as data.iloc[...] did
+def get_dimension_column (data, file_type_token, dimension_name, d, step, actual_count, first_row=0, rows=None):
+    selection = slice(first_row * step, actual_count * step, step) if (rows is None) else (rows * step)
+    
+    # Grab data column Shamrock/Phantom way (dimension name)
+    if (file_type_token == "SHAMROCK"):
+        row_dtype = get_row_dtype(data)
+        
+        # Special case for Yona's rho, derived from hpart
+        if (dimension_name == "rho"):
+            return 1 * (data["hpart"].to_numpy()[selection].astype(row_dtype) ** 3)
+        else:
+            return data[dimension_name].to_numpy()[selection].astype(row_dtype)
+    
+    elif (file_type_token == "PHANTOM"):
+        row_dtype = get_row_dtype(data)
+        
+        return data[dimension_name].to_numpy()[selection].astype(row_dtype)
+    
+    # Grab data column basic way (just the order, cached TXT columns being labelled by their index)
+    elif (file_type_token == "NUMPY" or file_type_token == "TXT"):
+        if (isinstance(data, np.ndarray)):
+            return data[selection, d]
+        else:
+            return data[d].to_numpy()[selection]
+    
+    else:
+        print("[get_dimension_column(...)] Unknown file type token: " + file_type_token)
+        
+        return False
+
+# Count data rows of a text file the way np.loadtxt reads them (blank & "#" comment lines skipped)
+def count_text_rows (source_file):
+    count = 0
+    with open(source_file, "r") as f:
+        for line in f:
+            if (line.split("#", 1)[0].strip() != ""):
+                count += 1
+    
+    return count
+
+# Open a tracers source for chunked reading (see iterate_tracers_chunks), without loading it whenever possible
+# NUMPY files get memory-mapped, cached sources too (see prepare_tracers_data), uncached TXT files get parsed chunk by chunk later on
+# Returns [data, count], data being None for uncached TXT files
+def open_tracers_source (source_file, file_type_token, columns, use_cache):
+    if (file_type_token == "NUMPY"):
+        data = np.load(source_file, mmap_mode="r")
+        print("Data shape is " + str(data.shape) + " with a total of " + str(data.size) + " elements.")
+        
+        return data, data.shape[0]
+    
+    elif (file_type_token == "TXT" and not use_cache):
+        return None, count_text_rows(source_file)
+    
+    data = prepare_tracers_data(source_file, file_type_token, columns, use_cache)
+    
+    return data, data.shape[0]
+
+# Reader protocol: yield [first_row, last_row, columns] chunks of up to 'chunk_size' kept rows (1 row every 'step' rows, 'actual_count' kept rows)
+# 'columns' holds the dimension d column of each d in 'dimension_indices', the way get_dimension_column grabs them
+# Peak memory depends on 'chunk_size' only, as long as 'data' is memory-mapped (or None for uncached TXT files, parsed chunk_size * step lines at a time)
+# 'order' (kept row indices, see morton_order) yields rows in that order instead, it needs random access so uncached TXT files can't have one
+def iterate_tracers_chunks (data, source_file, file_type_token, dimensions, dimension_indices, step, actual_count, chunk_size, order=None):
+    if (data is None):
+        for first_index, rows in iterate_text_chunks(source_file, chunk_size * step):
+            # Keep rows whose index is a multiple of step, chunks may not start on one (blank or comment lines)
+            offset = (-first_index) % step
+            first_row = (first_index + offset) // step
+            if (first_row >= actual_count):
+                break
+            
+            rows = rows[offset::step][0:(actual_count - first_row)]
+            if (rows.shape[0] > 0):
+                yield first_row, first_row + rows.shape[0], [rows[:, d] for d in dimension_indices]
+    
+    else:
+        for first_row in range(0, actual_count, chunk_size):
+            last_row = min(actual_count, first_row + chunk_size)
+            columns = []
+            rows = None if (order is None) else order[first_row:last_row]
+            for d in dimension_indices:
+                columns.append(get_dimension_column(data, file_type_token, dimensions[d][0], d, step, last_row, first_row, rows))
+            
+            yield first_row, last_row, columns
+
+# Rows of the particles lying in 'region' (box, sphere or frustum, see region_index), sorted, or None without positions
+# Uses the grid hash of the dump at 'region_depth', built & cached on first use, so only particles of intersected cells get read
+def get_region_rows (data, source_file, file_type_token, dimensions, count, region, region_depth, chunk_size):
+    names = [dimension[0] for dimension in dimensions]
+    if (("x" not in names) or ("y" not in names) or ("z" not in names)):
+        print("[get_region_rows(...)] Regions need x, y & z dimensions")
+        return None
+    
+    position_indices = [names.index("x"), names.index("y"), names.index("z")]
+    read_positions = lambda rows=None: iterate_tracers_chunks(data, source_file, file_type_token, dimensions, position_indices, 1, count if (rows is None) else rows.shape[0], chunk_size, rows)
+    
+    index = load_region_index(source_file, file_type_token, region_depth)
+    if (index is None):
+        index = write_region_index(source_file, file_type_token, region_depth, read_positions, count)
+    
+    candidates = get_region_candidates(index, region)
+    rows = select_region_rows(candidates, read_positions, region)
+    print("Region " + region[0] + " holds " + str(rows.shape[0]) + " of " + str(count) + " particles (" + str(candidates.shape[0]) + " read)")
+    
+    return rows
+
+# [min, max] of the finite values of each column of [first_row, last_row, columns] chunks, widened to [min, min + 1] when flat
+def get_chunk_extrema (chunks):
+    extrema = None
+    for first_row, last_row, columns in chunks:
+        if (extrema is None):
+            extrema = [[float("inf"), float("-inf")] for column in columns]
+        for c in range(0, len(columns)):
+            column = np.asarray(columns[c], dtype=np.float64)
+            column = column[np.isfinite(column)]
+            if (column.size > 0):
+                extrema[c] = [min(extrema[c][0], float(column.min())), max(extrema[c][1], float(column.max()))]
+    
+    return [[low, high] if (high > low) else ([low, low + 1] if math.isfinite(low) else [0, 1]) for low, high in (extrema or [])]
+
+# Importance subsample of 'target_count' rows (see subsampling) out of 'rows' ('count' sorted row indices, None for all rows)
+# "stratified" mode caps particles per cell of a 2^sampling_depth grid over the x, y & z ranges of 'minmaxs', or over the
+# extrema of the candidate rows positions when 'minmaxs' is None (one more positions-only pass), "weighted" mode picks rows
+# proportionally to their 'sampling_weight' [dimension name, power] value (e.g. ["h", 3], i.e. particle volume)
+# Returns [rows, factors] (see subsampling), or [None, None] without the needed dimensions
+def sample_tracers_rows (data, source_file, file_type_token, dimensions, minmaxs, count, rows, target_count, sampling_mode, sampling_weight, sampling_depth, sampling_seed, chunk_size):
+    names = [dimension[0] for dimension in dimensions]
+    read_columns = lambda dimension_indices: iterate_tracers_chunks(data, source_file, file_type_token, dimensions, dimension_indices, 1, count, chunk_size, rows)
+    
+    if (sampling_mode == "stratified"):
+        if (("x" not in names) or ("y" not in names) or ("z" not in names)):
+            print("[sample_tracers_rows(...)] Stratified sampling needs x, y & z dimensions")
+            return None, None
+        
+        position_indices = [names.index("x"), names.index("y"), names.index("z")]
+        if (minmaxs is None):
+            position_minmaxs = get_chunk_extrema(read_columns(position_indices))
+            print("Stratified sampling grid spans position extrema " + str(position_minmaxs))
+        else:
+            position_minmaxs = [minmaxs[d] for d in position_indices]
+        keys = get_cell_keys(read_columns(position_indices), position_minmaxs, sampling_depth)
+        sampled, factors = get_stratified_rows(keys, target_count, sampling_seed)
+    
+    elif (sampling_mode == "weighted"):
+        if ((sampling_weight is None) or (sampling_weight[0] not in names)):
+            print("[sample_tracers_rows(...)] Weighted sampling needs a [dimension name, power] sampling weight out of dimensions")
+            return None, None
+        
+        weight_chunks = ((first_row, last_row, np.asarray(columns[0], dtype=np.float64) ** sampling_weight[1]) for first_row, last_row, columns in read_columns([names.index(sampling_weight[0])]))
+        sampled, factors = get_weighted_rows(weight_chunks, target_count, sampling_seed)
+    
+    else:
+        print("[sample_tracers_rows(...)] Unknown sampling mode " + str(sampling_mode) + ", use stratified or weighted")
+        return None, None
+    
+    print("Sampled " + str(sampled.shape[0]) + " of " + str(count) + " rows (" + sampling_mode + " mode, seed " + str(sampling_seed) + "), each standing for " + str(round(float(factors.min()), 2) if (factors.size > 0) else 0) + " to " + str(round(float(factors.max()), 2) if (factors.size > 0) else 0) + " particles")
+    
+    return (sampled if (rows is None) else rows[sampled]), factors
+
+# Read one frame of a tracers sequence for sequence_scan, keeping 1 row every 'sample_step' rows
+# Returns one column per dimension of 'dimension_indices' (see iterate_tracers_chunks)
+def read_tracers_frame (source_file, file_type_token, dimensions, dimension_indices, sample_step, use_cache=True):
+    data, count = open_tracers_source(source_file, file_type_token, get_needed_columns(file_type_token, dimensions), use_cache)
+    
+    columns = [[] for d in dimension_indices]
+    for first_row, last_row, chunk_columns in iterate_tracers_chunks(data, source_file, file_type_token, dimensions, dimension_indices, sample_step, count // sample_step, 1000000):
+        for c in range(0, len(dimension_indices)):
+            columns[c].append(np.asarray(chunk_columns[c]))
+    
+    return [np.concatenate(column) if (len(column) > 0) else np.zeros(0) for column in columns]
+
+# Morton order of kept rows (see morton_order), out of the "x", "y" & "z" dimensions remapped with their minmaxs
+# 'read_chunks(dimension_indices)' reads chunks of kept rows (see iterate_tracers_chunks), the octree index of the ordered rows goes to 'index_path' (if any)
+# Returns [order, sorted_keys], or [None, None] without positions
+def sort_tracers_by_morton_keys (read_chunks, dimensions, minmaxs, actual_count, index_path, nb_levels):
+    names = [dimension[0] for dimension in dimensions]
+    if (("x" not in names) or ("y" not in names) or ("z" not in names)):
+        print("[sort_tracers_by_morton_keys(...)] Morton ordering needs x, y & z dimensions, keeping dump order")
+        
+        return None, None
+    
+    position_indices = [names.index("x"), names.index("y"), names.index("z")]
+    position_minmaxs = [minmaxs[d] for d in position_indices]
+    
+    keys = np.empty(actual_count, dtype=np.uint64)
+    for first_row, last_row, columns in read_chunks(position_indices):
+        keys[first_row:last_row] = get_morton_keys(columns[0], columns[1], columns[2], position_minmaxs)
+    
+    order, sorted_keys = get_morton_order(keys)
+    keys = None
+    print("Sorted " + str(actual_count) + " rows by Morton keys")
+    
+    if (index_path is not None):
+        write_octree_index(index_path, sorted_keys, nb_levels, ["x", "y", "z"], position_minmaxs)
+        print("Octree index written to " + index_path)
+    
+    return order, sorted_keys
+
+# Reader protocol (see iterate_tracers_chunks) over in-memory 'columns' of the same length
+def iterate_array_chunks (columns, chunk_size):
+    count = columns[0].shape[0] if (len(columns) > 0) else 0
+    for first_row in range(0, count, chunk_size):
+        last_row = min(count, first_row + chunk_size)
+        yield first_row, last_row, [column[first_row:last_row] for column in columns]
+
+# Pipeline stage: rescale mass dimensions (see subsampling.mass_dimension_names) of chunks by 'factors' (one per row, None to pass chunks along)
+# 'names' are the dimension names of chunk columns
+def rescale_chunks (chunks, names, factors):
+    rescaled = [c for c in range(0, len(names)) if (names[c] in mass_dimension_names)]
+    for first_row, last_row, columns in chunks:
+        if ((factors is not None) and (len(rescaled) > 0)):
+            columns = list(columns)
+            for c in rescaled:
+                columns[c] = (columns[c] * factors[first_row:last_row]).astype(columns[c].dtype, copy=False)
+        yield first_row, last_row, columns
+
+# Pipeline stage: log the rows picked by 'log_step' (5 digits, transformed values) while passing chunks along
+def log_scan_rows (chunks, dimensions, log_step):
+    for first_row, last_row, columns in chunks:
+        for i in range(first_row + (-first_row % log_step), last_row, log_step):
+            row = ""
+            for d in range(0, len(dimensions)):
+                val = columns[d][i - first_row]
+                if (dimensions[d][1] == "log"):
+                    val = math.log10(val) if (val > 0) else float("nan")
+                if (d > 0):
+                    row = row + " "
+                row = row + (str(round_to_n(val, 5)) if math.isfinite(val) else str(val))
+            print(str(i) + "th row is: " + row)
+        
+        yield first_row, last_row, columns
+
+# Pipeline stage: quantize chunks of kept dimensions 'kept_indices' (see quantize_column)
+def quantize_chunks (chunks, dimensions, kept_indices, minmaxs):
+    for first_row, last_row, columns in chunks:
+        quantized = []
+        for k in range(0, len(kept_indices)):
+            d = kept_indices[k]
+            digits = 3 if (dimensions[d][2] == "LQ") else 6
+            quantized.append(quantize_column(columns[k], dimensions[d][1], minmaxs[d][0], minmaxs[d][1], digits))
+        
+        yield first_row, last_row, quantized
+
+# Pipeline stage: format quantized chunks into text rows (see format_rows), no newline after the very last row
+def format_chunks (chunks, kept_indices, actual_count):
+    separators = [(" " if (d > 0) else "") for d in kept_indices]
+    
+    for first_row, last_row, quantized in chunks:
+        text, row_offsets = format_rows(quantized, separators, last_row - first_row, last_row < actual_count)
+        
+        yield first_row, last_row, text, row_offsets
+
+# Scan all dimensions out of 'read_chunks(dimension_indices)' chunks (see iterate_tracers_chunks), logging a few rows on the first pass
+def scan_tracers (read_chunks, dimensions, actual_count, nb_logs):
+    log_step = max(1, int(round(actual_count/nb_logs)))
+    all_indices = list(range(0, len(dimensions)))
+    
+    def get_scan_chunks (pass_index):
+        chunks = read_chunks(all_indices)
+        if (pass_index == 0):
+            chunks = log_scan_rows(chunks, dimensions, log_step)
+        return (columns for first_row, last_row, columns in chunks)
+    
+    # Vectorized statistics, all dimensions at once
+    scans = scan_chunk_stream(get_scan_chunks, [dimension[1] for dimension in dimensions])
+    for d in range(0, len(dimensions)):
+        log_scan_stats(dimensions[d][0], scans[d])
+    
+    return scans
+
+# Which rows sph_textufy scans, as keyed in the scan cache (see scan_cache.get_cached_minmaxs)
+# 'sampling_minmaxs' are the minmaxs stratified sampling grids span (None for position extrema, see sample_tracers_rows)
+def get_scan_sampling (testing_value, region, target_count, sampling_mode, sampling_weight, sampling_depth, sampling_seed, sampling_minmaxs=None):
+    sampling = ["tracers", testing_value, region]
+    if (target_count is not None):
+        sampling = sampling + [target_count, sampling_mode, sampling_weight, sampling_depth, sampling_seed]
+        if (sampling_mode == "stratified"):
+            sampling.append(sampling_minmaxs)
+    
+    return sampling
+
+# Quantize, format & write chunks of kept dimensions as text rows, logging a few of them
+# 'report' times quantizing as "transform", formatting as "encode" & writing as "write" phases (see run_report)
+def write_text_rows (destination_file, chunks, dimensions, kept_indices, minmaxs, actual_count, nb_logs, report=None):
+    log_step = max(1, int(round(actual_count/nb_logs)))
+    
+    quantized_chunks = time_chunks(report, "transform", quantize_chunks(chunks, dimensions, kept_indices, minmaxs))
+    for first_row, last_row, text, row_offsets in time_chunks(report, "encode", format_chunks(quantized_chunks, kept_indices, actual_count)):
+        for j in range(first_row + (-first_row % log_step), last_row, log_step):
+            print(str(j) + "th remapped row is: " + text[row_offsets[j - first_row]:(row_offsets[j - first_row + 1] - 1)])
+        
+        # Whole chunk of rows in one write
+        start_phase(report, "write")
+        destination_file.write(text)
+        end_phase(report, bytes_written=len(text))
+        log_progress(report, last_row, actual_count, "rows")
+
+# Attribute groups of the "texture" output mode: kept dimensions of the same quality, packed 4 by 4 into RGBA textures
+# Returns [[quality, [d, ...]], ...], HQ groups first
+def get_texture_groups (dimensions, kept_dimensions):
+    groups = []
+    for quality in ["HQ", "LQ"]:
+        group = []
+        for d in range(0, len(dimensions)):
+            if ((kept_dimensions[d] == 1) and (dimensions[d][2] == quality)):
+                if (len(group) == 4):
+                    groups.append([quality, group])
+                    group = []
+                group.append(d)
+        if (len(group) > 0):
+            groups.append([quality, group])
+    
+    return groups
+
+# File names of the "texture" output mode assets, one per group (see get_texture_groups)
+def get_texture_file_names (dest_file_name, dimensions, kept_dimensions):
+    return [dest_file_name + "-" + "".join([dimensions[d][0] for d in group]) + "-" + quality for quality, group in get_texture_groups(dimensions, kept_dimensions)]
+
+# Square-ish texture size holding 'count' particles (one texel each)
+def get_texture2d_size (count):
+    width = max(1, math.ceil(math.sqrt(count)))
+    height = max(1, math.ceil(count / width))
+    
+    return width, height
+
+# Write kept dimensions to Texture2D .asset files Unity loads as is, instead of text rows
+# 'chunks' come from iterate_tracers_chunks over 'kept_indices' dimensions
+# Particle i lands on texel (i % width, i // width), HQ groups are RGBA64 textures, LQ groups RGBA32 ones, unused channels & texels are 0
+# 'report' times transform, encode & write phases chunk by chunk (see run_report)
+def write_particle_textures (chunks, dest_path, dest_file_name, dimensions, kept_dimensions, kept_indices, minmaxs, actual_count, report=None):
+    width, height = get_texture2d_size(actual_count)
+    groups = get_texture_groups(dimensions, kept_dimensions)
+    
+    # One asset per group, named after its dimensions (renamed once complete, see build_manifest)
+    destination_files = []
+    file_names = get_texture_file_names(dest_file_name, dimensions, kept_dimensions)
+    for g in range(0, len(groups)):
+        destination_files.append(open_output("output/" + dest_path + file_names[g] + ".asset", "w"))
+        write_unity_texture2d_header(destination_files[-1], file_names[g], width, height, "high" if (groups[g][0] == "HQ") else "low")
+    
+    print("Packing " + str(actual_count) + " particles into " + str(width) + "x" + str(height) + " textures: " + ", ".join(file_names))
+    
+    for first_row, last_row, columns in chunks:
+        for g in range(0, len(groups)):
+            quality, group = groups[g]
+            values = np.zeros((last_row - first_row, 4))
+            for c in range(0, len(group)):
+                values[:, c] = columns[kept_indices.index(group[c])]
+            
+            group_dimensions = [dimensions[d] for d in group]
+            group_minmaxs = [minmaxs[d] for d in group]
+            start_phase(report, "transform")
+            encoded = encode_klodu_values(values[:, 0:len(group)], group_dimensions, group_minmaxs, "high" if (quality == "HQ") else "low")
+            texels = np.zeros(values.shape, dtype=encoded.dtype)
+            texels[:, 0:len(group)] = encoded
+            end_phase(report, last_row - first_row)
+            
+            start_phase(report, "encode")
+            text = parse_klodu_to_hex(texels)
+            end_phase(report, last_row - first_row)
+            
+            start_phase(report, "write")
+            destination_files[g].write(text)
+            end_phase(report, bytes_written=len(text))
+        log_progress(report, last_row, actual_count, "particles")
+    
+    # Padding texels & conclude
+    for g in range(0, len(groups)):
+        texel_size = 8 if (groups[g][0] == "HQ") else 4
+        destination_files[g].write("00" * (texel_size * (width * height - actual_count)))
+        write_unity_footer(destination_files[g])
+        close_output(destination_files[g])
+        print("File " + file_names[g] + ".asset was created")
+
 # Read SPH tracers particles data
-def sph_textufy (source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning):
+# 'minmaxs_percentiles' (e.g. [0.5, 99.5]) forces a scan and replaces 'minmaxs' with these percentiles of each dimension
+# 'chunk_size' rows get read, remapped & written at once, each dimension being grabbed as a whole column (see iterate_tracers_chunks)
+# 'output_mode' is "text" (text rows parsed by Unity) or "texture" (Texture2D .asset files, see write_particle_textures)
+# 'use_cache' reads sources through the columnar cache (see prepare_tracers_data)
+# 'morton_order' writes rows sorted by Morton keys of their positions, with an octree index of 'morton_levels' levels (see sort_tracers_by_morton_keys)
+# 'region' (e.g. ["box", [[xmin, xmax], [ymin, ymax], [zmin, zmax]]], see region_index) only keeps particles inside it, out of a cached grid hash of 'region_depth'
+# 'target_count' keeps that many particles through importance subsampling instead of testing_density (see sample_tracers_rows), mass dimensions being rescaled
+# 'use_cache' also reuses scan results of earlier runs on the unchanged source with the same sampling (see scan_cache),
+# 'minmaxs' being None then uses the scanned min & max of each dimension (or their 'minmaxs_percentiles')
+# 'incremental' skips the export if its outputs are there and were built out of the same source & parameters (see build_manifest)
+def sph_textufy (source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning, minmaxs_percentiles=None, chunk_size=1000000, output_mode="text", use_cache=True, morton_order=False, morton_levels=6, region=None, region_depth=7, target_count=None, sampling_mode="stratified", sampling_weight=None, sampling_depth=5, sampling_seed=0, incremental=False):
     
     # Testing mode inits
-    testing_density = min(1, testing_density) # Make sure it don't go krazy (> 1)
+    testing_density = min(1, testing_density) if (target_count is None) else 1 # Make sure it don't go krazy (> 1)
     testing_value = round(1/testing_density)
+    dest_file_name = dest_file_name + ("" if testing_value == 1 else ("-1-in-" + str(testing_value)))
+    dest_file_name = dest_file_name + ("" if (target_count is None) else ("-" + str(target_count) + "-" + sampling_mode))
+    
+    # Skip up to date outputs (scans only have none)
+    incremental = incremental and (not only_scanning)
+    if (output_mode == "text"):
+        output_paths = ["output/" + dest_path + dest_file_name + ".txt"]
+    else:
+        output_paths = ["output/" + dest_path + file_name + ".asset" for file_name in get_texture_file_names(dest_file_name, dimensions, kept_dimensions)]
+    if (morton_order):
+        output_paths.append("output/" + dest_path + dest_file_name + "-octree.json")
+    build_params = {"exporter": "sph_textufy", "dimensions": dimensions, "kept_dimensions": kept_dimensions, "minmaxs": minmaxs, "testing_density": testing_density, "minmaxs_percentiles": minmaxs_percentiles, "output_mode": output_mode, "morton_order": morton_order, "morton_levels": morton_levels, "region": region, "target_count": target_count, "sampling_mode": sampling_mode, "sampling_weight": sampling_weight, "sampling_depth": sampling_depth, "sampling_seed": sampling_seed}
+    if (incremental and is_build_up_to_date(output_paths, source_file, file_type_token, build_params)):
+        print("Outputs of " + dest_file_name + " are up to date, skipping them")
+        return
     
-    # Load tracers data
-    data = prepare_tracers_data(source_file, file_type_token)
+    # Track phases (see run_report), loading being opening the source & selecting rows, then reading chunks
+    report = start_run_report("sph_textufy", dest_file_name, dict(build_params, source_file=source_file, only_scanning=only_scanning, chunk_size=chunk_size))
+    start_phase(report, "load")
+    
+    # Open tracers data (only needed columns when cached, memory-mapped or parsed on the go when possible)
+    data, count = open_tracers_source(source_file, file_type_token, get_needed_columns(file_type_token, dimensions), use_cache)
     
     # Hi
-    dest_file_name = dest_file_name + ("" if testing_value == 1 else ("-1-in-" + str(testing_value)))
     print("Starting work on " + dest_file_name + "...")
     
-    # Prepare export file
-    destination_file = open("output/" + dest_path + dest_file_name + ".txt", "w")
-    
     # Get dimensions
     dims = len(dimensions)
-    count = data.shape[0]
-    actual_count = math.floor(count * testing_density)
+    step = math.floor(testing_value)
+    
+    # Selected rows, read through 'order' instead of striding the dump: region of interest rows, then 1 in step or a subsample of them
+    # 'factors' hold the number of source particles each subsampled row stands for
+    # Stratified grids span the given position minmaxs, or position extrema when minmaxs are missing or picked out of percentiles later
+    sampling_minmaxs = minmaxs if (minmaxs_percentiles is None) else None
+    rows = None
+    factors = None
+    if ((region is not None) or (target_count is not None)):
+        if (data is None):
+            print("[sph_textufy(...)] Regions & subsampling need random access, use the cache (use_cache) for TXT sources")
+            end_phase(report)
+            return
+        
+        if (region is not None):
+            rows = get_region_rows(data, source_file, file_type_token, dimensions, count, region, region_depth, chunk_size)
+            if (rows is None):
+                end_phase(report)
+                return
+            count = rows.shape[0]
+        
+        if (target_count is not None):
+            rows, factors = sample_tracers_rows(data, source_file, file_type_token, dimensions, sampling_minmaxs, count, rows, target_count, sampling_mode, sampling_weight, sampling_depth, sampling_seed, chunk_size)
+            if (rows is None):
+                end_phase(report)
+                return
+        else:
+            rows = rows[::step]
+        step = 1
+    
+    actual_count = math.floor(count * testing_density) if (rows is None) else rows.shape[0]
+    end_phase(report)
+    
+    # Prepare export file, once rows are selected (renamed once complete, see build_manifest)
+    if (output_mode == "text"):
+        destination_file = open_output(output_paths[0], "w")
     
     log_ratio = "all of " if testing_value == 1 else ("1 in " + str(testing_value) + " of all ")
     print("Processing " + log_ratio + str(count) + " (== " + str(actual_count) + ") text rows to " + dest_file_name + ".txt...")
     
-    step = math.floor(testing_value)
+    # Chunks of rows, read again for each pass ('order' sorts them, see sort_tracers_by_morton_keys), mass dimensions of subsampled rows being rescaled
+    read_chunks = lambda dimension_indices, order=rows, order_factors=factors: rescale_chunks(time_chunks(report, "load", iterate_tracers_chunks(data, source_file, file_type_token, dimensions, dimension_indices, step, actual_count, chunk_size, order), count_chunk_columns), [dimensions[d][0] for d in dimension_indices], order_factors)
     
-    # Track time taken
-    start_time = datetime.datetime.now()
+    # Scanned extrema replace missing minmaxs
+    if ((minmaxs is None) and (minmaxs_percentiles is None)):
+        minmaxs_percentiles = [0, 100]
     
-    # LOOP 1: scan
-    if (not skip_scanning):
+    # LOOP 1: scan (also needed to pick minmaxs out of percentiles), or cached scan results
+    scanning = (not skip_scanning) or (minmaxs_percentiles is not None)
+    if (scanning):
+        scan_function = lambda: scan_tracers(read_chunks, dimensions, actual_count, nb_logs)
+        scan_sampling = get_scan_sampling(testing_value, region, target_count, sampling_mode, sampling_weight, sampling_depth, sampling_seed, sampling_minmaxs)
+        start_phase(report, "scan")
+        scans = get_scans(source_file, file_type_token, dimensions, scan_sampling, scan_function) if use_cache else scan_function()
+        end_phase(report, actual_count * dims)
         
-        # Init scanned minmax array (extremal values of positions, velocities... whatever)
-        real_minmaxs = []
-        for d in range(0, dims):
-            real_minmaxs.append([float("inf"), float("-inf")])
-        
-        # Start loop
-        ii = 0
-        for i in range(0, actual_count):
-            ii = i * step
-            
-            row = ""
-            
-            for d in range(0, dims):
-                dimension_name = dimensions[d][0]
-                dimension_mode = dimensions[d][1]
-                
-                # Grab data value Shamrock/Phantom way (dimension name)
-                if (file_type_token == "SHAMROCK"):
-                    # Special case for Yona's rho, derived from hpart
-                    if (dimension_name == "rho"):
-                        val = 1 * (data.iloc[ii]["hpart"] ** 3)
-                    else:
-                        val = data.iloc[ii][dimension_name]
-                
-                elif (file_type_token == "PHANTOM"):
-                    val = data.iloc[ii][dimension_name]
-                    
-                # Grab data value basic way (just the order)
-                elif (file_type_token == "NUMPY" or file_type_token == "TXT"):
-                    val = data[ii][d]
-                    
-                    
-                # Checking mode
-                if (dimension_mode == "log"):
-                    val = math.log10(val)
-                    
-                # Rounding (5 digits just for the scan)
-                val = round_to_n(val, 5)
-                
-                # Feed row to potentially print
-                if (d > 0):
-                    row = row + " "
-                row = row + str(val)
-                
-                # Update max value
-                if (val > real_minmaxs[d][1]):
-                    real_minmaxs[d][1] = val
-                    
-                # Update min value
-                if (val < real_minmaxs[d][0]):
-                    real_minmaxs[d][0] = val
-                
-            if (i % max(1, int(round(actual_count/nb_logs))) == 0):
-                print(str(i) + "th row is: " + row)
-            
-        # Log detected extrema
-        for d in range(0, dims):
-            dimension_name = dimensions[d][0]
-            print("Min value for " + dimension_name + " is: " + str(real_minmaxs[d][0]))
-            print("Max value for " + dimension_name + " is: " + str(real_minmaxs[d][1]))
-            
-        # Log scanning time
-        mid_time = datetime.datetime.now()
-        delta = mid_time.timestamp() - start_time.timestamp()
-        print("Scanned data in: " + str(round(delta, 2)) + " seconds.")
+        # Automatic ranges
+        if (minmaxs_percentiles is not None):
+            minmaxs = pick_minmaxs(scans, minmaxs_percentiles)
+            print("Picked minmaxs out of percentiles " + str(minmaxs_percentiles) + ": " + str(minmaxs))
+    
+    kept_indices = [d for d in range(0, dims) if (kept_dimensions[d] == 1)]
+    
+    # Optional spatial ordering, positions being remapped with their (possibly picked) minmaxs
+    order = rows
+    order_factors = factors
+    if ((not only_scanning) and morton_order):
+        sorted_rows = None
+        if (data is None):
+            print("[sph_textufy(...)] Morton ordering needs random access, use the cache (use_cache) for TXT sources, keeping dump order")
+        else:
+            start_phase(report, "transform")
+            sorted_rows = sort_tracers_by_morton_keys(read_chunks, dimensions, minmaxs, actual_count, output_paths[-1], morton_levels)[0]
+            end_phase(report, actual_count)
+            if (sorted_rows is not None):
+                order = sorted_rows if (rows is None) else rows[sorted_rows]
+                order_factors = None if (factors is None) else factors[sorted_rows]
+        if (sorted_rows is None):
+            output_paths = output_paths[0:-1] # No octree index
+    
+    # LOOP 2: remap & write straight to textures
+    if ((not only_scanning) and (output_mode == "texture")):
+        write_particle_textures(read_chunks(kept_indices, order, order_factors), dest_path, dest_file_name, dimensions, kept_dimensions, kept_indices, minmaxs, actual_count, report)
+        if (incremental):
+            record_build(output_paths, source_file, file_type_token, build_params)
+        finish_run_report(report, get_run_report_path(dest_path, dest_file_name), actual_count, output_paths)
+        return
     
-    # LOOP 2: remap & write
+    # LOOP 2: read → quantize → format → write pipeline, one chunk of rows at a time
     if (not only_scanning):
-        for j in range(0, actual_count):
-            jj = j * step
-            
-            row = ""
-            
-            # Prepare remap
-            low_quality_digits = 3
-            high_quality_digits = 6
-            lq_max = 10 ** low_quality_digits
-            hq_max = 10 ** high_quality_digits
-            
-            for d in range(0, dims):
-                dimension_name = dimensions[d][0]
-                dimension_mode = dimensions[d][1]
-                dimension_quality = dimensions[d][2]
-                is_dimension_kept = True if (kept_dimensions[d] == 1) else False
-                
-                digits = low_quality_digits if (dimension_quality == "LQ") else high_quality_digits
-                
-                # Grab data value Shamrock/Phantom way (dimension name)
-                if (file_type_token == "SHAMROCK"):
-                    # Special case for Yona's rho, derived from hpart
-                    if (dimension_name == "rho"):
-                        val = 1 * (data.iloc[jj]["hpart"] ** 3)
-                    else:
-                        val = data.iloc[jj][dimension_name]
-                        
-                        
-                elif (file_type_token == "PHANTOM"):
-                    val = data.iloc[jj][dimension_name]
-                    
-                # Grab data value basic way (just the order)
-                elif (file_type_token == "NUMPY" or file_type_token == "TXT"):
-                    val = data[jj][d]
-                    
-                # Checking mode
-                if (dimension_mode == "log"):
-                    val = math.log10(val)
-                
-                # Remap
-                min_val = minmaxs[d][0]
-                max_val = minmaxs[d][1]
-                min_target = 0
-                max_target = lq_max if (dimension_quality == "LQ") else hq_max
-                val = int(round_to_n(remap(val, min_val, max_val, min_target, max_target, True), digits + 1))
-                
-                # Feed row to later write to file
-                if (is_dimension_kept):
-                    if (d > 0):
-                        row = row + " "
-                    row = row + str(val)
-                
-            if (j % max(1, int(round(actual_count/nb_logs))) == 0):
-                print(str(j) + "th remapped row is: " + row)
-
-            if (j < actual_count - 1):
-                row += "\n"
-                
-            destination_file.write(row)
-        
-        # Log normalizing time
-        end_time = datetime.datetime.now()
-        delta = end_time.timestamp() - (mid_time.timestamp() if (not skip_scanning) else start_time.timestamp())
-        print("Normalized data in: " + str(round(delta, 2)) + " seconds.")
+        write_text_rows(destination_file, read_chunks(kept_indices, order, order_factors), dimensions, kept_indices, minmaxs, actual_count, nb_logs, report)
     
     # Conclude
-    print("File " + dest_file_name + ".txt was created")
+    if (output_mode == "text"):
+        close_output(destination_file)
+        print("File " + dest_file_name + ".txt was created")
+    if (incremental):
+        record_build(output_paths, source_file, file_type_token, build_params)
+    finish_run_report(report, get_run_report_path(dest_path, dest_file_name), actual_count, output_paths)
+
+# Octree LOD pyramid of SPH tracers particles (see lod_pyramid), instead of hand-made 1-in-N files
+# Level L files (-lod<L>) hold one point per occupied cell of depth 'lod_base_depth' + L not already standing for a coarser point,
+# so loading levels 0..k gives a progressively denser, spatially uniform cloud, attributes being the means of cell particles
+# Positions ("x", "y" & "z" dimensions, kept or not) must be in 'dimensions', a -lod.json manifest lists the levels
+# Each level also gets a -counts.bytes file (uint32 per point, in row order) of the particles its points stand for, i.e. those of
+# their cell, so consumers can weight points (a coarser point's count includes the particles of the finer cells it covers)
+# Other arguments work as in sph_textufy, sources being read once in Morton order (cached or NUMPY sources only)
+def sph_textufy_lod (source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, nb_logs, lod_base_depth=4, lod_levels=5, minmaxs_percentiles=None, chunk_size=1000000, output_mode="text", use_cache=True):
+
+    # Track phases (see run_report)
+    report = start_run_report("sph_textufy_lod", dest_file_name + "-lod", {"source_file": source_file, "dimensions": dimensions, "kept_dimensions": kept_dimensions, "minmaxs": minmaxs, "lod_base_depth": lod_base_depth, "lod_levels": lod_levels, "minmaxs_percentiles": minmaxs_percentiles, "chunk_size": chunk_size, "output_mode": output_mode})
+    
+    # Open tracers data (only needed columns when cached, memory-mapped otherwise)
+    start_phase(report, "load")
+    data, count = open_tracers_source(source_file, file_type_token, get_needed_columns(file_type_token, dimensions), use_cache)
+    end_phase(report)
+    if (data is None):
+        print("[sph_textufy_lod(...)] LOD pyramids need random access, use the cache (use_cache) for TXT sources")
+        return
+    
+    names = [dimension[0] for dimension in dimensions]
+    if (("x" not in names) or ("y" not in names) or ("z" not in names) or (count == 0)):
+        print("[sph_textufy_lod(...)] LOD pyramids need x, y & z dimensions and some particles")
+        return
+    
+    print("Starting work on " + dest_file_name + " LOD pyramid (" + str(lod_levels) + " levels from depth " + str(lod_base_depth) + ")...")
+    
+    read_chunks = lambda dimension_indices, order=None: time_chunks(report, "load", iterate_tracers_chunks(data, source_file, file_type_token, dimensions, dimension_indices, 1, count, chunk_size, order), count_chunk_columns)
+    
+    # Automatic ranges (scanned extrema replace missing minmaxs)
+    if ((minmaxs is None) and (minmaxs_percentiles is None)):
+        minmaxs_percentiles = [0, 100]
+    if (minmaxs_percentiles is not None):
+        scan_function = lambda: scan_tracers(read_chunks, dimensions, count, nb_logs)
+        start_phase(report, "scan")
+        scans = get_scans(source_file, file_type_token, dimensions, get_scan_sampling(1, None, None, None, None, None, None), scan_function) if use_cache else scan_function()
+        end_phase(report, count * len(dimensions))
+        minmaxs = pick_minmaxs(scans, minmaxs_percentiles)
+        print("Picked minmaxs out of percentiles " + str(minmaxs_percentiles) + ": " + str(minmaxs))
+    
+    # Morton order, then one pass over ordered rows for all levels
+    start_phase(report, "transform")
+    order, sorted_keys = sort_tracers_by_morton_keys(read_chunks, dimensions, minmaxs, count, None, 0)
+    kept_indices = [d for d in range(0, len(dimensions)) if (kept_dimensions[d] == 1)]
+    position_indices = [names.index("x"), names.index("y"), names.index("z")]
+    read_indices = kept_indices + [d for d in position_indices if (d not in kept_indices)]
+    
+    levels = build_lod_levels(read_chunks(read_indices, order), sorted_keys, [read_indices.index(d) for d in position_indices], [minmaxs[d] for d in position_indices], lod_base_depth, lod_levels)
+    end_phase(report, count)
+    order = None
+    sorted_keys = None
+    
+    # One file per level, then the manifest
+    manifest = {
+        "source": source_file,
+        "count": int(count),
+        "base_depth": lod_base_depth,
+        "dimensions": [names[d] for d in kept_indices],
+        "minmaxs": [minmaxs[d] for d in kept_indices],
+        "counts_dtype": "<u4",
+        "levels": []
+    }
+    output_paths = []
+    for l in range(0, lod_levels):
+        means, counts = levels[l]
+        level_file_name = dest_file_name + "-lod" + str(l)
+        level_columns = [means[:, c] for c in range(0, len(kept_indices))]
+        if (output_mode == "texture"):
+            write_particle_textures(iterate_array_chunks(level_columns, chunk_size), dest_path, level_file_name, dimensions, kept_dimensions, kept_indices, minmaxs, counts.shape[0], report)
+            output_paths += ["output/" + dest_path + file_name + ".asset" for file_name in get_texture_file_names(level_file_name, dimensions, kept_dimensions)]
+        else:
+            with open("output/" + dest_path + level_file_name + ".txt", "w") as destination_file:
+                write_text_rows(destination_file, iterate_array_chunks(level_columns, chunk_size), dimensions, kept_indices, minmaxs, counts.shape[0], nb_logs, report)
+            output_paths.append("output/" + dest_path + level_file_name + ".txt")
+            print("File " + level_file_name + ".txt was created")
+        
+        # Particle counts of the points, as raw little-endian uint32 values (Unity TextAsset friendly .bytes)
+        counts_path = "output/" + dest_path + level_file_name + "-counts.bytes"
+        with open(counts_path, "wb") as counts_file:
+            counts_file.write(counts.astype("<u4").tobytes())
+        output_paths.append(counts_path)
+        
+        manifest["levels"].append({
+            "level": l,
+            "depth": min(bits_per_axis, lod_base_depth + l),
+            "count": int(counts.shape[0]),
+            "file": level_file_name,
+            "counts_file": level_file_name + "-counts.bytes"
+        })
+    
+    with open("output/" + dest_path + dest_file_name + "-lod.json", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    output_paths.append("output/" + dest_path + dest_file_name + "-lod.json")
+    
+    print("Built " + str(lod_levels) + " LOD levels (" + str(sum([level["count"] for level in manifest["levels"]])) + " points out of " + str(count) + " particles)")
+    finish_run_report(report, get_run_report_path(dest_path, dest_file_name + "-lod"), count, output_paths)
 
 def sph_textufy_disktilt ():
     dimensions = [ ["x", "linear", "HQ"], ["y", "linear", "HQ"], ["z", "linear", "HQ"], ["vx", "linear", "LQ"], ["vy", "linear", "LQ"], ["vz", "linear", "LQ"], ["rho", "log", "LQ"], ["soundspeed", "log", "LQ"] ]
@@ -296,7 +893,7 @@ def sph_textufy_disktilt_full_99_anim():
     print("Generated 99 animation frames.")
 # sph_textufy_disktilt_full_99_anim()
 
-def textufy_dwarfgal_frame (frame, index):
+def textufy_dwarfgal_frame (frame, index, minmaxs=None):
     print("Generatig frame " + str(frame) + " of index " + str(index))
     
     # dimensions = [ ["x", "linear", "HQ"], ["y", "linear", "HQ"], ["z", "linear", "HQ"], ["rho", "log", "LQ"], ["vol", "log", "LQ"], ["bx", "linear", "LQ"], ["by", "linear", "LQ"], ["bz", "linear", "LQ"], ["vx", "linear", "LQ"], ["vy", "linear", "LQ"], ["vz", "linear", "LQ"] ]
@@ -311,7 +908,7 @@ def textufy_dwarfgal_frame (frame, index):
     dest_path = "dwarfgal/100-frames/"
     output_index = prepend_zeros(index, 3)
     dest_file_name = "dwarfgal-xyzrhovol-" + str(output_index)
-    minmaxs = [ [425, 575], [425, 575], [425, 575], [-1, 10], [-9, 5] ]
+    minmaxs = [ [425, 575], [425, 575], [425, 575], [-1, 10], [-9, 5] ] if (minmaxs is None) else minmaxs # Global minmaxs of the sequence when given
     kept_dimensions = [1, 1, 1, 1, 1]
     testing_density = 1/1 # 1/1 is full rendering
     nb_logs = 3
@@ -320,14 +917,25 @@ def textufy_dwarfgal_frame (frame, index):
 
     sph_textufy(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning)
 def textufy_dwarfgal_full_100_anim():
+    nb_workers = os.cpu_count()
     print("Generating 100 animation frames with positions and rho...")
     
+    # Same rho & vol minmaxs for all frames, out of a parallel pre-pass over the whole sequence (1 row in 10), positions keep their crop
+    dimensions = [ ["x", "linear", "HQ"], ["y", "linear", "HQ"], ["z", "linear", "HQ"], ["rho", "log", "LQ"], ["vol", "log", "LQ"] ]
+    frames_args = []
+    for f in range(1250, 1349 + 1):
+        frames_args.append(("./data/dwarfgal/100-frames/data_for_alex_" + str(f) + ".npy", "NUMPY", dimensions, [3, 4], 10))
+    minmaxs = [ [425, 575], [425, 575], [425, 575] ] + get_sequence_minmaxs(read_tracers_frame, frames_args, dimensions[3:5], nb_workers, [0.1, 99.9])
+    
+    frame_jobs = []
     i = 0
     for f in range(1250, 1349 + 1):
         i = i + 1
-        textufy_dwarfgal_frame(f, i)
+        frame_jobs.append((f, i, minmaxs))
+    failures = run_frame_batch(textufy_dwarfgal_frame, frame_jobs, nb_workers)
         
-    print("Generated 100 animation frames.")
+    print("Generated " + str(100 - len(failures)) + " animation frames.")
+    log_slowest_runs("output/dwarfgal/100-frames/reports/")
 # textufy_dwarfgal_full_100_anim()
 
 def textufy_zoomin ():
@@ -346,8 +954,9 @@ def textufy_zoomin ():
     nb_logs = 15
     skip_scanning = True
     only_scanning = False
+    region = ["box", minmaxs[0:3]] # Only particles inside position minmaxs, instead of clamping the others onto the box walls
     
-    sph_textufy(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning)
+    sph_textufy(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning, region=region)
 # textufy_zoomin()
 
 def textufy_binarydisk_frame (frame, index):
@@ -372,20 +981,25 @@ def textufy_binarydisk_frame (frame, index):
     nb_logs = 2
     skip_scanning = True
     only_scanning = False
+    incremental = True # Reruns only regenerate missing, truncated or outdated frames
     
-    sph_textufy(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning)
+    sph_textufy(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning, incremental=incremental)
 def textufy_binarydisk_full_102_anim():
-    start_index = 10#0
+    start_index = 0 # Up to date frames are skipped, no need to restart further on
     end_index = 101
+    nb_workers = os.cpu_count()
     diff = end_index - start_index
-    print("Generating " + str(diff) + " animation frames with density data...")
+    print("Generating " + str(diff) + " animation frames with density data (up to date ones are skipped)...")
     
+    frame_jobs = []
     i = start_index
     for f in range(start_index, end_index + 1):
-        textufy_binarydisk_frame(f, i + 1)
+        frame_jobs.append((f, i + 1))
         i = i + 1
+    failures = run_frame_batch(textufy_binarydisk_frame, frame_jobs, nb_workers)
         
-    print("Generated " + str(diff + 1) + " animation frames.")
+    print("Generated " + str(diff + 1 - len(failures)) + " animation frames.")
+    log_slowest_runs("output/binarydisk/102-frames/reports/")
 # textufy_binarydisk_full_102_anim()
 
 def textufy_fracturings_frame_xyz():
@@ -421,3 +1035,18 @@ def textufy_fracturings_frame_xyzhvxvyvzu():
 
     sph_textufy(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, testing_density, nb_logs, skip_scanning, only_scanning)
 # textufy_fracturings_frame_xyzhvxvyvzu()
+def textufy_fracturings_lod_xyzu():
+    dimensions = [ ["x", "linear", "HQ"], ["y", "linear", "HQ"], ["z", "linear", "HQ"], ["hpart", "log", "HQ"], ["vx", "linear", "LQ"], ["vy", "linear", "LQ"], ["vz", "linear", "LQ"],  ["uint", "log", "HQ"] ]
+    
+    source_file = "./data/fracturings/1-frame/dump_0918.sham"
+    file_type_token = "SHAMROCK"
+    dest_path = "fracturings/1-frame/"
+    dest_file_name = "fracturings-xyzu-0918"
+    minmaxs = [ [-1.2, 1.2], [-1.2, 1.2], [-1.2, 1.2], [-4, -1], [-0.001, 0.001], [-0.001, 0.001], [-0.001, 0.001], [-10, -6] ]
+    kept_dimensions = [1, 1, 1, 0, 0, 0, 0, 1]
+    nb_logs = 3
+    lod_base_depth = 4
+    lod_levels = 6
+    
+    sph_textufy_lod(source_file, file_type_token, dest_path, dest_file_name, dimensions, kept_dimensions, minmaxs, nb_logs, lod_base_depth, lod_levels)
+# textufy_fracturings_lod_xyzu()
@@ -0,0 +1,107 @@
+# ANDRIX ® 2025 🤙
+#
+# Importance subsampling of particles to a target count, instead of keeping 1 row every N rows
+# "stratified": cells of a 2^depth grid over positions keep all their particles up to a common cap, dense cells get capped,
+# so diffuse regions keep their particles while dense ones (disk midplanes...) lose most of them
+# "weighted": weighted reservoir sampling (Efraimidis & Spirakis keys), particles being picked proportionally to a weight column
+# (e.g. h³, i.e. particle volume, for a spatially uniform subsample)
+# Both return sorted row indices along with the number of source particles each kept particle stands for, to rescale masses with
+# Random draws come from a seeded generator, one per row in row order, so results don't depend on chunk sizes
+
+import numpy as np
+from morton_order import bits_per_axis, get_morton_keys
+
+# Dimensions rescaled by the number of particles a kept particle stands for, so that totals are kept
+mass_dimension_names = ["m", "mass"]
+
+# Cell keys of rows in a 2^depth grid over 'minmaxs' ([[xmin, xmax], [ymin, ymax], [zmin, zmax]])
+# 'position_chunks' yields [first_row, last_row, [x, y, z]] chunks of consecutive rows, starting from row 0
+def get_cell_keys (position_chunks, minmaxs, depth):
+    keys = [np.zeros(0, dtype=np.uint64)]
+    for first_row, last_row, columns in position_chunks:
+        keys.append(get_morton_keys(columns[0], columns[1], columns[2], minmaxs) >> np.uint64(3 * (bits_per_axis - depth)))
+    
+    return np.concatenate(keys)
+
+# Number of particles kept in each cell out of 'counts', all of them up to a common cap, 'target_count' in total
+# The leftover of the integer cap goes to randomly picked capped cells, one more particle each
+def get_cell_quotas (counts, target_count, rng):
+    if (target_count >= counts.sum()):
+        return counts.copy()
+    
+    # Largest cap keeping at most target_count particles
+    low = 0
+    high = int(counts.max())
+    while (low < high):
+        cap = (low + high + 1) // 2
+        if (np.minimum(counts, cap).sum() <= target_count):
+            low = cap
+        else:
+            high = cap - 1
+    
+    quotas = np.minimum(counts, low)
+    capped_cells = np.flatnonzero(counts > low)
+    leftover = target_count - int(quotas.sum())
+    quotas[rng.choice(capped_cells, size=leftover, replace=False)] += 1
+    
+    return quotas
+
+# Stratified subsample of 'target_count' rows out of rows with 'cell_keys' (see get_cell_keys), random within each cell
+# Returns [rows, factors], rows being sorted & factors the number of source particles each kept one stands for
+def get_stratified_rows (cell_keys, target_count, seed):
+    rng = np.random.default_rng(seed)
+    draws = rng.random(cell_keys.shape[0])
+    
+    # Rows by cell, then by random draw within each cell
+    by_cell = np.lexsort((draws, cell_keys))
+    sorted_keys = cell_keys[by_cell]
+    first_rows = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])) if (sorted_keys.size > 0) else np.zeros(0, dtype=np.int64)
+    counts = np.diff(np.append(first_rows, sorted_keys.size))
+    quotas = get_cell_quotas(counts, target_count, rng)
+    
+    # Keep the first quota rows of each cell
+    ranks = np.arange(sorted_keys.size) - np.repeat(first_rows, counts)
+    kept = ranks < np.repeat(quotas, counts)
+    factors = np.repeat(counts / np.maximum(quotas, 1), counts)[kept]
+    rows = by_cell[kept]
+    
+    order = np.argsort(rows)
+    
+    return rows[order], factors[order]
+
+# Weighted reservoir subsample of 'target_count' rows, picked with probabilities proportional to their weight (without replacement)
+# 'weight_chunks' yields [first_row, last_row, weights] chunks of rows, non-positive & non-finite weights never get picked
+# Returns [rows, factors] like get_stratified_rows, factors being 1 / inclusion probability given the first key left out
+def get_weighted_rows (weight_chunks, target_count, seed):
+    rng = np.random.default_rng(seed)
+    reservoir_keys = np.zeros(0)
+    reservoir_rows = np.zeros(0, dtype=np.int64)
+    reservoir_weights = np.zeros(0)
+    
+    for first_row, last_row, weights in weight_chunks:
+        weights = np.asarray(weights, dtype=np.float64)
+        draws = rng.random(last_row - first_row)
+        valid = np.flatnonzero(np.isfinite(weights) & (weights > 0))
+        
+        # log(u) / w ranks like u^(1/w), the largest keys win (one more is kept for the threshold)
+        reservoir_keys = np.concatenate([reservoir_keys, np.log(draws[valid]) / weights[valid]])
+        reservoir_rows = np.concatenate([reservoir_rows, valid + first_row])
+        reservoir_weights = np.concatenate([reservoir_weights, weights[valid]])
+        if (reservoir_keys.shape[0] > target_count + 1):
+            best = np.argpartition(reservoir_keys, -(target_count + 1))[-(target_count + 1):]
+            reservoir_keys = reservoir_keys[best]
+            reservoir_rows = reservoir_rows[best]
+            reservoir_weights = reservoir_weights[best]
+    
+    # Row i made it with probability P(log(u) / w_i > threshold) = 1 - exp(threshold * w_i), threshold being the largest key left out
+    factors = np.ones(reservoir_rows.shape[0])
+    if (reservoir_rows.shape[0] > target_count):
+        left_out = np.argmin(reservoir_keys)
+        threshold = reservoir_keys[left_out]
+        kept = np.arange(reservoir_rows.shape[0]) != left_out
+        reservoir_rows = reservoir_rows[kept]
+        factors = 1 / -np.expm1(threshold * reservoir_weights[kept])
+    
+    order = np.argsort(reservoir_rows)
+    
+    return reservoir_rows[order], factors[order]
@@ -0,0 +1,25 @@
+import os
+from batch_runner import map_frame_batch
+
+# Frame job killing its worker process for frame 3, failing for frame 5
+def frame_job (frame):
+    if (frame == 3):
+        os._exit(9)
+    if (frame == 5):
+        raise ValueError("bad frame")
+    
+    return frame * 2
+
+# A worker dying only fails its own job, the others get rerun on a fresh pool
+def test_dead_worker_fails_only_its_job ():
+    results, failures = map_frame_batch(frame_job, [(frame,) for frame in range(0, 40)], 4)
+    
+    assert [failure[0] for failure in failures] == [(3,), (5,)]
+    assert "died" in failures[0][1]
+    assert results == [None if (frame in [3, 5]) else frame * 2 for frame in range(0, 40)]
+
+def test_single_worker ():
+    results, failures = map_frame_batch(frame_job, [(frame,) for frame in [0, 1, 5]], 1)
+    
+    assert results == [0, 2, None]
+    assert len(failures) == 1
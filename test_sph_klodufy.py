@@ -0,0 +1,58 @@
+import math
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sarracen")
+
+from sph_klodufy import deposit_particles, deposit_sph_cube
+
+# Wide kernels (clipped boxes, analytic normalization) match whole-box deposits
+def test_wide_path_matches_box_path ():
+    rng = np.random.default_rng(0)
+    u = rng.uniform(12, 20, (20, 3))
+    h = rng.uniform(3, 5, 20)
+    fields = [np.ones(20)]
+    voxel_sizes = np.ones(3)
+    grid_shape = (32, 32, 32)
+    
+    box = deposit_particles(u, h, fields, grid_shape, voxel_sizes, "cubic")[0]
+    wide = deposit_particles(u, h, fields, grid_shape, voxel_sizes, "cubic", chunk_elements=64)[0]
+    
+    assert box.sum() == pytest.approx(20, rel=1e-3)
+    assert wide.sum() == pytest.approx(20, rel=1e-2)
+    assert np.allclose(wide, box, rtol=2e-2, atol=1e-6)
+
+# One particle with h much larger than the box deposits a near-uniform density, without allocating its whole kernel box
+@pytest.mark.parametrize("nb_workers", [1, 2])
+def test_particle_larger_than_box (nb_workers):
+    data = pd.DataFrame({"x": [0.0], "y": [0.0], "z": [0.0], "h": [10.0], "m": [1.0]})
+    bounds = [[-2, 2], [-2, 2], [-2, 2]]
+    
+    values = deposit_sph_cube(data, "PHANTOM", 64, bounds, [["rho", "log"]], "cubic", nb_workers)
+    
+    center_density = 1 / (math.pi * 10 ** 3) # Kernel peak, W(0) = 1 / (π h³)
+    assert values.shape == (64, 64, 64, 1)
+    assert values[32, 32, 32, 0] == pytest.approx(center_density, rel=1e-2)
+    assert values.min() > 0.8 * center_density # Box corners at q ≈ 0.35
+
+# CIC & TSC slabs only need 1 or 2 planes of halo, whatever h is (even unset)
+@pytest.mark.parametrize("kernel", ["cic", "tsc"])
+def test_assignments_ignore_h (kernel):
+    data = pd.DataFrame({"x": [0.0, 0.3], "y": [0.0, -0.2], "z": [0.0, 0.9], "h": [50.0, 0.0], "m": [1.0, 2.0]})
+    bounds = [[-2, 2], [-2, 2], [-2, 2]]
+    
+    values = deposit_sph_cube(data, "PHANTOM", 32, bounds, [["rho", "log"]], kernel, 4)
+    
+    assert values.sum() * (4 / 32) ** 3 == pytest.approx(3)
+
+# Wide particles spread over several workers give the same cube as a single worker
+def test_wide_particles_split_over_workers ():
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame({"x": rng.uniform(-2, 2, 40), "y": rng.uniform(-2, 2, 40), "z": rng.uniform(-2, 2, 40), "h": rng.uniform(0.5, 3, 40), "m": np.ones(40)})
+    bounds = [[-2, 2], [-2, 2], [-2, 2]]
+    
+    serial = deposit_sph_cube(data, "PHANTOM", 32, bounds, [["rho", "log"]], "cubic", 1)
+    parallel = deposit_sph_cube(data, "PHANTOM", 32, bounds, [["rho", "log"]], "cubic", 4)
+    
+    assert np.allclose(parallel, serial)
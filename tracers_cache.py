@@ -0,0 +1,151 @@
+# ANDRIX ® 2025 🤙
+#
+# Convert-once columnar cache for tracers data (SHAMROCK, PHANTOM & TXT sources, see sph_textufy.prepare_tracers_data)
+# Each column is stored as its own .npy file, memory-mapped back on later runs so only the columns a job asks for get read
+# Caches are keyed by source path, size & modification time, a changed source simply gets converted again
+
+import os
+import json
+import hashlib
+import numpy as np
+
+cache_root = "cache/"
+
+# Cache folder of a source file, e.g. cache/dump_0918.sham-SHAMROCK-1a2b3c4d5e6f/
+def get_cache_dir (source_file, file_type_token):
+    path_hash = hashlib.sha1(os.path.abspath(source_file).encode("utf-8")).hexdigest()[0:12]
+    
+    return cache_root + os.path.basename(source_file) + "-" + file_type_token + "-" + path_hash + "/"
+
+# What a cache must match to be used: source path, size & modification time
+def get_source_key (source_file, file_type_token):
+    stat = os.stat(source_file)
+    
+    return {
+        "source": os.path.abspath(source_file),
+        "file_type_token": file_type_token,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+# Manifest of a valid cache for 'source_file', or None
+def read_cache_manifest (source_file, file_type_token):
+    manifest_path = get_cache_dir(source_file, file_type_token) + "manifest.json"
+    if (not os.path.exists(manifest_path)):
+        return None
+    
+    with open(manifest_path, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+    
+    for name, value in get_source_key(source_file, file_type_token).items():
+        if (manifest.get(name) != value):
+            return None
+    
+    return manifest
+
+# Keep JSON-friendly params only (sarracen params hold numpy scalars, strings...)
+def get_cacheable_params (data):
+    params = {}
+    for name, value in (getattr(data, "params", None) or {}).items():
+        if (isinstance(value, np.generic)):
+            value = value.item()
+        if (isinstance(value, (bool, int, float, str))):
+            params[name] = value
+    
+    return params
+
+# Manifest goes last (through a temporary file), so a half-written cache is never picked up
+def write_cache_manifest (source_file, file_type_token, count, names, row_dtype, params):
+    cache_dir = get_cache_dir(source_file, file_type_token)
+    
+    manifest = get_source_key(source_file, file_type_token)
+    manifest["count"] = int(count)
+    manifest["columns"] = names
+    manifest["row_dtype"] = str(row_dtype)
+    manifest["params"] = params
+    
+    with open(cache_dir + "manifest.tmp.json", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(cache_dir + "manifest.tmp.json", cache_dir + "manifest.json")
+    
+    print("Cached " + str(len(names)) + " columns of " + source_file + " to " + cache_dir)
+
+# Write one column per .npy file, then the manifest
+# 'data' is a DataFrame (SHAMROCK/PHANTOM) or a 2D array (TXT, columns are then named after their index)
+def write_tracers_cache (data, source_file, file_type_token):
+    cache_dir = get_cache_dir(source_file, file_type_token)
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    if (isinstance(data, np.ndarray)):
+        names = [str(d) for d in range(0, data.shape[1])]
+        row_dtype = data.dtype
+    else:
+        names = [str(name) for name in data.columns]
+        row_dtype = data.iloc[0:0].to_numpy().dtype
+    
+    for d in range(0, len(names)):
+        column = data[:, d] if isinstance(data, np.ndarray) else data[data.columns[d]].to_numpy()
+        np.save(cache_dir + names[d] + ".tmp.npy", np.ascontiguousarray(column))
+        os.replace(cache_dir + names[d] + ".tmp.npy", cache_dir + names[d] + ".npy")
+    
+    write_cache_manifest(source_file, file_type_token, data.shape[0], names, row_dtype, get_cacheable_params(data))
+
+# .npy header of a 'count' long column, 128 bytes whatever the count (up to 12 digits), so it can be rewritten in place
+def write_column_header (column_file, dtype, count):
+    np.lib.format.write_array_header_1_0(column_file, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (count,)})
+
+# Streaming version of write_tracers_cache for 2D 'chunks' of rows (TXT sources parsed chunk by chunk)
+# Columns are appended chunk after chunk, their .npy header being fixed once the row count is known
+def write_tracers_cache_chunks (chunks, source_file, file_type_token):
+    cache_dir = get_cache_dir(source_file, file_type_token)
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    names = []
+    column_files = []
+    row_dtype = np.dtype(np.float64)
+    count = 0
+    
+    for rows in chunks:
+        if (count == 0):
+            names = [str(d) for d in range(0, rows.shape[1])]
+            row_dtype = rows.dtype
+            for name in names:
+                column_files.append(open(cache_dir + name + ".tmp.npy", "wb"))
+                write_column_header(column_files[-1], row_dtype, 0)
+        
+        for d in range(0, len(names)):
+            column_files[d].write(np.ascontiguousarray(rows[:, d], dtype=row_dtype).tobytes())
+        count += rows.shape[0]
+    
+    for d in range(0, len(names)):
+        column_files[d].seek(0)
+        write_column_header(column_files[d], row_dtype, count)
+        column_files[d].close()
+        os.replace(cache_dir + names[d] + ".tmp.npy", cache_dir + names[d] + ".npy")
+    
+    write_cache_manifest(source_file, file_type_token, count, names, row_dtype, {})
+
+# Memory-map cached 'columns' (names, or indices for TXT; None for all of them) of 'source_file', or None without a valid cache
+# Returns a DataFrame whose attrs hold the source DataFrame row dtype & params, since only some of its columns are there
+def load_tracers_cache (source_file, file_type_token, columns=None):
+    manifest = read_cache_manifest(source_file, file_type_token)
+    if (manifest is None):
+        return None
+    
+    cache_dir = get_cache_dir(source_file, file_type_token)
+    wanted = manifest["columns"] if (columns is None) else [str(name) for name in columns]
+    
+    mapped = {}
+    for name in manifest["columns"]:
+        if (name in wanted):
+            label = int(name) if (file_type_token == "TXT") else name
+            mapped[label] = np.load(cache_dir + name + ".npy", mmap_mode="r")
+    
+    import pandas as pd # Only particle exporters load caches, klodufy gets cache folders through scan_cache without pandas
+    data = pd.DataFrame(mapped, index=pd.RangeIndex(manifest["count"]), copy=False)
+    data.attrs["row_dtype"] = manifest["row_dtype"]
+    data.attrs["params"] = manifest["params"]
+    
+    print("Loaded " + str(len(mapped)) + " cached columns of " + source_file + " (" + str(manifest["count"]) + " rows) from " + cache_dir)
+    
+    return data